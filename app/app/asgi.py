@@ -3,6 +3,9 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests of both entry points hold a database connection of core.pool,
+its middleware is part of settings.MIDDLEWARE.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
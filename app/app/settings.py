@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.pool.ConnectionPoolMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,9 +99,75 @@ DATABASES = {
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASS'),
+        # seconds a connection is reused, 0 opens one per request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
     }
 }
 
+# Read replicas of default, comma separated hosts in DB_REPLICA_HOSTS.
+# Reads of safe requests are routed to them by core.routers, tests use
+# the test database of default through a separate connection. Only set it
+# for real replicas, or for tests with the host of default.
+
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'],
+        HOST=host.strip(),
+        OPTIONS={'connect_timeout': 2},
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Clients that wrote read from default for PIN_SECONDS, PIN_CACHE has to
+# name an entry of CACHES shared between processes. With a local memory
+# cache the next request of a client may reach another process, all reads
+# then go to default. Replicas more than MAX_LAG seconds behind or
+# unavailable are checked again after HEALTH_CHECK_INTERVAL seconds.
+
+REPLICA_ROUTING = {
+    'PIN_SECONDS': 5,
+    'PIN_CACHE': 'default',
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG': 5,
+}
+
+# Requests of a process holding a database connection at once, see
+# core.pool. Requests wait up to TIMEOUT seconds for one, then get 503.
+# Connections over MAX_SIZE per alias are closed after their request.
+# Connections idle for HEALTH_CHECK_IDLE seconds are pinged before reuse.
+
+DB_POOL = {
+    'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+    'TIMEOUT': 10,
+    'HEALTH_CHECK_IDLE': 5,
+}
+
+
+# Caches, the backend of rendered responses may be switched to a cache
+# shared by all processes, e.g.
+# RESPONSE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# RESPONSE_CACHE_LOCATION=/var/tmp/conference-responses
+# or a Redis backend such as django_redis.cache.RedisCache with
+# RESPONSE_CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': 300,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -138,3 +208,110 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 AUTH_USER_MODEL = 'core.User'
+
+REST_FRAMEWORK = {
+    # renderers report their time to core.instrumentation
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.instrumentation.TimedJSONRenderer',
+        'core.instrumentation.TimedBrowsableAPIRenderer',
+    ],
+}
+
+
+# Full-text search over contributions
+
+CONTRIBUTION_SEARCH_CONFIG = 'english'
+CONTRIBUTION_SEARCH_AUTHORS = True
+
+# Render JSON lists and details of contributions from values() rows
+# instead of model instances, see contribution.serializers.ReadPlan
+
+CONTRIBUTION_COMPILED_READS = True
+
+
+# Rendered contribution listings cached per user, CACHE names an entry
+# of CACHES. Writes invalidate the listings in every process only with a
+# CACHE shared by all processes, with a local memory cache the other
+# processes serve stale listings until the cache TIMEOUT. The cache is
+# therefore enabled only with RESPONSE_CACHE_BACKEND set, a local memory
+# cache is fine for a single process only.
+
+RESPONSE_CACHE = {
+    'ENABLED': bool(os.getenv('RESPONSE_CACHE_BACKEND')),
+    'CACHE': 'responses',
+}
+
+
+# Bulk user import, the import_users command hashes passwords in WORKERS
+# processes, the API in the serving process
+
+USER_IMPORT = {
+    'WORKERS': int(os.getenv('USER_IMPORT_WORKERS', os.cpu_count() or 1)),
+    'CHUNK_SIZE': 1000,
+}
+
+
+# Background tasks of core.tasks run by the run_worker command, delays are
+# in seconds. Failed attempts are retried after BACKOFF doubled with every
+# attempt, up to MAX_BACKOFF. Tasks are leased to a worker for LEASE, then
+# taken by another worker, tasks must take less or be safe to run twice.
+
+TASK_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'LEASE': 5 * 60,
+    'BACKOFF': 10,
+    'MAX_BACKOFF': 60 * 60,
+    'POLL_INTERVAL': 1,
+}
+
+
+# Write-behind submissions, see contribution.buffer. When ENABLED, created
+# contributions are stored as core.Submission rows, acknowledged with a
+# receipt and inserted by a task in batches of BATCH_SIZE, FLUSH_DELAY
+# seconds after the first pending submission.
+
+SUBMISSION_BUFFER = {
+    'ENABLED': False,
+    'BATCH_SIZE': 500,
+    'FLUSH_DELAY': 1,
+}
+
+
+# Responses to creations with an Idempotency-Key header are stored for TTL
+# seconds and replayed to requests repeating the key, see core.idempotency
+
+IDEMPOTENCY = {
+    'TTL': 24 * 60 * 60,
+}
+
+
+# Token authentication cache, CACHE names an entry of CACHES shared
+# between processes, None keeps tokens in the process only
+
+TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 60,
+    'CACHE': None,
+}
+
+
+# Signed access tokens verified without a database query, lifetimes are in
+# seconds. Revoked tokens and users deactivated, demoted or with a new
+# password are kept in REVOCATION_CACHE, an entry of CACHES shared between
+# processes. The checks refuse a local memory cache, other processes would
+# accept revoked tokens.
+
+SIGNED_TOKENS = {
+    'ENABLED': False,
+    'ACCESS_LIFETIME': 5 * 60,
+    'REFRESH_LIFETIME': 7 * 24 * 60 * 60,
+    'REVOCATION_CACHE': 'default',
+}
+
+
+# Metrics are served to staff users and to scrapers sending the header
+# "Authorization: Bearer <TOKEN>", no token is accepted unless set.
+
+METRICS = {
+    'TOKEN': os.getenv('METRICS_TOKEN'),
+}
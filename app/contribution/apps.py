@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ContributionConfig(AppConfig):
     name = 'contribution'
+
+    def ready(self):
+        from contribution import checks, signals  # noqa: F401
@@ -0,0 +1,101 @@
+import datetime
+import logging
+from itertools import count
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from contribution.cache import response_cache
+from core.models import Contribution, Submission, Task
+from core.tasks import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return settings.SUBMISSION_BUFFER['ENABLED']
+
+
+def submit(user, validated_data):
+    """Store a validated contribution for a later flush, return it.
+
+    The submission is acknowledged once its row commits, a flush task is
+    queued unless one is waiting already.
+    """
+    with transaction.atomic():
+        submission = Submission.objects.create(user=user, data=validated_data)
+        schedule_flush()
+    return submission
+
+
+def schedule_flush():
+    """Queue a flush unless one is waiting, not yet running"""
+    # a running flush is leased and has attempts, it may miss submissions
+    # created meanwhile, as may a flush being leased right now
+    waiting = Task.objects.filter(
+        name=flush_submissions.task_name, status=Task.QUEUED, attempts=0
+    ).select_for_update(skip_locked=True)
+    if not waiting.exists():
+        enqueue(flush_submissions, run_at=timezone.now() + datetime.timedelta(
+            seconds=settings.SUBMISSION_BUFFER['FLUSH_DELAY']
+        ))
+
+
+@task
+def flush_submissions():
+    """Flush a batch, queue the next flush while submissions remain"""
+    batch_size = settings.SUBMISSION_BUFFER['BATCH_SIZE']
+    if flush(batch_size, max_batches=1) == batch_size:
+        enqueue(flush_submissions)
+
+
+def flush(batch_size=None, max_batches=None):
+    """Insert pending submissions as contributions, return the count.
+
+    Each batch is claimed, inserted by bulk_create_nested with its
+    original submission times and marked created in a transaction of its
+    own, up to max_batches or until no submission is pending.
+    Submissions the database rejects are marked failed one by one,
+    without holding up the rest of their batch.
+    """
+    batch_size = batch_size or settings.SUBMISSION_BUFFER['BATCH_SIZE']
+    flushed = 0
+    for _ in count() if max_batches is None else range(max_batches):
+        with transaction.atomic():
+            batch = Submission.objects.claim(batch_size)
+            if not batch:
+                return flushed
+            try:
+                with transaction.atomic():
+                    create_contributions(batch)
+            except DatabaseError:
+                for submission in batch:
+                    try:
+                        with transaction.atomic():
+                            create_contributions([submission])
+                    except DatabaseError as exc:
+                        logger.warning('Submission %s failed: %s',
+                                       submission.id, exc)
+                        submission.status = Submission.FAILED
+                        submission.error = str(exc)
+            Submission.objects.bulk_update(
+                batch, ['status', 'contribution_id', 'error']
+            )
+            # contributions are inserted in bulk, without post_save signals
+            for user_id in {submission.user_id for submission in batch}:
+                response_cache.invalidate(user_id)
+        flushed += len(batch)
+    return flushed
+
+
+def create_contributions(submissions):
+    """Insert the contributions of submissions, marking them created"""
+    created = Contribution.objects.bulk_create_nested(
+        dict(submission.data, user_id=submission.user_id,
+             created=submission.created)
+        for submission in submissions
+    )
+    for submission, contribution in zip(submissions, created):
+        submission.status = Submission.CREATED
+        submission.contribution_id = contribution.id
@@ -0,0 +1,124 @@
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+
+from core.instrumentation import registry
+
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+requests_counter = registry.counter(
+    'contribution_response_cache_requests_total',
+    'Contribution listings served from the response cache or rendered.',
+    labels=('result',),
+)
+
+
+class ResponseCache:
+    """Rendered responses cached per user and request.
+
+    Every user has a version token in the key of their responses, changing
+    the token invalidates all of them at once. Signals in
+    contribution.signals change the token whenever a row rendered into
+    the user's responses is saved or deleted. Without a cache shared by
+    all processes, such as the file based or a Redis backend, processes
+    see the changes of each other only after the cache TIMEOUT.
+    """
+    key_prefix = 'contribution-responses:'
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE['CACHE']]
+
+    @property
+    def enabled(self):
+        return settings.RESPONSE_CACHE['ENABLED']
+
+    def version(self, user_id):
+        key = f'{self.key_prefix}version:{user_id}'
+        version = self.cache.get(key)
+        if version is None:
+            version = secrets.token_hex(8)
+            if not self.cache.add(key, version, None):
+                version = self.cache.get(key, version)
+        return version
+
+    def invalidate(self, user_id):
+        """Drop the cached responses of the user, also once committed"""
+        def drop():
+            self.cache.delete(f'{self.key_prefix}version:{user_id}')
+
+        drop()
+        # responses rendered before the commit may have been cached again
+        transaction.on_commit(drop)
+
+    def key(self, request, user_id):
+        digest = hashlib.sha1(':'.join([
+            request.get_full_path(),
+            request.accepted_media_type,
+        ]).encode()).hexdigest()
+        return f'{self.key_prefix}{user_id}:{self.version(user_id)}:{digest}'
+
+    def get_or_render(self, request, user_id, view):
+        """Return the cached response to the request, or render and cache.
+
+        view is called on a miss, successful responses it returns are
+        stored once rendered.
+        """
+        if not self.enabled:
+            return view()
+
+        key = self.key(request, user_id)
+        entry = self.cache.get(key)
+        if entry is not None:
+            requests_counter.inc(result='hit')
+            return self.replay(request, entry)
+
+        requests_counter.inc(result='miss')
+        response = view()
+        if response.status_code == status.HTTP_200_OK and \
+                not response.streaming:
+            def store(response):
+                self.cache.set(key, (
+                    response.content,
+                    response['Content-Type'],
+                    {
+                        header: response[header]
+                        for header in CACHED_HEADERS if response.has_header(
+                            header
+                        )
+                    },
+                ))
+
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
+
+    def replay(self, request, entry):
+        content, content_type, headers = entry
+        last_modified = headers.get('Last-Modified')
+        not_modified = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=last_modified and parse_http_date_safe(
+                last_modified
+            ),
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = HttpResponse(content, content_type=content_type)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+@register()
+def response_cache_check(app_configs, **kwargs):
+    """Warn about a response cache other processes cannot invalidate"""
+    if settings.RESPONSE_CACHE['ENABLED'] and isinstance(
+            caches[settings.RESPONSE_CACHE['CACHE']], LocMemCache):
+        return [Warning(
+            'The response cache is kept in the local memory of every '
+            'process, other processes serve stale listings after writes.',
+            hint='Set RESPONSE_CACHE_BACKEND to a cache shared by all '
+                 'processes unless the server runs a single process.',
+            id='contribution.W001',
+        )]
+    return []
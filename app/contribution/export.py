@@ -0,0 +1,145 @@
+import csv
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+CHUNK_SIZE = 2000
+
+CONTRIBUTION_FIELDS = [
+    'id',
+    'title',
+    'presentation_form',
+    'user__email',
+    'created',
+    'period',
+    'fee',
+    'fee_payed',
+]
+AUTHORSHIP_FIELDS = [
+    'authorships__id',
+    'authorships__author__name',
+    'authorships__is_main_author',
+]
+AFFILIATION_FIELDS = [
+    'authorships__affiliation__institution',
+    'authorships__affiliation__department',
+    'authorships__affiliation__street_address',
+    'authorships__affiliation__city',
+    'authorships__affiliation__zip_code',
+    'authorships__affiliation__country',
+]
+
+CSV_HEADER = [
+    'id',
+    'title',
+    'presentation_form',
+    'user',
+    'created',
+    'registration_period',
+    'registration_fee',
+    'fee_payed',
+    'author',
+    'is_main_author',
+    'affiliations',
+]
+
+
+def export_rows(queryset):
+    """Yield one flat row per contribution, authorship and affiliation.
+
+    Rows come ordered by contribution and authorship from a server-side
+    cursor, so consumers can group them without holding the table.
+    """
+    return queryset.with_fees().values(
+        *CONTRIBUTION_FIELDS,
+        *AUTHORSHIP_FIELDS,
+        'authorships__affiliation__id',
+        *AFFILIATION_FIELDS,
+    ).order_by(
+        'id', 'authorships__id', 'authorships__affiliation__id'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def group_contributions(rows):
+    """Yield each contribution row with the rows of its authorships.
+
+    Every authorship is a list of rows, one per affiliation.
+    """
+    for _, contribution_rows in groupby(rows, key=itemgetter('id')):
+        contribution_rows = list(contribution_rows)
+        contribution = contribution_rows[0]
+        if contribution['authorships__id'] is None:
+            yield contribution, []
+            continue
+        yield contribution, [
+            list(authorship_rows) for _, authorship_rows in groupby(
+                contribution_rows, key=itemgetter('authorships__id')
+            )
+        ]
+
+
+def affiliation_rows(rows):
+    """Filter out the row of an authorship without affiliations"""
+    return [
+        row for row in rows
+        if row['authorships__affiliation__id'] is not None
+    ]
+
+
+def format_affiliation(row):
+    """Join the affiliation columns of a row into a single line"""
+    return ', '.join(
+        str(row[field]) for field in AFFILIATION_FIELDS if row[field]
+    )
+
+
+class Echo:
+    """File-like object that returns what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset):
+    """Yield the export as CSV lines, one line per authorship"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for contribution, authorships in group_contributions(
+            export_rows(queryset)):
+        columns = [contribution[field] for field in CONTRIBUTION_FIELDS]
+        if not authorships:
+            yield writer.writerow(columns + ['', '', ''])
+        for rows in authorships:
+            yield writer.writerow(columns + [
+                rows[0]['authorships__author__name'],
+                rows[0]['authorships__is_main_author'],
+                '; '.join(
+                    format_affiliation(row) for row in affiliation_rows(rows)
+                ),
+            ])
+
+
+def stream_ndjson(queryset):
+    """Yield the export as newline delimited JSON, one contribution a line"""
+    for contribution, authorships in group_contributions(
+            export_rows(queryset)):
+        document = dict(zip(CSV_HEADER, (
+            contribution[field] for field in CONTRIBUTION_FIELDS
+        )))
+        document['authorships'] = [
+            {
+                'author': rows[0]['authorships__author__name'],
+                'is_main_author': rows[0]['authorships__is_main_author'],
+                'affiliation': [
+                    {
+                        field.rsplit('__', 1)[1]: row[field]
+                        for field in AFFILIATION_FIELDS
+                    }
+                    for row in affiliation_rows(rows)
+                ],
+            }
+            for rows in authorships
+        ]
+        yield json.dumps(document, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,24 @@
+from rest_framework.filters import BaseFilterBackend
+
+
+class ContributionSearchFilter(BaseFilterBackend):
+    """Full-text search over contributions ranked by relevance.
+
+    Also tells the cursor paginator to order matches by rank, and to keep
+    the view's default ordering when there is nothing to search for.
+    """
+    search_param = 'search'
+
+    def get_search_text(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        return queryset.search(text)
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_search_text(request):
+            return ('-rank', 'id')
+        return view.pagination_class.ordering
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ContributionCursorPagination(CursorPagination):
+    """Keyset pagination over contributions ordered by creation time.
+
+    Pages are addressed by an opaque cursor instead of an offset, so every
+    page costs the same and rows inserted meanwhile do not shift them.
+    """
+    ordering = ('created', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,155 @@
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from contribution.cache import response_cache
+from core.models import Contribution
+
+CHUNK_SIZE = 5000
+
+# columns naming the paid contribution, in order of preference
+REFERENCE_COLUMNS = ('contribution', 'id', 'reference')
+AMOUNT_COLUMN = 'amount'
+# the contribution id is the trailing number of a payment reference,
+# as in CONF-000123
+REFERENCE = re.compile(r'(\d+)\s*$')
+
+MATCHED = 'matched'
+ALREADY_PAID = 'already_paid'
+AMOUNT_MISMATCH = 'amount_mismatch'
+UNKNOWN = 'unknown'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+STATUSES = (MATCHED, ALREADY_PAID, AMOUNT_MISMATCH, UNKNOWN, DUPLICATE,
+            INVALID)
+
+
+class StatementError(ValueError):
+    """Raised when a statement lacks the columns to reconcile it"""
+
+
+def parse_amount(value):
+    """Return the amount of a statement line, as in 1 200,00 or 1200.00"""
+    return Decimal(value.replace(' ', '').replace('\xa0', '')
+                   .replace(',', '.'))
+
+
+def parse_statement(lines):
+    """Yield a dict per line of a bank statement CSV.
+
+    lines is any iterable of text lines, such as an open file, which is
+    read as it is consumed. Each dict has the line number, the raw
+    reference and amount, and the parsed contribution id and amount, both
+    None where they could not be parsed.
+    """
+    reader = csv.DictReader(lines)
+    columns = [(column or '').strip().lower()
+               for column in reader.fieldnames or ()]
+    reader.fieldnames = columns
+    reference_column = next(
+        (column for column in REFERENCE_COLUMNS if column in columns), None
+    )
+    if reference_column is None or AMOUNT_COLUMN not in columns:
+        raise StatementError(
+            f'The statement needs an {AMOUNT_COLUMN} column and one of '
+            f'{", ".join(REFERENCE_COLUMNS)}.'
+        )
+
+    for row in reader:
+        reference = (row[reference_column] or '').strip()
+        amount = (row[AMOUNT_COLUMN] or '').strip()
+        match = REFERENCE.search(reference)
+        try:
+            parsed_amount = parse_amount(amount)
+        except InvalidOperation:
+            parsed_amount = None
+        yield {
+            'line': reader.line_num,
+            'reference': reference,
+            'amount': amount,
+            'contribution': match and int(match.group(1)),
+            'parsed_amount': parsed_amount,
+        }
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reconcile_payments(lines, chunk_size=CHUNK_SIZE, dry_run=False):
+    """Mark contributions paid by a bank statement, return a report.
+
+    Lines are read in chunks. The contributions of a chunk are fetched
+    and locked in a single query, lines paying exactly the stored fee_due
+    of an unpaid contribution are marked paid by a single update, each
+    chunk in its own transaction. The report counts the lines by status
+    and lists every line that was not matched.
+    """
+    report = {
+        'lines': 0,
+        'counts': dict.fromkeys(STATUSES, 0),
+        'mismatches': [],
+    }
+    seen = set()
+    for chunk in chunks(parse_statement(lines), chunk_size):
+        with transaction.atomic():
+            contributions = {
+                row['id']: row for row in Contribution.objects.filter(
+                    id__in={
+                        entry['contribution'] for entry in chunk
+                        if entry['contribution'] is not None
+                    }
+                ).select_for_update().values(
+                    'id', 'user_id', 'fee_due', 'fee_payed'
+                )
+            }
+            paid = {}
+            for entry in chunk:
+                status, expected = match_entry(entry, contributions, seen)
+                report['lines'] += 1
+                report['counts'][status] += 1
+                if status == MATCHED:
+                    paid[entry['contribution']] = expected['user_id']
+                else:
+                    report['mismatches'].append({
+                        'line': entry['line'],
+                        'reference': entry['reference'],
+                        'amount': entry['amount'],
+                        'status': status,
+                        'expected': expected and expected['fee_due'],
+                    })
+
+            if paid and not dry_run:
+                Contribution.objects.filter(id__in=paid).update(
+                    fee_payed=True, last_modified=timezone.now()
+                )
+                # the update sends no post_save signals
+                for user_id in set(paid.values()):
+                    response_cache.invalidate(user_id)
+    return report
+
+
+def match_entry(entry, contributions, seen):
+    """Return the status of a statement line and its contribution row"""
+    if entry['contribution'] is None or entry['parsed_amount'] is None:
+        return INVALID, None
+    expected = contributions.get(entry['contribution'])
+    if expected is None:
+        return UNKNOWN, None
+    if entry['contribution'] in seen:
+        return DUPLICATE, expected
+    seen.add(entry['contribution'])
+    if expected['fee_payed']:
+        return ALREADY_PAID, expected
+    if entry['parsed_amount'] != expected['fee_due']:
+        return AMOUNT_MISMATCH, expected
+    return MATCHED, expected
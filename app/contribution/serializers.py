@@ -1,6 +1,12 @@
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from core.models import Contribution, Authorship, Affiliation, Author
+from core.models import Contribution, Authorship, Affiliation, Author, \
+    Submission
 
 
 class AffiliationSerializer(serializers.ModelSerializer):
@@ -22,7 +28,7 @@ class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'name']
-        
+
 
 class AuthorshipSerializer(serializers.ModelSerializer):
     author = AuthorSerializer()
@@ -43,9 +49,203 @@ class AuthorshipSerializer(serializers.ModelSerializer):
 
 class ContributionSerializer(serializers.ModelSerializer):
     """Serializer for the contribution's management"""
-    authorships = AuthorshipSerializer(many=True)
+    authorships = AuthorshipSerializer(many=True, required=False)
 
     class Meta:
         model = Contribution
         fields = ['id', 'title', 'presentation_form', 'authorships']
         read_only_fields = ('id',)
+
+    def create(self, validated_data):
+        """Create the contribution together with its authorships"""
+        return Contribution.objects.bulk_create_nested([validated_data])[0]
+
+
+class SubmissionReceiptSerializer(serializers.ModelSerializer):
+    """Serializer for the receipts of write-behind submissions"""
+    receipt = serializers.UUIDField(source='id')
+    contribution = serializers.IntegerField(source='contribution_id')
+
+    class Meta:
+        model = Submission
+        fields = ['receipt', 'status', 'created', 'contribution', 'error']
+        read_only_fields = fields
+
+
+def prefetch_plan(serializer_class, prefix=''):
+    """Return prefetch_related lookups for the serializer's nested fields.
+
+    Forward relations rendered by a nested serializer are joined into the
+    queryset that fetches their parent, reverse and many-to-many relations
+    get their own Prefetch, so the number of queries does not depend
+    on the number of rows.
+    """
+    lookups = []
+    for field in serializer_class().fields.values():
+        if field.write_only or not isinstance(
+                field, serializers.ListSerializer):
+            continue
+        child_class = type(field.child)
+        path = prefix + field.source
+        # a stable order keeps the output equal to the compiled read path
+        queryset = child_class.Meta.model.objects.select_related(
+            *select_plan(child_class)
+        ).order_by('pk')
+        lookups.append(Prefetch(path, queryset=queryset))
+        lookups.extend(prefetch_plan(child_class, prefix=path + '__'))
+    return lookups
+
+
+def select_plan(serializer_class):
+    """Return select_related lookups for the serializer's nested fields"""
+    return [
+        field.source
+        for field in serializer_class().fields.values()
+        if isinstance(field, serializers.ModelSerializer)
+        and not field.write_only
+    ]
+
+
+# field classes whose representation of a database value is the value itself
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ReadPlan:
+    """Read-only rendering of a ModelSerializer from values() rows.
+
+    Built once per serializer class, it maps every field to the column
+    holding its value, so rendering a row is a dict lookup per field
+    instead of DRF's per-field attribute and to_representation dispatch.
+    Forward relations rendered by a nested serializer are read from joined
+    columns, nested lists from one values() query per relation. The output
+    equals the serializer's for the fields it supports, other fields raise
+    ImproperlyConfigured when the plan is built.
+    """
+
+    def __init__(self, serializer_class, prefix=''):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.pk_column = prefix + self.model._meta.pk.attname
+        self.columns = [self.pk_column]
+        self.fields = []
+        self.lists = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.add_list(name, field, prefix)
+            elif isinstance(field, serializers.ModelSerializer):
+                nested = ReadPlan(type(field), prefix + field.source + '__')
+                if nested.lists:
+                    raise ImproperlyConfigured(
+                        f'Nested lists of {name} cannot be compiled.'
+                    )
+                self.columns.extend(nested.columns)
+                self.fields.append((name, None, nested))
+            else:
+                self.add_scalar(name, field, prefix)
+
+    def add_scalar(self, name, field, prefix):
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f'Field {name} of {self.model.__name__} cannot be compiled.'
+            )
+        if model_field.many_to_many or model_field.one_to_many or not (
+                model_field.concrete):
+            raise ImproperlyConfigured(
+                f'Field {name} of {self.model.__name__} cannot be compiled.'
+            )
+        column = prefix + model_field.attname
+        if column not in self.columns:
+            self.columns.append(column)
+        convert = None if isinstance(field, IDENTITY_FIELDS) \
+            else field.to_representation
+        self.fields.append((name, column, convert))
+
+    def add_list(self, name, field, prefix):
+        if prefix:
+            raise ImproperlyConfigured(
+                f'Nested list {name} cannot be compiled.'
+            )
+        relation = self.model._meta.get_field(field.source)
+        if relation.concrete:
+            # forward many-to-many, the child looks the parent up by
+            # the relation's query name
+            lookup = relation.related_query_name()
+        else:
+            lookup = relation.field.name
+        self.lists.append((name, lookup, ReadPlan(type(field.child))))
+
+    def render_rows(self, rows):
+        """Return the representations of values() rows of the plan"""
+        rows = list(rows)
+        lists = {}
+        pks = {row[self.pk_column] for row in rows}
+        for name, lookup, child in self.lists:
+            child_rows = list(
+                child.model._default_manager.filter(**{
+                    f'{lookup}__in': pks
+                }).values(lookup, *child.columns).order_by(lookup, 'pk')
+            ) if pks else []
+            groups = lists[name] = defaultdict(list)
+            for row, data in zip(child_rows, child.render_rows(child_rows)):
+                groups[row[lookup]].append(data)
+
+        return [self.render(row, lists) for row in rows]
+
+    def render(self, row, lists):
+        data = {}
+        for name, column, convert in self.fields:
+            if column is None:
+                # convert is the plan of a nested serializer
+                data[name] = convert.render(row, lists) \
+                    if row[convert.pk_column] is not None else None
+                continue
+            value = row[column]
+            data[name] = value if value is None or convert is None \
+                else convert(value)
+        if self.lists:
+            pk = row[self.pk_column]
+            for name, _, _ in self.lists:
+                data[name] = lists[name].get(pk, [])
+        return data
+
+
+@lru_cache(maxsize=None)
+def read_plan(serializer_class):
+    """Return the ReadPlan of the serializer class, built on first use"""
+    return ReadPlan(serializer_class)
+
+
+class CompiledSerializer:
+    """Render values() rows like the serializer class would render models.
+
+    Mimics the part of the serializer interface used by the list and
+    retrieve views: pass a row or, with many=True, rows of a queryset
+    selecting CompiledSerializer.columns(serializer_class).
+    """
+
+    def __init__(self, serializer_class, instance, many=False):
+        self.serializer_class = serializer_class
+        self.instance = instance
+        self.many = many
+
+    @staticmethod
+    def columns(serializer_class):
+        return read_plan(serializer_class).columns
+
+    @property
+    def data(self):
+        plan = read_plan(self.serializer_class)
+        if self.many:
+            return plan.render_rows(self.instance)
+        return plan.render_rows([self.instance])[0]
@@ -0,0 +1,52 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
+from django.dispatch import receiver
+
+from contribution.cache import response_cache
+from core.models import Affiliation, Author, Authorship, Contribution
+from core.signals import deleting_contributions
+
+
+def invalidate_responses(**filters):
+    """Drop cached responses of the owners of contributions matching filters"""
+    for user_id in Contribution.objects.filter(**filters).values_list(
+            'user_id', flat=True).distinct():
+        response_cache.invalidate(user_id)
+
+
+@receiver(post_save, sender=Contribution)
+@receiver(post_delete, sender=Contribution)
+def contribution_changed(sender, instance, **kwargs):
+    response_cache.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Authorship)
+@receiver(post_delete, sender=Authorship)
+def authorship_changed(sender, instance, **kwargs):
+    if instance.contribution_id not in deleting_contributions.get():
+        invalidate_responses(id=instance.contribution_id)
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def author_changed(sender, instance, **kwargs):
+    invalidate_responses(authorships__author=instance)
+
+
+@receiver(post_save, sender=Affiliation)
+@receiver(pre_delete, sender=Affiliation)
+def affiliation_changed(sender, instance, **kwargs):
+    invalidate_responses(authorships__affiliation=instance)
+
+
+@receiver(m2m_changed, sender=Authorship.affiliation.through)
+def authorship_affiliation_changed(sender, instance, action, reverse,
+                                   pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_responses(id=instance.contribution_id)
+    elif action == 'pre_clear':
+        invalidate_responses(authorships__affiliation=instance)
+    else:
+        invalidate_responses(authorships__id__in=pk_set)
@@ -0,0 +1,2 @@
+# background tasks of the contribution app, loaded by the run_worker command
+from contribution.buffer import flush_submissions  # noqa: F401
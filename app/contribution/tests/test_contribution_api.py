@@ -1,19 +1,86 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.utils.http import http_date
 
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.test import APIClient
 
+from contribution.cache import requests_counter
+from contribution.checks import response_cache_check
+from contribution.serializers import ContributionSerializer, ReadPlan, \
+    prefetch_plan
+from contribution import buffer
+from core import tasks
+from core.models import Affiliation, Author, Authorship, Contribution, \
+    Submission, Task
+
 
 # CREATE_CONTRIBUTION_URL = reverse('contribution:create')
 CONTRIBUTION_URL = reverse('contribution:contribution-list')
+BULK_URL = reverse('contribution:contribution-bulk')
+FEE_REPORT_URL = reverse('contribution:contribution-fee-report')
+SEARCH_URL = reverse('contribution:contribution-search')
+RECONCILE_URL = reverse('contribution:contribution-reconcile')
+
+NO_RESPONSE_CACHE = {'ENABLED': False, 'CACHE': 'responses'}
+RESPONSE_CACHE = {'ENABLED': True, 'CACHE': 'responses'}
+SUBMISSION_BUFFER = {'ENABLED': True, 'BATCH_SIZE': 2, 'FLUSH_DELAY': 0}
+
+AFFILIATION = {
+    'institution': 'Masaryk univ',
+    'department': 'Dept. of Botany and Zoology',
+    'street_address': 'Kotlarska 2',
+    'city': 'Brno',
+    'zip_code': 61137,
+    'country': 'Czech Republic',
+}
 
 
 def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
+def detail_url(contribution_id):
+    return reverse('contribution:contribution-detail', args=[contribution_id])
+
+
+def export_url(export_format):
+    return reverse('contribution:contribution-export', args=[export_format])
+
+
+def create_contribution(user, authors=2, **params):
+    """Create a contribution with authorships and affiliations"""
+    defaults = {
+        'title': 'Chironomids of the Vltava river',
+        'presentation_form': 'oral',
+    }
+    defaults.update(params)
+    contribution = Contribution.objects.create(user=user, **defaults)
+    affiliation = Affiliation.objects.create(
+        institution='Masaryk univ',
+        street_address='Kotlarska 2',
+        city='Brno',
+        zip_code=61137,
+        country='Czech Republic',
+    )
+    for i in range(authors):
+        authorship = Authorship.objects.create(
+            author=Author.objects.create(name=f'Author {i}'),
+            contribution=contribution,
+            is_main_author=(i == 0),
+        )
+        authorship.affiliation.add(affiliation)
+    return contribution
+
+
 class ContributionTests(TestCase):
 
     def setUp(self):
@@ -37,3 +104,923 @@ class ContributionTests(TestCase):
         res = self.client.post(CONTRIBUTION_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_list_contributions_limited_to_user(self):
+        """Only the contributions of the authenticated user are listed"""
+        other = create_user(email='other@gmail.com', password='ajlkjfs5734')
+        create_contribution(other)
+        contribution = create_contribution(self.user)
+
+        res = self.client.get(CONTRIBUTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['id'], contribution.id)
+        self.assertEqual(len(results[0]['authorships']), 2)
+        self.assertEqual(
+            results[0]['authorships'][0]['affiliation'][0]['city'], 'Brno'
+        )
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        """Listing runs the same number of queries for 1 and many rows"""
+        create_contribution(self.user, authors=1)
+        with self.assertNumQueries(4):
+            self.client.get(CONTRIBUTION_URL)
+
+        for _ in range(5):
+            create_contribution(self.user, authors=4)
+        with self.assertNumQueries(4):
+            res = self.client.get(CONTRIBUTION_URL)
+        self.assertEqual(len(res.data['results']), 6)
+
+    def test_retrieve_query_count(self):
+        """Retrieving a contribution does not query per authorship"""
+        contribution = create_contribution(self.user, authors=5)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(contribution.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['authorships']), 5)
+
+    def test_create_contribution_with_authorships(self):
+        """Nested authorships and affiliations are created"""
+        payload = {
+            'title': 'Chironomids of the Vltava river',
+            'presentation_form': 'poster',
+            'authorships': [
+                {
+                    'author': {'name': 'Jan Sychra'},
+                    'is_main_author': True,
+                    'affiliation': [AFFILIATION],
+                },
+                {
+                    'author': {'name': 'Vit Syrovatka'},
+                    'is_main_author': False,
+                    'affiliation': [AFFILIATION],
+                },
+            ],
+        }
+
+        res = self.client.post(CONTRIBUTION_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        contribution = Contribution.objects.get(id=res.data['id'])
+        self.assertEqual(contribution.user, self.user)
+        self.assertEqual(contribution.authorships.count(), 2)
+        self.assertEqual(Affiliation.objects.count(), 1)
+        self.assertTrue(
+            contribution.authorships.get(author__name='Jan Sychra')
+            .is_main_author
+        )
+
+    def test_create_with_idempotency_key_replayed(self):
+        """Retried creations return the first contribution"""
+        payload = {'title': 'Chironomids', 'presentation_form': 'oral'}
+        first = self.client.post(CONTRIBUTION_URL, payload,
+                                 HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        repeated = self.client.post(CONTRIBUTION_URL, payload,
+                                    HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(repeated.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeated.data['id'], first.data['id'])
+        self.assertEqual(Contribution.objects.count(), 1)
+
+    def test_partial_update_keeps_authorships(self):
+        """Updating only the title leaves the authorships alone"""
+        contribution = create_contribution(self.user, authors=2)
+
+        res = self.client.patch(
+            detail_url(contribution.id), {'title': 'Beetles of Moravia'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Beetles of Moravia')
+        self.assertEqual(len(res.data['authorships']), 2)
+
+    def test_bulk_create_contributions(self):
+        """A list of contributions is created in one request"""
+        payload = [
+            {
+                'title': f'Contribution {i}',
+                'presentation_form': 'oral',
+                'authorships': [{
+                    'author': {'name': f'Author {i}'},
+                    'is_main_author': True,
+                    'affiliation': [AFFILIATION],
+                }],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(
+            Contribution.objects.filter(user=self.user).count(), 3
+        )
+        self.assertEqual(res.data[2]['data']['title'], 'Contribution 2')
+        self.assertEqual(
+            res.data[2]['data']['authorships'][0]['author']['name'],
+            'Author 2'
+        )
+
+    def test_bulk_create_reports_invalid_items(self):
+        """Invalid items are reported while valid ones are created"""
+        payload = [
+            {'title': 'Valid', 'presentation_form': 'oral'},
+            {'title': '', 'presentation_form': 'song'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data[0]['status'], status.HTTP_201_CREATED)
+        self.assertEqual(res.data[1]['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', res.data[1]['errors'])
+        self.assertIn('presentation_form', res.data[1]['errors'])
+        self.assertEqual(Contribution.objects.count(), 1)
+
+    def test_bulk_create_requires_list(self):
+        """Bulk endpoint rejects a single object"""
+        res = self.client.post(
+            BULK_URL, {'title': 'Single'}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Contribution.objects.count(), 0)
+
+    def test_bulk_create_query_count_does_not_grow_with_batch(self):
+        """Bulk creation runs the same number of queries for any batch"""
+        def payload(size):
+            return [
+                {
+                    'title': f'Contribution {i}',
+                    'presentation_form': 'oral',
+                    'authorships': [
+                        {
+                            'author': {'name': f'Author {i}.{j}'},
+                            'is_main_author': j == 0,
+                            'affiliation': [AFFILIATION],
+                        }
+                        for j in range(3)
+                    ],
+                }
+                for i in range(size)
+            ]
+
+        with self.assertNumQueries(10):
+            self.client.post(BULK_URL, payload(1), format='json')
+        with self.assertNumQueries(10):
+            res = self.client.post(BULK_URL, payload(20), format='json')
+        self.assertEqual(len(res.data), 20)
+
+    def test_list_paginated_by_cursor(self):
+        """Contributions are paged in creation order with a cursor"""
+        contributions = [
+            create_contribution(self.user, authors=1, title=f'C{i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(CONTRIBUTION_URL, {'page_size': 2})
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [c.id for c in contributions[:2]]
+        )
+        self.assertIsNone(res.data['previous'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [c.id for c in contributions[2:4]]
+        )
+
+    def test_cursor_page_stable_under_inserts(self):
+        """Rows created after a page was fetched do not shift next pages"""
+        contributions = [
+            create_contribution(self.user, authors=1) for _ in range(4)
+        ]
+        res = self.client.get(CONTRIBUTION_URL, {'page_size': 2})
+
+        create_contribution(self.user, authors=1)
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [c.id for c in contributions[2:4]]
+        )
+
+    def test_deep_cursor_page_query_count(self):
+        """Fetching a later page costs as many queries as the first"""
+        for _ in range(6):
+            create_contribution(self.user, authors=2)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(CONTRIBUTION_URL, {'page_size': 2})
+        for _ in range(2):
+            with self.assertNumQueries(4):
+                res = self.client.get(res.data['next'])
+        self.assertIsNone(res.data['next'])
+
+    @override_settings(RESPONSE_CACHE=NO_RESPONSE_CACHE)
+    def test_list_not_modified(self):
+        """Listing answers 304 for a current ETag without serializing"""
+        create_contribution(self.user)
+        res = self.client.get(CONTRIBUTION_URL)
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                CONTRIBUTION_URL, HTTP_IF_NONE_MATCH=res['ETag']
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_with_query_params(self):
+        """Different pages of the listing have different ETags"""
+        create_contribution(self.user)
+        first = self.client.get(CONTRIBUTION_URL)
+        second = self.client.get(CONTRIBUTION_URL, {'page_size': 1})
+
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_retrieve_not_modified(self):
+        """Retrieve honours If-None-Match and If-Modified-Since"""
+        contribution = create_contribution(self.user)
+        res = self.client.get(detail_url(contribution.id))
+
+        res = self.client.get(
+            detail_url(contribution.id), HTTP_IF_NONE_MATCH=res['ETag']
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            detail_url(contribution.id),
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_other_users_contribution_not_found(self):
+        """Conditional retrieve does not leak other users' contributions"""
+        other = create_user(email='other@gmail.com', password='ajlkjfs5734')
+        contribution = create_contribution(other)
+
+        res = self.client.get(detail_url(contribution.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_etag_changes_with_nested_rows(self):
+        """Changing an authorship or affiliation invalidates the ETag"""
+        contribution = create_contribution(self.user)
+        etag = self.client.get(detail_url(contribution.id))['ETag']
+
+        affiliation = Affiliation.objects.first()
+        affiliation.city = 'Praha'
+        affiliation.save()
+        res = self.client.get(
+            detail_url(contribution.id), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['authorships'][0]['affiliation'][0]['city'], 'Praha'
+        )
+
+        etag = res['ETag']
+        contribution.authorships.first().affiliation.clear()
+        res = self.client.get(
+            detail_url(contribution.id), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class FeeReportApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+
+    def test_fee_report_requires_staff(self):
+        """Regular users may not read the fee report"""
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.get(FEE_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_fee_report_totals(self):
+        """Fees are summed per period, presentation form and payment"""
+        staff = get_user_model().objects.create_superuser(
+            'staff@gmail.com', 'ajlkjfs5734'
+        )
+        self.client.force_authenticate(user=staff)
+        create_contribution(self.user, authors=0, presentation_form='oral')
+        create_contribution(self.user, authors=0, presentation_form='oral',
+                            discount=-200)
+        create_contribution(staff, authors=0, presentation_form='poster',
+                            fee_payed=True)
+        Contribution.objects.update(created='2020-06-01T12:00:00Z')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(FEE_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(res.data['total'], 2200)
+        self.assertEqual(res.data['groups'], [
+            {'period': 'Normal', 'presentation_form': 'oral',
+             'fee_payed': False, 'count': 2, 'total': 1400},
+            {'period': 'Normal', 'presentation_form': 'poster',
+             'fee_payed': True, 'count': 1, 'total': 800},
+        ])
+
+
+class ReconciliationApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            'staff@gmail.com', 'ajlkjfs5734'
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+
+    def upload(self, text, **params):
+        statement = io.BytesIO(text.encode())
+        statement.name = 'statement.csv'
+        return self.client.post(
+            RECONCILE_URL + ('?dry_run=1' if params.get('dry_run') else ''),
+            {'statement': statement}, format='multipart'
+        )
+
+    def test_reconcile_requires_staff(self):
+        """Regular users may not reconcile payments"""
+        self.client.force_authenticate(user=self.user)
+
+        res = self.upload('contribution,amount\n')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_reconcile_marks_matching_payments(self):
+        """Lines paying the fee due mark contributions paid"""
+        paid = create_contribution(self.user, authors=0)
+        discounted = create_contribution(self.user, authors=0, discount=-200)
+        short = create_contribution(self.user, authors=0)
+        Contribution.objects.update(created='2020-06-01T12:00:00Z')
+
+        res = self.upload(
+            'Reference,Amount\n'
+            f'CONF-{paid.id:06d},800.00\n'
+            f'{discounted.id},"600,00"\n'
+            f'{short.id},500\n'
+            f'{paid.id},800\n'
+            '999999,800\n'
+            'no reference,800\n'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['lines'], 6)
+        self.assertEqual(res.data['counts'], {
+            'matched': 2, 'already_paid': 0, 'amount_mismatch': 1,
+            'unknown': 1, 'duplicate': 1, 'invalid': 1,
+        })
+        self.assertEqual(res.data['mismatches'][0], {
+            'line': 4, 'reference': str(short.id), 'amount': '500',
+            'status': 'amount_mismatch', 'expected': 800,
+        })
+        self.assertEqual(
+            set(Contribution.objects.filter(fee_payed=True)
+                .values_list('id', flat=True)),
+            {paid.id, discounted.id}
+        )
+
+    def test_reconcile_reports_already_paid(self):
+        """Payments of paid contributions are reported, not matched"""
+        contribution = create_contribution(
+            self.user, authors=0, fee_payed=True
+        )
+
+        res = self.upload(
+            f'contribution,amount\n{contribution.id},'
+            f'{contribution.fee_due}\n'
+        )
+
+        self.assertEqual(res.data['counts']['already_paid'], 1)
+        self.assertEqual(res.data['counts']['matched'], 0)
+
+    def test_reconcile_dry_run(self):
+        """A dry run reports matches without marking them paid"""
+        contribution = create_contribution(self.user, authors=0)
+
+        res = self.upload(
+            f'contribution,amount\n{contribution.id},'
+            f'{contribution.fee_due}\n',
+            dry_run=True
+        )
+
+        self.assertEqual(res.data['counts']['matched'], 1)
+        contribution.refresh_from_db()
+        self.assertFalse(contribution.fee_payed)
+
+    def test_reconcile_invalidates_listing(self):
+        """The owner's cached listing is rendered again after payment"""
+        contribution = create_contribution(self.user, authors=0)
+        owner = APIClient()
+        owner.force_authenticate(user=self.user)
+        etag = owner.get(CONTRIBUTION_URL)['ETag']
+
+        self.upload(
+            f'contribution,amount\n{contribution.id},'
+            f'{contribution.fee_due}\n'
+        )
+
+        res = owner.get(CONTRIBUTION_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_reconcile_requires_columns(self):
+        """Statements without amount or reference columns are rejected"""
+        res = self.upload('date,amount\n2020-06-01,800\n')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reconcile_requires_upload(self):
+        """Requests without a statement file are rejected"""
+        res = self.client.post(RECONCILE_URL, {})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            'staff@gmail.com', 'ajlkjfs5734'
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+
+    def test_export_requires_staff(self):
+        """Regular users may not export contributions"""
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.get(export_url('csv'))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_csv(self):
+        """CSV export has one row per authorship"""
+        contribution = create_contribution(self.user, authors=2)
+        create_contribution(self.staff, authors=0, title='No authors')
+
+        res = self.client.get(export_url('csv'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(
+            b''.join(res.streaming_content).decode()
+        )))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['id'], str(contribution.id))
+        self.assertEqual(rows[0]['user'], self.user.email)
+        self.assertEqual(rows[0]['author'], 'Author 0')
+        self.assertEqual(rows[0]['is_main_author'], 'True')
+        self.assertIn('Masaryk univ', rows[1]['affiliations'])
+        self.assertEqual(rows[2]['title'], 'No authors')
+        self.assertEqual(rows[2]['author'], '')
+
+    def test_export_ndjson(self):
+        """NDJSON export has one nested document per contribution"""
+        create_contribution(self.user, authors=3)
+        create_contribution(self.user, authors=1)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(export_url('ndjson'))
+            lines = b''.join(res.streaming_content).decode().splitlines()
+
+        documents = [json.loads(line) for line in lines]
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(len(documents[0]['authorships']), 3)
+        self.assertEqual(
+            documents[0]['authorships'][0]['affiliation'][0]['city'], 'Brno'
+        )
+        self.assertEqual(documents[1]['registration_fee'], 1200)
+
+
+class SearchApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+        self.client.force_authenticate(user=self.user)
+
+    def test_search_own_contributions_by_title(self):
+        """Search matches stemmed title words of own contributions"""
+        match = create_contribution(
+            self.user, title='Chironomid larvae in Moravian rivers'
+        )
+        create_contribution(self.user, title='Birds of Brno')
+        other = create_user(email='other@gmail.com', password='ajlkjfs5734')
+        create_contribution(other, title='Rivers of Bohemia')
+
+        res = self.client.get(CONTRIBUTION_URL, {'search': 'river'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [match.id]
+        )
+
+    def test_search_by_author_name(self):
+        """Author names are part of the search vector"""
+        contribution = create_contribution(self.user, authors=0)
+        Authorship.objects.create(
+            author=Author.objects.create(name='Sychra'),
+            contribution=contribution,
+        )
+
+        res = self.client.get(CONTRIBUTION_URL, {'search': 'sychra'})
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [contribution.id]
+        )
+
+    def test_search_vector_follows_title_update(self):
+        """Updating the title refreshes the search vector"""
+        contribution = create_contribution(self.user, title='Birds')
+
+        self.client.patch(
+            detail_url(contribution.id), {'title': 'Beetles'}, format='json'
+        )
+
+        res = self.client.get(CONTRIBUTION_URL, {'search': 'beetle'})
+        self.assertEqual(len(res.data['results']), 1)
+        res = self.client.get(CONTRIBUTION_URL, {'search': 'birds'})
+        self.assertEqual(len(res.data['results']), 0)
+
+    def test_search_ranked_by_relevance(self):
+        """Title matches rank above author name matches"""
+        by_author = create_contribution(self.user, authors=0, title='Birds')
+        Authorship.objects.create(
+            author=Author.objects.create(name='Jan Beetle'),
+            contribution=by_author,
+        )
+        by_title = create_contribution(self.user, title='Beetles of Brno')
+
+        res = self.client.get(CONTRIBUTION_URL, {'search': 'beetle'})
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [by_title.id, by_author.id]
+        )
+
+        res = self.client.get(
+            CONTRIBUTION_URL, {'search': 'beetle', 'page_size': 1}
+        )
+        self.assertEqual(res.data['results'][0]['id'], by_title.id)
+        res = self.client.get(res.data['next'])
+        self.assertEqual(res.data['results'][0]['id'], by_author.id)
+
+    def test_staff_search_across_users(self):
+        """Staff search covers all users, regular users are refused"""
+        other = create_user(email='other@gmail.com', password='ajlkjfs5734')
+        create_contribution(other, title='Rivers of Bohemia')
+        create_contribution(self.user, title='Moravian rivers')
+
+        res = self.client.get(SEARCH_URL, {'search': 'river'})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(SEARCH_URL, {'search': 'river'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+
+class CompiledReadTests(TestCase):
+    """Test rendering contributions from values() rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+        self.client.force_authenticate(user=self.user)
+
+        create_contribution(self.user, authors=3, title='Beetles of Moravia')
+        create_contribution(self.user, authors=0, presentation_form='poster')
+        contribution = create_contribution(self.user, authors=1)
+        authorship = contribution.authorships.get()
+        authorship.affiliation.add(Affiliation.objects.create(
+            institution='Charles University', department='Dept. of Ecology',
+            street_address='Vinicna 7', city='Praha', zip_code=12844,
+            country='Czech Republic',
+        ))
+        Authorship.objects.create(
+            author=Author.objects.create(name='Unaffiliated'),
+            contribution=contribution,
+        )
+
+    def assertSameResponse(self, url, params=None):
+        with override_settings(CONTRIBUTION_COMPILED_READS=False):
+            expected = self.client.get(url, params)
+        res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected.content)
+
+    def test_list_matches_serializer(self):
+        """Compiled lists are byte for byte the serializer's output"""
+        self.assertSameResponse(CONTRIBUTION_URL)
+        self.assertSameResponse(CONTRIBUTION_URL, {'page_size': 2})
+
+    def test_retrieve_matches_serializer(self):
+        """Compiled details are byte for byte the serializer's output"""
+        for contribution in Contribution.objects.all():
+            self.assertSameResponse(detail_url(contribution.id))
+
+    def test_search_matches_serializer(self):
+        """Ranked search results are rendered like the serializer does"""
+        self.user.is_staff = True
+        self.user.save()
+
+        self.assertSameResponse(SEARCH_URL, {'search': 'Vltava'})
+
+    def test_plan_matches_serializer(self):
+        """Rendered rows equal the serializer's data"""
+        plan = ReadPlan(ContributionSerializer)
+        queryset = Contribution.objects.order_by('id')
+        instances = queryset.prefetch_related(
+            *prefetch_plan(ContributionSerializer)
+        )
+
+        self.assertEqual(
+            plan.render_rows(queryset.values(*plan.columns)),
+            json.loads(json.dumps(ContributionSerializer(
+                instances, many=True
+            ).data)),
+        )
+
+    def test_unsupported_field_rejected(self):
+        """Fields without a column fail when the plan is built"""
+        class TitleLengthSerializer(serializers.ModelSerializer):
+            length = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Contribution
+                fields = ['id', 'length']
+
+        with self.assertRaises(ImproperlyConfigured):
+            ReadPlan(TitleLengthSerializer)
+
+
+@override_settings(RESPONSE_CACHE=RESPONSE_CACHE)
+class ResponseCacheTests(TestCase):
+    """Test the per-user cache of rendered contribution listings"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        requests_counter.reset()
+        self.client = APIClient()
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+        self.client.force_authenticate(user=self.user)
+        self.contribution = create_contribution(self.user)
+
+    def assertInvalidated(self, change):
+        """The change is visible in the next listing"""
+        self.client.get(CONTRIBUTION_URL)
+        change()
+
+        res = self.client.get(CONTRIBUTION_URL)
+
+        self.assertEqual(requests_counter.value(result='miss'), 2)
+        return res.data['results']
+
+    def test_local_memory_cache_warned(self):
+        """Enabling the cache in local memory is reported by the checks"""
+        self.assertEqual(
+            [warning.id for warning in response_cache_check(None)],
+            ['contribution.W001']
+        )
+        with self.settings(RESPONSE_CACHE=NO_RESPONSE_CACHE):
+            self.assertEqual(response_cache_check(None), [])
+
+    def test_repeated_listing_served_from_cache(self):
+        """The second listing is not rendered again"""
+        first = self.client.get(CONTRIBUTION_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(CONTRIBUTION_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(requests_counter.value(result='hit'), 1)
+        self.assertEqual(requests_counter.value(result='miss'), 1)
+
+    def test_cached_listing_not_modified(self):
+        """Cached listings honour the client's ETag"""
+        etag = self.client.get(CONTRIBUTION_URL)['ETag']
+
+        res = self.client.get(CONTRIBUTION_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(requests_counter.value(result='hit'), 1)
+
+    def test_query_params_cached_separately(self):
+        """Every page of a listing has its own entry"""
+        self.client.get(CONTRIBUTION_URL)
+
+        res = self.client.get(CONTRIBUTION_URL, {'page_size': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(requests_counter.value(result='miss'), 2)
+
+    def test_created_contribution_invalidates(self):
+        results = self.assertInvalidated(lambda: self.client.post(
+            CONTRIBUTION_URL, {'title': 'Beetles', 'presentation_form': 'oral'}
+        ))
+        self.assertEqual(len(results), 2)
+
+    def test_deleted_contribution_invalidates(self):
+        results = self.assertInvalidated(self.contribution.delete)
+        self.assertEqual(results, [])
+
+    def test_author_change_invalidates(self):
+        def rename():
+            author = Author.objects.get(authorships__is_main_author=True)
+            author.name = 'Jan Sychra'
+            author.save()
+
+        results = self.assertInvalidated(rename)
+        self.assertIn('Jan Sychra', json.dumps(results))
+
+    def test_authorship_delete_invalidates(self):
+        results = self.assertInvalidated(
+            lambda: self.contribution.authorships.first().delete()
+        )
+        self.assertEqual(len(results[0]['authorships']), 1)
+
+    def test_affiliation_link_invalidates(self):
+        affiliation = Affiliation.objects.create(**AFFILIATION)
+        authorship = self.contribution.authorships.first()
+
+        results = self.assertInvalidated(
+            lambda: authorship.affiliation.add(affiliation)
+        )
+        self.assertEqual(
+            len(results[0]['authorships'][0]['affiliation']), 2
+        )
+
+    def test_other_users_changes_keep_cache(self):
+        """Changes to contributions of others do not invalidate"""
+        self.client.get(CONTRIBUTION_URL)
+        other = create_user(email='other@gmail.com', password='ajlkjfs5734')
+        create_contribution(other)
+
+        self.client.get(CONTRIBUTION_URL)
+
+        self.assertEqual(requests_counter.value(result='hit'), 1)
+
+    @override_settings(RESPONSE_CACHE=NO_RESPONSE_CACHE)
+    def test_disabled_cache(self):
+        self.client.get(CONTRIBUTION_URL)
+
+        with self.assertNumQueries(4):
+            self.client.get(CONTRIBUTION_URL)
+
+
+def receipt_url(receipt):
+    return reverse('contribution:contribution-receipt', args=[receipt])
+
+
+@override_settings(SUBMISSION_BUFFER=SUBMISSION_BUFFER)
+class SubmissionBufferTests(TestCase):
+    """Test the write-behind submission of contributions"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='koko@gmail.com', password='ajlkjfs5734')
+        self.client.force_authenticate(user=self.user)
+
+    def submit(self, title='Chironomids of the Vltava river'):
+        return self.client.post(CONTRIBUTION_URL, {
+            'title': title,
+            'presentation_form': 'poster',
+            'authorships': [{
+                'author': {'name': 'Vit Syrovatka'},
+                'is_main_author': True,
+                'affiliation': [AFFILIATION],
+            }],
+        }, format='json')
+
+    def test_submission_acknowledged_with_receipt(self):
+        """Submissions are stored and acknowledged, not yet created"""
+        res = self.submit()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], Submission.PENDING)
+        self.assertIsNone(res.data['contribution'])
+        self.assertTrue(res['Location'].endswith(
+            receipt_url(res.data['receipt'])
+        ))
+        self.assertFalse(Contribution.objects.exists())
+
+        res = self.client.get(receipt_url(res.data['receipt']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], Submission.PENDING)
+
+    def test_invalid_submission_rejected(self):
+        """Submissions are validated before they are acknowledged"""
+        res = self.submit(title='')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_single_flush_queued(self):
+        """One flush task is waiting for any number of submissions"""
+        for _ in range(3):
+            self.submit()
+
+        self.assertEqual(Task.objects.filter(
+            name=buffer.flush_submissions.task_name
+        ).count(), 1)
+
+    def test_flush_creates_contributions(self):
+        """The flush task creates contributions a batch per run"""
+        receipts = [self.submit().data['receipt'] for _ in range(3)]
+
+        self.assertEqual(tasks.run_next()[1], 'done')
+        self.assertEqual(Contribution.objects.count(), 2)
+        self.assertEqual(tasks.run_next()[1], 'done')
+        self.assertIsNone(tasks.run_next())
+
+        contributions = Contribution.objects.filter(user=self.user)
+        self.assertEqual(contributions.count(), 3)
+        self.assertEqual(
+            contributions.first().authors.get().name, 'Vit Syrovatka'
+        )
+        res = self.client.get(receipt_url(receipts[0]))
+        self.assertEqual(res.data['status'], Submission.CREATED)
+        self.assertIn(res.data['contribution'],
+                      contributions.values_list('id', flat=True))
+        self.assertEqual(
+            len(self.client.get(CONTRIBUTION_URL).data['results']), 3
+        )
+
+    def test_flush_keeps_submission_time(self):
+        """Contributions keep the registration period of their submission"""
+        receipt = self.submit().data['receipt']
+        Submission.objects.filter(id=receipt).update(
+            created='2020-06-01T12:00:00Z'
+        )
+
+        buffer.flush()
+
+        contribution = Contribution.objects.get(
+            id=Submission.objects.get(id=receipt).contribution_id
+        )
+        self.assertEqual(contribution.created.date().isoformat(),
+                         '2020-06-01')
+        self.assertEqual(contribution.registration_period, 'Normal')
+
+    def test_flush_marks_rejected_submissions_failed(self):
+        """Rows the database rejects fail without holding up the batch"""
+        good = self.submit().data['receipt']
+        bad = Submission.objects.create(
+            user=self.user, data={'title': 'x' * 300}
+        )
+
+        with self.assertLogs('contribution.buffer', 'WARNING'):
+            self.assertEqual(buffer.flush(), 2)
+
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, Submission.FAILED)
+        self.assertTrue(bad.error)
+        self.assertEqual(
+            Submission.objects.get(id=good).status, Submission.CREATED
+        )
+
+    def test_retried_submission_gets_same_receipt(self):
+        """Submissions retried with an Idempotency-Key are stored once"""
+        receipts = {
+            self.client.post(
+                CONTRIBUTION_URL, {'title': 'Chironomids'},
+                HTTP_IDEMPOTENCY_KEY='retry-1'
+            ).data['receipt']
+            for _ in range(2)
+        }
+
+        self.assertEqual(len(receipts), 1)
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_receipt_of_other_user_not_found(self):
+        """Receipts are only visible to the submitting user"""
+        receipt = self.submit().data['receipt']
+        self.client.force_authenticate(user=create_user(
+            email='other@gmail.com', password='ajlkjfs5734'
+        ))
+
+        res = self.client.get(receipt_url(receipt))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
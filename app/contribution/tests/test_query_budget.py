@@ -0,0 +1,234 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Affiliation, Author, Authorship, Contribution
+from core.tests.query_budget import QueryBudgetMixin, shapes
+
+
+CONTRIBUTION_URL = reverse('contribution:contribution-list')
+BULK_URL = reverse('contribution:contribution-bulk')
+FEE_REPORT_URL = reverse('contribution:contribution-fee-report')
+SEARCH_URL = reverse('contribution:contribution-search')
+RECONCILE_URL = reverse('contribution:contribution-reconcile')
+
+# contributions x authorships per contribution x affiliations per authorship
+SIZES = shapes(contributions=(1, 8), authors=(1, 4), affiliations=(1, 3))
+NESTED_SIZES = shapes(authors=(1, 6), affiliations=(1, 3))
+
+
+def detail_url(contribution_id):
+    return reverse('contribution:contribution-detail', args=[contribution_id])
+
+
+def export_url(export_format):
+    return reverse('contribution:contribution-export', args=[export_format])
+
+
+def affiliation_data(number):
+    return {
+        'institution': f'Institute {number}',
+        'department': 'Dept. of Botany and Zoology',
+        'street_address': 'Kotlarska 2',
+        'city': 'Brno',
+        'zip_code': 61137,
+        'country': 'Czech Republic',
+    }
+
+
+def contribution_data(number=0, authors=1, affiliations=1):
+    """Return a contribution payload with nested authorships"""
+    return {
+        'title': f'Chironomids of the Vltava river {number}',
+        'presentation_form': 'oral',
+        'authorships': [
+            {
+                'author': {'name': f'Author {position}'},
+                'is_main_author': position == 0,
+                'affiliation': [
+                    affiliation_data(index) for index in range(affiliations)
+                ],
+            }
+            for position in range(authors)
+        ],
+    }
+
+
+def create_contributions(user, contributions=1, authors=1, affiliations=1):
+    """Create contributions with authorships and affiliations"""
+    affiliation_objs = [
+        Affiliation.objects.create(**affiliation_data(index))
+        for index in range(affiliations)
+    ]
+    created = []
+    for number in range(contributions):
+        contribution = Contribution.objects.create(
+            user=user, title=f'Chironomids {number}'
+        )
+        for position in range(authors):
+            authorship = Authorship.objects.create(
+                author=Author.objects.create(name=f'Author {position}'),
+                contribution=contribution,
+                is_main_author=position == 0,
+            )
+            authorship.affiliation.set(affiliation_objs)
+        created.append(contribution)
+    return created
+
+
+class ContributionQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the query budgets of the contribution endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='koko@gmail.com', password='ajlkjfs5734'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def staff_client(self):
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_list(self):
+        def scenario(**shape):
+            create_contributions(self.user, **shape)
+            return lambda: self.client.get(CONTRIBUTION_URL)
+
+        self.assertQueryBudget(4, scenario, SIZES)
+
+    def test_retrieve(self):
+        def scenario(**shape):
+            contribution = create_contributions(self.user, **shape)[0]
+            return lambda: self.client.get(detail_url(contribution.id))
+
+        self.assertQueryBudget(4, scenario, SIZES)
+
+    def test_create(self):
+        def scenario(**shape):
+            return lambda: self.client.post(
+                CONTRIBUTION_URL, contribution_data(**shape), format='json'
+            )
+
+        self.assertQueryBudget(
+            10, scenario, NESTED_SIZES, status=status.HTTP_201_CREATED
+        )
+
+    def test_create_replayed(self):
+        def scenario(**shape):
+            data = contribution_data(**shape)
+            self.client.post(CONTRIBUTION_URL, data, format='json',
+                             HTTP_IDEMPOTENCY_KEY='retry-1')
+            return lambda: self.client.post(
+                CONTRIBUTION_URL, data, format='json',
+                HTTP_IDEMPOTENCY_KEY='retry-1'
+            )
+
+        self.assertQueryBudget(
+            3, scenario, NESTED_SIZES, status=status.HTTP_201_CREATED
+        )
+
+    @override_settings(SUBMISSION_BUFFER={
+        'ENABLED': True, 'BATCH_SIZE': 500, 'FLUSH_DELAY': 1,
+    })
+    def test_buffered_create(self):
+        def scenario(**shape):
+            return lambda: self.client.post(
+                CONTRIBUTION_URL, contribution_data(**shape), format='json'
+            )
+
+        self.assertQueryBudget(
+            5, scenario, NESTED_SIZES, status=status.HTTP_202_ACCEPTED
+        )
+
+    def test_update(self):
+        def scenario(**shape):
+            contribution = create_contributions(self.user, **shape)[0]
+            return lambda: self.client.put(
+                detail_url(contribution.id),
+                {'title': 'Beetles', 'presentation_form': 'oral'}
+            )
+
+        self.assertQueryBudget(8, scenario, SIZES)
+
+    def test_partial_update(self):
+        def scenario(**shape):
+            contribution = create_contributions(self.user, **shape)[0]
+            return lambda: self.client.patch(
+                detail_url(contribution.id), {'title': 'Beetles'}
+            )
+
+        self.assertQueryBudget(8, scenario, SIZES)
+
+    def test_destroy(self):
+        def scenario(**shape):
+            contribution = create_contributions(self.user, **shape)[0]
+            return lambda: self.client.delete(detail_url(contribution.id))
+
+        self.assertQueryBudget(
+            5, scenario, SIZES, status=status.HTTP_204_NO_CONTENT
+        )
+
+    def test_bulk(self):
+        def scenario(contributions, **shape):
+            return lambda: self.client.post(BULK_URL, [
+                contribution_data(number, **shape)
+                for number in range(contributions)
+            ], format='json')
+
+        self.assertQueryBudget(
+            10, scenario, SIZES, status=status.HTTP_201_CREATED
+        )
+
+    def test_fee_report(self):
+        self.staff_client()
+
+        def scenario(**shape):
+            create_contributions(self.user, **shape)
+            return lambda: self.client.get(FEE_REPORT_URL)
+
+        self.assertQueryBudget(1, scenario, SIZES)
+
+    def test_export(self):
+        self.staff_client()
+
+        for export_format in ('csv', 'ndjson'):
+            def scenario(**shape):
+                create_contributions(self.user, **shape)
+                return lambda: self.client.get(export_url(export_format))
+
+            self.assertQueryBudget(1, scenario, SIZES)
+
+    def test_search(self):
+        self.staff_client()
+
+        def scenario(**shape):
+            create_contributions(self.user, **shape)
+            return lambda: self.client.get(
+                SEARCH_URL, {'search': 'chironomids'}
+            )
+
+        self.assertQueryBudget(3, scenario, SIZES)
+
+    def test_reconcile(self):
+        self.staff_client()
+
+        def scenario(contributions, **shape):
+            created = create_contributions(self.user, contributions, **shape)
+            statement = io.BytesIO(''.join(
+                ['contribution,amount\n'] + [
+                    f'{contribution.id},{contribution.fee_due}\n'
+                    for contribution in created
+                ]
+            ).encode())
+            statement.name = 'statement.csv'
+            return lambda: self.client.post(
+                RECONCILE_URL, {'statement': statement}, format='multipart'
+            )
+
+        self.assertQueryBudget(4, scenario, SIZES)
@@ -1,24 +1,312 @@
+import codecs
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.reverse import reverse
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
 # Create your views here.
-from contribution import serializers
-from core.models import Contribution
+from contribution import buffer, export, reconciliation, serializers
+from contribution.cache import response_cache
+from contribution.filters import ContributionSearchFilter
+from contribution.pagination import ContributionCursorPagination
+from core.idempotency import idempotent_response
+from core.models import Contribution, Submission
+from user.authentication import AUTHENTICATION_CLASSES
+
+BULK_MAX_ITEMS = 500
+STATEMENT_ENCODING = 'utf-8-sig'
+
+EXPORT_FORMATS = {
+    'csv': (export.stream_csv, 'text/csv'),
+    'ndjson': (export.stream_ndjson, 'application/x-ndjson'),
+}
+
+
+def conditional_response(request, view, validator, last_modified):
+    """Return 304 if the client's copy is current, else render the view.
+
+    validator is a cheap summary of the rendered data, it is hashed together
+    with the path and negotiated media type into a strong ETag.
+    """
+    etag = quote_etag(hashlib.sha1(':'.join([
+        validator,
+        request.get_full_path(),
+        request.accepted_media_type,
+    ]).encode()).hexdigest())
+    last_modified = last_modified and int(last_modified.timestamp())
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+
+    response = view()
+    if response.status_code == status.HTTP_200_OK:
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
 
 
 class ContributionViewSet(ModelViewSet):
     """Manage Contributions in the db"""
     serializer_class = serializers.ContributionSerializer
     queryset = Contribution.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = AUTHENTICATION_CLASSES
     permission_classes = (IsAuthenticated,)
+    pagination_class = ContributionCursorPagination
+    filter_backends = (ContributionSearchFilter,)
+    # actions whose looked up instance is not rendered as it was fetched
+    unrendered_actions = ('update', 'partial_update', 'destroy')
+    # actions rendered from values() rows when compiled reads are enabled
+    compiled_actions = ('list', 'retrieve', 'search')
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset
+        if self.action != 'search':
+            queryset = queryset.filter(user=self.request.user)
+        if self.action in self.unrendered_actions:
+            return queryset
+        if self.compiled_reads():
+            return queryset.values(
+                *serializers.CompiledSerializer.columns(
+                    self.get_serializer_class()
+                ),
+                *(field.lstrip('-')
+                  for field in self.pagination_class.ordering),
+            )
+        return self.with_nested(queryset)
+
+    def compiled_reads(self):
+        """Whether to render the action without the serializer's fields.
+
+        The browsable API keeps using the serializer, which it needs for
+        its forms.
+        """
+        return settings.CONTRIBUTION_COMPILED_READS and \
+            self.action in self.compiled_actions and \
+            self.request.accepted_renderer.format == 'json'
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.compiled_reads():
+            return serializers.CompiledSerializer(
+                self.get_serializer_class(), *args, **kwargs
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def with_nested(self, queryset):
+        """Return the queryset fetching the serializer's nested rows"""
+        serializer_class = self.get_serializer_class()
+        return queryset.select_related(
+            *serializers.select_plan(serializer_class)
+        ).prefetch_related(
+            *serializers.prefetch_plan(serializer_class)
+        )
+
+    def list(self, request, *args, **kwargs):
+        return response_cache.get_or_render(
+            request,
+            request.user.id,
+            lambda: self.conditional_list(request, *args, **kwargs),
+        )
+
+    def conditional_list(self, request, *args, **kwargs):
+        state = self.queryset.filter(user=request.user).aggregate(
+            count=Count('id'),
+            last_modified=Max('last_modified'),
+        )
+        validator = f"{request.user.id}:{state['count']}:" \
+            f"{state['last_modified']}"
+        return conditional_response(
+            request,
+            lambda: super(ContributionViewSet, self).list(
+                request, *args, **kwargs
+            ),
+            validator,
+            state['last_modified'],
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            last_modified = self.queryset.filter(
+                user=request.user,
+                pk=kwargs[self.lookup_url_kwarg or self.lookup_field],
+            ).values_list('last_modified', flat=True).first()
+        except (TypeError, ValueError):
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        validator = f"{request.user.id}:{last_modified}"
+        return conditional_response(
+            request,
+            lambda: super(ContributionViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            validator,
+            last_modified,
+        )
+
+    def create(self, request, *args, **kwargs):
+        return idempotent_response(
+            request,
+            lambda: self.create_or_submit(request, *args, **kwargs),
+        )
+
+    def create_or_submit(self, request, *args, **kwargs):
+        """Create the contribution, or buffer it when write-behind is on"""
+        if not buffer.enabled():
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submission = buffer.submit(request.user, serializer.validated_data)
+        url = reverse(
+            'contribution:contribution-receipt', args=[submission.id],
+            request=request
+        )
+        return Response(
+            serializers.SubmissionReceiptSerializer(submission).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url},
+        )
+
+    @action(detail=False, methods=['get'],
+            url_path=r'receipts/(?P<receipt>[0-9a-f-]{36})')
+    def receipt(self, request, receipt):
+        """Return the state of a write-behind submission"""
+        submission = get_object_or_404(
+            Submission.objects.all(), id=receipt, user=request.user
+        )
+        return Response(
+            serializers.SubmissionReceiptSerializer(submission).data
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        # contributions are inserted in bulk, without post_save signals
+        response_cache.invalidate(self.request.user.id)
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        """Fetch the saved instance with its nested rows for the response"""
+        serializer.instance = self.with_nested(self.queryset).get(
+            pk=serializer.instance.pk
+        )
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create a batch of contributions, reporting results per item"""
+        if not isinstance(request.data, list):
+            return Response(
+                {'detail': 'Expected a list of contributions.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'At most {BULK_MAX_ITEMS} contributions '
+                           f'may be submitted at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = [self.get_serializer(data=data) for data in request.data]
+        valid = [item for item in items if item.is_valid()]
+        created = Contribution.objects.bulk_create_nested(
+            dict(item.validated_data, user=request.user) for item in valid
+        )
+        if created:
+            response_cache.invalidate(request.user.id)
+        instances = self.get_queryset().in_bulk(
+            [contribution.id for contribution in created]
+        )
+        created = iter(created)
+
+        results = []
+        for item in items:
+            if item.errors:
+                results.append({
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': item.errors,
+                })
+            else:
+                instance = instances[next(created).id]
+                results.append({
+                    'status': status.HTTP_201_CREATED,
+                    'data': self.get_serializer(instance).data,
+                })
+
+        if len(valid) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+    @action(detail=False, methods=['get'], url_path='reports/fees',
+            permission_classes=[IsAdminUser])
+    def fee_report(self, request):
+        """Return registration fee totals over all contributions"""
+        groups = list(self.queryset.fee_report())
+        return Response({
+            'groups': groups,
+            'count': sum(group['count'] for group in groups),
+            'total': sum(group['total'] for group in groups),
+        })
+
+    @action(detail=False, methods=['get'],
+            url_path=r'export/(?P<export_format>csv|ndjson)',
+            permission_classes=[IsAdminUser])
+    def export(self, request, export_format):
+        """Stream all contributions with authors and affiliations"""
+        stream, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream(self.queryset), content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="contributions.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def search(self, request):
+        """Search the contributions of all users"""
+        return super().list(request)
+
+    @action(detail=False, methods=['post'], url_path='payments/reconcile',
+            permission_classes=[IsAdminUser])
+    def reconcile(self, request):
+        """Mark contributions paid by an uploaded bank statement CSV"""
+        statement = request.FILES.get('statement')
+        if statement is None:
+            return Response(
+                {'detail': 'Upload the bank statement as statement.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            report = reconciliation.reconcile_payments(
+                codecs.iterdecode(statement, STATEMENT_ENCODING),
+                dry_run=request.query_params.get('dry_run') in ('1', 'true'),
+            )
+        except (reconciliation.StatementError, UnicodeDecodeError) as exc:
+            return Response(
+                {'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report)
 
 # class CreateContribution(CreateAPIView):
 #     serializer_class = ContributionSerializer
@@ -1,5 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
 from core import models
@@ -25,4 +30,131 @@ class UserAdmin(BaseUserAdmin):
             }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        """Search with the trigram indexed User.objects.search()"""
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def get_ordering(self, request):
+        if request.GET.get(SEARCH_VAR):
+            return ('-similarity',) + self.ordering
+        return super().get_ordering(request)
+
 # admin.site.register(User, UserAdmin)
+
+
+def estimated_count(model, using='default'):
+    """Return the planner's estimate of the rows in the model's table"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator taking the size of large unfiltered tables from statistics.
+
+    COUNT(*) scans the whole table, the estimate kept by VACUUM and ANALYZE
+    is read instantly. Filtered and small tables are counted exactly.
+    """
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate >= self.threshold:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or list in full"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-id',)
+
+
+class AuthorshipInline(admin.TabularInline):
+    model = models.Authorship
+    extra = 0
+    autocomplete_fields = ('author', 'affiliation')
+
+
+@admin.register(models.Contribution)
+class ContributionAdmin(LargeTableAdmin):
+    list_display = (
+        'id', 'title', 'user', 'presentation_form', 'created',
+        'registration_period', 'fee_due', 'fee_payed',
+    )
+    list_filter = ('presentation_form', 'registration_period', 'fee_payed')
+    list_select_related = ('user',)
+    search_fields = ('title',)
+    autocomplete_fields = ('user',)
+    inlines = (AuthorshipInline,)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search titles and authors with the full-text index"""
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+
+@admin.register(models.Authorship)
+class AuthorshipAdmin(LargeTableAdmin):
+    list_display = ('id', 'author', 'contribution_title', 'is_main_author')
+    list_filter = ('is_main_author',)
+    list_select_related = ('author', 'contribution')
+    search_fields = ('author__name',)
+    autocomplete_fields = ('author', 'contribution', 'affiliation')
+
+    def contribution_title(self, obj):
+        return obj.contribution.title
+    contribution_title.short_description = _('Contribution')
+    contribution_title.admin_order_field = 'contribution__title'
+
+
+@admin.register(models.Author)
+class AuthorAdmin(LargeTableAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('name',)
+
+
+@admin.register(models.Affiliation)
+class AffiliationAdmin(LargeTableAdmin):
+    list_display = (
+        'id', 'institution', 'department', 'city', 'zip_code', 'country',
+    )
+    list_filter = ('country',)
+    search_fields = ('institution', 'department', 'city')
+
+
+@admin.register(models.Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'created')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+    ordering = ('run_at',)
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        """Queue the selected tasks to run again now"""
+        queryset.update(
+            status=models.Task.QUEUED, attempts=0, run_at=timezone.now()
+        )
+    retry.short_description = _('Run selected tasks again')
+
+
+@admin.register(models.Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created', 'contribution_id')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    ordering = ('-created',)
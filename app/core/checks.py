@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.db import DEFAULT_DB_ALIAS
+
+from core.models import missing_trigram_indexes
+from core.routers import pins_shared
+
+
+@register()
+def replica_pin_cache_check(app_configs, **kwargs):
+    """Warn about replicas left unused for want of a shared pin cache"""
+    if settings.DATABASE_REPLICAS and not pins_shared():
+        return [Warning(
+            'Replica pins are kept in the local memory of every process, '
+            'all reads are served by the primary.',
+            hint="Set REPLICA_ROUTING['PIN_CACHE'] to an entry of CACHES "
+                 'shared by all processes.',
+            id='core.W001',
+        )]
+    return []
+
+
+@register(Tags.database)
+def trigram_index_check(app_configs, **kwargs):
+    """Warn about user search scanning the table for want of indexes"""
+    missing = missing_trigram_indexes(DEFAULT_DB_ALIAS)
+    if missing:
+        return [Warning(
+            f'The trigram indexes {", ".join(missing)} are missing, user '
+            f'search scans the whole table.',
+            hint='Install pg_trgm and run manage.py create_trigram_indexes.',
+            id='core.W002',
+        )]
+    return []
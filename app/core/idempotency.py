@@ -0,0 +1,112 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# response headers replayed along with the data
+STORED_HEADERS = ('Location',)
+# request fields left out of fingerprints, their digests are kept for hours
+REDACTED_FIELDS = ('password',)
+
+
+def redacted(data):
+    """Return data without the REDACTED_FIELDS of any nested dict"""
+    if isinstance(data, dict):
+        return {
+            field: redacted(value) for field, value in data.items()
+            if field not in REDACTED_FIELDS
+        }
+    if isinstance(data, (list, tuple)):
+        return [redacted(value) for value in data]
+    return data
+
+
+def fingerprint(request):
+    """Return a keyed digest of the method, path and data of the request"""
+    return salted_hmac('core.idempotency.fingerprint', ':'.join([
+        request.method,
+        request.path,
+        json.dumps(redacted(request.data), sort_keys=True,
+                   cls=DjangoJSONEncoder, default=str),
+    ])).hexdigest()
+
+
+def client(request):
+    """Return a keyed digest of the address of an anonymous client"""
+    return salted_hmac(
+        'core.idempotency.client', request.META.get('REMOTE_ADDR', '')
+    ).hexdigest()
+
+
+def idempotent_response(request, view):
+    """Return the view's response, once per Idempotency-Key.
+
+    Requests without the header just call view. The first request with a
+    key stores its response, requests repeating the key of the same user
+    get the stored response without calling view until it expires. Keys
+    of anonymous requests are scoped by the client address. The key row
+    is locked until the first request commits, so concurrent repeats wait
+    for it instead of running view again. Reusing a key for a different
+    request is refused. Exceptions and server errors are not stored, the
+    request may be retried with the same key.
+    """
+    key = request.META.get(HEADER)
+    if not key:
+        return view()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'detail': f'Idempotency-Key may have at most {MAX_KEY_LENGTH} '
+                       f'characters.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    digest = fingerprint(request)
+    now = timezone.now()
+    expires = now + datetime.timedelta(seconds=settings.IDEMPOTENCY['TTL'])
+    user = request.user if request.user.is_authenticated else None
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.select_for_update(
+        ).get_or_create(
+            user=user, client='' if user else client(request), key=key,
+            defaults={'fingerprint': digest, 'expires': expires},
+        )
+        if not created and record.expires > now:
+            if record.fingerprint != digest:
+                return Response(
+                    {'detail': 'Idempotency-Key was used for a different '
+                               'request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is not None:
+                response = Response(
+                    record.data, status=record.status_code,
+                    headers=record.headers,
+                )
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+        response = view()
+        if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            record.delete()
+            return response
+        record.fingerprint = digest
+        record.status_code = response.status_code
+        record.data = response.data
+        record.headers = {
+            header: response[header]
+            for header in STORED_HEADERS if response.has_header(header)
+        }
+        record.created = now
+        record.expires = expires
+        record.save()
+    return response
@@ -0,0 +1,360 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings collected while handling a single request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        self.alias_queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their time"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            alias = context['connection'].alias
+            self.alias_queries[alias] = self.alias_queries.get(alias, 0) + 1
+
+
+class Histogram:
+    """Prometheus style histogram with fixed bucket bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def expose(self, name, labels):
+        cumulative = 0
+        separator = ',' if labels else ''
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}{separator}le="{bound}"}} ' \
+                f'{cumulative}'
+        labels = f'{{{labels}}}' if labels else ''
+        yield f'{name}_sum{labels} {self.sum}'
+        yield f'{name}_count{labels} {self.count}'
+
+
+class Counter:
+    """Prometheus style counter with values per label combination"""
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        return self._values.get(key, 0)
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = ','.join(
+                f'{label}="{part}"' for label, part in zip(self.labels, key)
+            )
+            yield f'{self.name}{{{labels}}} {value}' if labels \
+                else f'{self.name} {value}'
+
+
+class Gauge:
+    """Prometheus style gauge, set directly or read from a function.
+
+    The function returns the values per tuple of label values.
+    """
+
+    def __init__(self, name, description, labels=(), function=None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.function = function
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def set(self, value, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def values(self):
+        if self.function is not None:
+            return dict(self.function())
+        with self._lock:
+            return dict(self._values)
+
+    def value(self, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        return self.values().get(key, 0)
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} gauge'
+        for key, value in sorted(self.values().items()):
+            labels = ','.join(
+                f'{label}="{part}"' for label, part in zip(self.labels, key)
+            )
+            yield f'{self.name}{{{labels}}} {value}' if labels \
+                else f'{self.name} {value}'
+
+
+class LabeledHistogram:
+    """Prometheus style histogram per label combination"""
+
+    def __init__(self, name, description, buckets, labels=()):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def histogram(self, **labels):
+        return self._histograms.get(
+            tuple(labels[label] for label in self.labels)
+        )
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            for key, histogram in histograms:
+                yield from histogram.expose(self.name, ','.join(
+                    f'{label}="{part}"'
+                    for label, part in zip(self.labels, key)
+                ))
+
+
+class MetricsRegistry:
+    """Per-route request histograms of this process"""
+    histograms = (
+        ('http_request_duration_seconds', DURATION_BUCKETS,
+         'Time spent handling the request.'),
+        ('http_request_view_duration_seconds', DURATION_BUCKETS,
+         'Time spent outside the database and renderers.'),
+        ('http_request_db_duration_seconds', DURATION_BUCKETS,
+         'Time spent executing SQL queries.'),
+        ('http_request_render_duration_seconds', DURATION_BUCKETS,
+         'Time spent rendering the response body.'),
+        ('http_request_db_queries', QUERY_BUCKETS,
+         'Number of SQL queries executed.'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            for metric in self._metrics:
+                metric.reset()
+
+    def counter(self, name, description, labels=()):
+        """Return a new counter exposed along with the histograms"""
+        counter = Counter(name, description, labels)
+        with self._lock:
+            self._metrics.append(counter)
+        return counter
+
+    def gauge(self, name, description, labels=(), function=None):
+        """Return a new gauge exposed along with the histograms"""
+        gauge = Gauge(name, description, labels, function)
+        with self._lock:
+            self._metrics.append(gauge)
+        return gauge
+
+    def histogram(self, name, description, buckets=DURATION_BUCKETS,
+                  labels=()):
+        """Return a new labeled histogram exposed along with the others"""
+        histogram = LabeledHistogram(name, description, buckets, labels)
+        with self._lock:
+            self._metrics.append(histogram)
+        return histogram
+
+    def observe(self, route, method, values):
+        """Record one request, values are in the order of histograms"""
+        with self._lock:
+            histograms = self._routes.get((route, method))
+            if histograms is None:
+                histograms = self._routes[(route, method)] = [
+                    Histogram(buckets) for _, buckets, _ in self.histograms
+                ]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+
+    def expose(self):
+        """Return all histograms in the Prometheus text format"""
+        lines = []
+        with self._lock:
+            for index, (name, _, description) in enumerate(self.histograms):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method), histograms in sorted(
+                        self._routes.items()):
+                    labels = f'route="{route}",method="{method}"'
+                    lines.extend(histograms[index].expose(name, labels))
+            for metric in self._metrics:
+                lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+db_queries_counter = registry.counter(
+    'http_request_db_queries_total',
+    'SQL queries executed by requests per database alias.',
+    labels=('alias',),
+)
+
+
+class InstrumentationMiddleware:
+    """Measure query count, DB, view and render time of every request.
+
+    Adds a Server-Timing header to the response and records the timings
+    per route in the registry exposed by metrics_view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = time.perf_counter() - start
+        view_time = max(total - metrics.db_time - metrics.render_time, 0.0)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'view;dur={view_time * 1000:.1f}',
+            f'render;dur={metrics.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unmatched',
+            request.method,
+            (total, view_time, metrics.db_time, metrics.render_time,
+             metrics.queries),
+        )
+        for alias, queries in metrics.alias_queries.items():
+            db_queries_counter.inc(queries, alias=alias)
+        return response
+
+
+class TimedRendererMixin:
+    """Add the time spent rendering to the current request metrics"""
+
+    def render(self, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.rendering:
+            return super().render(*args, **kwargs)
+
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metrics.render_time += time.perf_counter() - start
+            metrics.rendering = False
+
+
+class TimedJSONRenderer(TimedRendererMixin, JSONRenderer):
+    pass
+
+
+class TimedBrowsableAPIRenderer(TimedRendererMixin, BrowsableAPIRenderer):
+    pass
+
+
+def authorized(authorization):
+    """Return whether the Authorization header has the metrics token"""
+    token = settings.METRICS['TOKEN']
+    return bool(token) and constant_time_compare(
+        authorization, f'Bearer {token}'
+    )
+
+
+def metrics_view(request):
+    """Expose the request metrics of this process to Prometheus.
+
+    Only staff users and scrapers sending the metrics token may read them.
+    """
+    if not (request.user.is_active and request.user.is_staff) and \
+            not authorized(request.META.get('HTTP_AUTHORIZATION', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.expose(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,340 @@
+import datetime
+import http.client
+import json
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+SCENARIOS = (
+    'token',
+    'me',
+    'contribution-list',
+    'contribution-retrieve',
+    'contribution-create',
+    'contribution-update',
+)
+AFFILIATION = {
+    'institution': 'Masaryk University',
+    'department': 'Dept. of Botany and Zoology',
+    'street_address': 'Kotlarska 2',
+    'city': 'Brno',
+    'zip_code': 61137,
+    'country': 'Czech Republic',
+}
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    index = max(math.ceil(fraction * len(values)) - 1, 0)
+    return values[index]
+
+
+def contribution_payload(number, authors=3):
+    """Return a contribution with nested authorships to submit"""
+    return {
+        'title': f'Benchmark contribution {number}',
+        'presentation_form': 'oral',
+        'authorships': [
+            {
+                'author': {'name': f'Author {number}-{position}'},
+                'is_main_author': position == 0,
+                'affiliation': [AFFILIATION],
+            }
+            for position in range(authors)
+        ],
+    }
+
+
+def summarize(samples, elapsed):
+    """Return latency percentiles, throughput and queries of samples"""
+    latencies = sorted(sample['latency'] for sample in samples)
+    queries = [
+        sample['queries'] for sample in samples
+        if sample['queries'] is not None
+    ]
+    errors = sum(1 for sample in samples if sample['status'] >= 400)
+
+    def milliseconds(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'requests_per_second': round(len(samples) / elapsed, 2)
+        if elapsed else None,
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'queries_per_request': round(sum(queries) / len(queries), 2)
+        if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """Return descriptions of scenarios regressed against the baseline"""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if current[key] is not None and previous[key] is not None and \
+                    current[key] > previous[key] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {key} {current[key]} > {previous[key]}'
+                )
+        if current['requests_per_second'] is not None and \
+                previous['requests_per_second'] is not None and \
+                current['requests_per_second'] < \
+                previous['requests_per_second'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: requests_per_second '
+                f"{current['requests_per_second']} < "
+                f"{previous['requests_per_second']}"
+            )
+        if current['max_queries'] is not None and \
+                previous['max_queries'] is not None and \
+                current['max_queries'] > previous['max_queries']:
+            regressions.append(
+                f"{name}: max_queries {current['max_queries']} > "
+                f"{previous['max_queries']}"
+            )
+        if current['errors'] > previous['errors']:
+            regressions.append(
+                f"{name}: errors {current['errors']} > {previous['errors']}"
+            )
+    return regressions
+
+
+class Client:
+    """JSON API client keeping one connection alive per thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection \
+            if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.authorization = None
+        self._local = threading.local()
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(
+                self.netloc, timeout=60
+            )
+        return connection
+
+    def request(self, method, path, data=None):
+        """Send a request, return a sample of its status and timings"""
+        headers = {'Accept': 'application/json'}
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        if self.authorization:
+            headers['Authorization'] = self.authorization
+
+        for attempt in range(2):
+            connection = self.connection()
+            start = time.perf_counter()
+            try:
+                connection.request(
+                    method, self.prefix + path, body, headers
+                )
+                response = connection.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # the server closed the kept alive connection, reconnect
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+                continue
+            latency = time.perf_counter() - start
+            break
+
+        match = QUERIES_PATTERN.search(
+            response.getheader('Server-Timing') or ''
+        )
+        return {
+            'status': response.status,
+            'latency': latency,
+            'queries': int(match.group(1)) if match else None,
+            'content': content,
+        }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API of a running server"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument(
+            '--email', default='user0@example.org',
+            help='User to benchmark as, seed_conference creates user0.'
+        )
+        parser.add_argument('--password', default='conference2020')
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Scenario to run, may be repeated, all by default.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of requests per scenario.'
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--authors', type=int, default=3,
+            help='Nested authorships per created contribution.'
+        )
+        parser.add_argument(
+            '--output', help='File to write the results to as JSON.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results of an earlier run to check for regressions.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative change of latency and throughput.'
+        )
+
+    def handle(self, *args, **options):
+        self.client = Client(options['url'])
+        self.options = options
+        self.credentials = {
+            'email': options['email'],
+            'password': options['password'],
+        }
+        self.authenticate()
+        self.contribution_ids = self.prepare_contributions()
+
+        results = {
+            'url': options['url'],
+            'started': datetime.datetime.now(
+                datetime.timezone.utc
+            ).isoformat(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'authors': options['authors'],
+            'scenarios': {},
+        }
+        for name in options['scenario'] or SCENARIOS:
+            summary = self.run_scenario(name)
+            results['scenarios'][name] = summary
+            self.stdout.write(
+                f"{name:24} {summary['requests_per_second']:>9} req/s  "
+                f"p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  "
+                f"p99 {summary['p99_ms']}ms  "
+                f"{summary['queries_per_request']} queries  "
+                f"{summary['errors']} errors"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = compare_results(
+                results, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions against the baseline:\n' +
+                    '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
+
+    def authenticate(self):
+        """Obtain a token of the benchmarked user"""
+        data = self.expect(200, self.client.request(
+            'POST', reverse('user:token'), self.credentials
+        ), f"obtain a token for {self.credentials['email']}")
+        if 'access' in data:
+            self.client.authorization = f"Bearer {data['access']}"
+        else:
+            self.client.authorization = f"Token {data['token']}"
+
+    def prepare_contributions(self):
+        """Return ids of the user's contributions, creating a few if none"""
+        data = self.expect(200, self.client.request(
+            'GET', reverse('contribution:contribution-list')
+        ), 'list the contributions')
+        # paginated or not
+        items = data['results'] if isinstance(data, dict) else data
+        ids = [item['id'] for item in items]
+        for number in range(len(ids), self.options['concurrency']):
+            data = self.expect(201, self.client.request(
+                'POST', reverse('contribution:contribution-list'),
+                contribution_payload(number, self.options['authors'])
+            ), 'create a contribution')
+            ids.append(data['id'])
+        return ids
+
+    def expect(self, status, sample, action):
+        """Return the JSON data of the sample, fail unless it has status"""
+        content = sample['content'].decode(errors='replace')
+        if sample['status'] == status:
+            try:
+                return json.loads(content)
+            except ValueError:
+                pass
+        raise CommandError(
+            f"Could not {action}, got {sample['status']}: {content}"
+        )
+
+    def scenario_request(self, name, number):
+        """Send the number-th request of the scenario"""
+        list_url = reverse('contribution:contribution-list')
+        if name == 'token':
+            return self.client.request(
+                'POST', reverse('user:token'), self.credentials
+            )
+        if name == 'me':
+            return self.client.request('GET', reverse('user:me'))
+        if name == 'contribution-list':
+            return self.client.request('GET', list_url)
+        if name == 'contribution-create':
+            return self.client.request('POST', list_url, contribution_payload(
+                number, self.options['authors']
+            ))
+
+        # at least one contribution per worker keeps concurrent updates apart
+        contribution_id = self.contribution_ids[
+            number % len(self.contribution_ids)
+        ]
+        detail_url = reverse(
+            'contribution:contribution-detail', args=[contribution_id]
+        )
+        if name == 'contribution-retrieve':
+            return self.client.request('GET', detail_url)
+        # nested authorships are written on creation only
+        return self.client.request('PUT', detail_url, {
+            'title': f'Benchmark contribution {number}',
+            'presentation_form': 'oral',
+        })
+
+    def run_scenario(self, name):
+        with ThreadPoolExecutor(self.options['concurrency']) as executor:
+            start = time.perf_counter()
+            samples = list(executor.map(
+                lambda number: self.scenario_request(name, number),
+                range(self.options['requests'])
+            ))
+            elapsed = time.perf_counter() - start
+        return summarize(samples, elapsed)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.models import TRIGRAM_INDEXES, missing_trigram_indexes
+
+
+class Command(BaseCommand):
+    """Django command to create the trigram indexes of user search.
+
+    Migration 0013 skips them where pg_trgm is not available, run the
+    command once it is installed. Existing indexes are kept.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to create the indexes in.',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+            if cursor.fetchone() is None:
+                raise CommandError(
+                    'The pg_trgm extension is not available, install the '
+                    'PostgreSQL contrib package first.'
+                )
+            missing = missing_trigram_indexes(using)
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name in missing:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON core_user '
+                    f'USING gin ({TRIGRAM_INDEXES[name]} gin_trgm_ops)'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(missing)} trigram indexes'
+        ))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contribution.buffer import flush
+
+
+class Command(BaseCommand):
+    """Django command to insert all pending write-behind submissions"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.SUBMISSION_BUFFER['BATCH_SIZE']
+        )
+
+    def handle(self, *args, **options):
+        flushed = flush(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Flushed {flushed} submissions'
+        ))
@@ -0,0 +1,63 @@
+import csv
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user.imports import UserFileError, import_users
+
+REJECTED_COLUMNS = ['line', 'email', 'status', 'error']
+
+
+class Command(BaseCommand):
+    """Django command to create users with tokens from a CSV file.
+
+    The file has an email column and optional name and password columns,
+    users without a password get an unusable one.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', help='Path of the CSV file, - for stdin.')
+        parser.add_argument(
+            '--workers', type=int, default=settings.USER_IMPORT['WORKERS'],
+            help='Number of processes hashing passwords.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=settings.USER_IMPORT['CHUNK_SIZE']
+        )
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument(
+            '--report', help='Write the rejected lines to this CSV file.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['users'] == '-':
+                report = self.import_users(sys.stdin, options)
+            else:
+                with open(options['users'], newline='',
+                          encoding=options['encoding']) as users:
+                    report = self.import_users(users, options)
+        except (OSError, UserFileError, UnicodeDecodeError) as exc:
+            raise CommandError(exc)
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as file:
+                writer = csv.DictWriter(file, REJECTED_COLUMNS)
+                writer.writeheader()
+                writer.writerows(report['rejected'])
+
+        for status, count in report['counts'].items():
+            self.stdout.write(f'{status}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['counts']['created']} of {report['lines']} "
+            f"users"
+        ))
+
+    def import_users(self, users, options):
+        return import_users(
+            users,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
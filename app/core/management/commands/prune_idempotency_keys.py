@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Django command to delete expired Idempotency-Key responses"""
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(
+            expires__lte=timezone.now()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired idempotency keys'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from core.models import Contribution
+
+
+class Command(BaseCommand):
+    """Django command to recompute stored registration periods and fees.
+
+    Run after changing REGISTRATION_DEADLINE or REGISTRATION_FEES. Rows
+    are updated in primary key ranges, each in its own transaction, and
+    only where the stored values differ.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the number of outdated contributions.'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            stale = Contribution.objects.stale_fees().count()
+            self.stdout.write(f'{stale} contributions have outdated fees')
+            return
+
+        last_id = Contribution.objects.aggregate(last=Max('id'))['last'] or 0
+        chunk_size = options['chunk_size']
+        updated = 0
+        for start in range(0, last_id, chunk_size):
+            with transaction.atomic():
+                updated += Contribution.objects.filter(
+                    id__gt=start, id__lte=start + chunk_size
+                ).update_fees()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed fees of {updated} contributions'
+        ))
@@ -0,0 +1,64 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contribution.reconciliation import CHUNK_SIZE, StatementError, \
+    reconcile_payments
+
+MISMATCH_COLUMNS = ['line', 'reference', 'amount', 'status', 'expected']
+
+
+class Command(BaseCommand):
+    """Django command to mark contributions paid by a bank statement.
+
+    The statement is a CSV file with an amount column and a contribution,
+    id or reference column. Lines paying the fee due of an unpaid
+    contribution mark it paid, the other lines are reported.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'statement', help='Path of the statement CSV, - for stdin.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report, without marking contributions paid.'
+        )
+        parser.add_argument(
+            '--report', help='Write the unmatched lines to this CSV file.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['statement'] == '-':
+                report = self.reconcile(sys.stdin, options)
+            else:
+                with open(options['statement'], newline='',
+                          encoding=options['encoding']) as statement:
+                    report = self.reconcile(statement, options)
+        except (OSError, StatementError, UnicodeDecodeError) as exc:
+            raise CommandError(exc)
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as file:
+                writer = csv.DictWriter(file, MISMATCH_COLUMNS)
+                writer.writeheader()
+                writer.writerows(report['mismatches'])
+
+        for status, count in report['counts'].items():
+            self.stdout.write(f'{status}: {count}')
+        verb = 'Would mark' if options['dry_run'] else 'Marked'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['counts']['matched']} of {report['lines']} "
+            f"statement lines paid"
+        ))
+
+    def reconcile(self, statement, options):
+        return reconcile_payments(
+            statement,
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
@@ -0,0 +1,108 @@
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.module_loading import autodiscover_modules
+
+from core.instrumentation import authorized, registry
+from core.tasks import run_next
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Expose the metrics of the worker to Prometheus"""
+
+    def do_GET(self):
+        if settings.METRICS['TOKEN'] and \
+                not authorized(self.headers.get('Authorization', '')):
+            self.send_error(403)
+            return
+        body = registry.expose().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """Django command to run background tasks of core.tasks.
+
+    Tasks are taken from the database with SELECT ... FOR UPDATE SKIP
+    LOCKED, so any number of workers can run side by side. SIGTERM and
+    SIGINT stop the worker once the running task is done.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.TASK_QUEUE['POLL_INTERVAL'],
+            help='Seconds to wait when no task is due.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no task is due.'
+        )
+        parser.add_argument(
+            '--max-tasks', type=int, default=None,
+            help='Exit after running this many tasks.'
+        )
+        parser.add_argument(
+            '--metrics-port', type=int, default=None,
+            help='Serve the task metrics on this port.'
+        )
+        parser.add_argument(
+            '--metrics-address', default='127.0.0.1',
+            help='Serve the task metrics on this address.'
+        )
+
+    def handle(self, *args, **options):
+        # tasks are registered when the tasks modules of the apps load
+        autodiscover_modules('tasks')
+        self.stopping = False
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            ran = self.work(options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'Ran {ran} tasks'))
+
+    def work(self, options):
+        """Run tasks until stopped, return the number of tasks run"""
+        if options['metrics_port'] is not None:
+            server = ThreadingHTTPServer(
+                (options['metrics_address'], options['metrics_port']),
+                MetricsHandler
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        ran = 0
+        while not self.stopping and ran != options['max_tasks']:
+            close_old_connections()
+            start = time.perf_counter()
+            result = run_next()
+            if result is None:
+                if options['burst']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            task, outcome = result
+            ran += 1
+            self.stdout.write(
+                f'{task.name} {outcome} in '
+                f'{(time.perf_counter() - start) * 1000:.1f}ms'
+            )
+        return ran
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,286 @@
+import csv
+import datetime
+import io
+import random
+import secrets
+import time
+from multiprocessing import Pool
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.models import Affiliation, Author, Authorship, Contribution, \
+    REGISTRATION_DEADLINE, REGISTRATION_FEES, registration_period
+
+FIRST_NAMES = [
+    'Jan', 'Petr', 'Vit', 'Eva', 'Jana', 'Marie', 'Tomas', 'Lucie', 'Karel',
+    'Hana', 'Martin', 'Anna', 'Pavel', 'Zuzana', 'Jiri', 'Tereza', 'Lukas',
+    'Klara', 'David', 'Barbora',
+]
+LAST_NAMES = [
+    'Novak', 'Svoboda', 'Dvorak', 'Cerny', 'Prochazka', 'Kucera', 'Vesely',
+    'Horak', 'Nemec', 'Pokorny', 'Marek', 'Sychra', 'Syrovatka', 'Kral',
+    'Benes', 'Fiala', 'Sedlacek', 'Dolezal', 'Zeman', 'Kolar',
+]
+TITLE_WORDS = [
+    'chironomid', 'larvae', 'river', 'stream', 'wetland', 'diversity',
+    'distribution', 'ecology', 'beetles', 'birds', 'pollution', 'climate',
+    'population', 'genetics', 'survey', 'habitat', 'macroinvertebrates',
+    'restoration', 'monitoring', 'sediment', 'community', 'Moravia',
+    'Bohemia', 'Danube', 'Vltava', 'long-term', 'seasonal', 'effects',
+]
+CITIES = [
+    ('Brno', 60200), ('Praha', 11000), ('Ostrava', 70200),
+    ('Olomouc', 77900), ('Bratislava', 81101), ('Wien', 1010),
+]
+INSTITUTIONS = [
+    'Masaryk University', 'Charles University', 'Czech Academy of Sciences',
+    'Palacky University', 'University of Ostrava', 'Comenius University',
+]
+DEPARTMENTS = [
+    'Dept. of Botany and Zoology', 'Dept. of Ecology', 'Institute of Botany',
+    'Biology Centre', 'Dept. of Hydrobiology', '',
+]
+# weights of the number of authors per contribution, starting at one
+AUTHOR_COUNT_WEIGHTS = [30, 25, 18, 12, 7, 4, 2, 1, 1]
+AFFILIATION_COUNT_WEIGHTS = [75, 20, 5]
+
+worker_state = {}
+
+
+def init_worker(user_ids, affiliation_ids):
+    worker_state['user_ids'] = user_ids
+    worker_state['affiliation_ids'] = affiliation_ids
+
+
+def person_name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def submission_time(rng):
+    """Return a creation time that surges towards the deadline"""
+    deadline = datetime.datetime.combine(
+        REGISTRATION_DEADLINE, datetime.time(), datetime.timezone.utc
+    )
+    days = rng.triangular(-120, 20, 0)
+    return deadline + datetime.timedelta(days=days)
+
+
+def allocate_ids(cursor, model, count):
+    """Reserve count primary keys from the model's sequence"""
+    cursor.execute(
+        'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+        'FROM generate_series(1, %s)',
+        [model._meta.db_table, model._meta.pk.column, count]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def copy_rows(cursor, model, fields, rows):
+    """Load rows into the model's table with COPY, bypassing the ORM"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(field).column)
+        for field in fields
+    )
+    cursor.copy_expert(
+        f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+        f'({columns}) FROM STDIN WITH (FORMAT csv)',
+        buffer
+    )
+
+
+def seed_contributions(task):
+    """Create one chunk of contributions with authorships, return count"""
+    seed, index, size = task
+    rng = random.Random(f'{seed}:contributions:{index}')
+    user_ids = worker_state['user_ids']
+    affiliation_ids = worker_state['affiliation_ids']
+    now = timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        contribution_ids = allocate_ids(cursor, Contribution, size)
+        contributions = []
+        for contribution_id in contribution_ids:
+            created = submission_time(rng)
+            discount = -200 if rng.random() < 0.05 else 0
+            period = registration_period(created)
+            contributions.append((
+                contribution_id,
+                rng.choice(user_ids),
+                ' '.join(rng.sample(TITLE_WORDS, rng.randint(3, 8)))
+                .capitalize(),
+                rng.choices(['oral', 'poster'], [70, 30])[0],
+                rng.random() < 0.6,
+                created,
+                now,
+                discount,
+                period,
+                REGISTRATION_FEES[period] + discount,
+            ))
+        copy_rows(cursor, Contribution, [
+            'id', 'user', 'title', 'presentation_form', 'fee_payed',
+            'created', 'last_modified', 'discount', 'registration_period',
+            'fee_due',
+        ], contributions)
+
+        pairs = [
+            (contribution_id, position)
+            for contribution_id in contribution_ids
+            for position in range(rng.choices(
+                range(1, len(AUTHOR_COUNT_WEIGHTS) + 1),
+                AUTHOR_COUNT_WEIGHTS,
+            )[0])
+        ]
+        author_ids = allocate_ids(cursor, Author, len(pairs))
+        copy_rows(cursor, Author, ['id', 'name'], (
+            (author_id, person_name(rng)) for author_id in author_ids
+        ))
+        authorship_ids = allocate_ids(cursor, Authorship, len(pairs))
+        copy_rows(cursor, Authorship, [
+            'id', 'author', 'contribution', 'is_main_author',
+        ], (
+            (authorship_id, author_id, contribution_id, position == 0)
+            for authorship_id, author_id, (contribution_id, position)
+            in zip(authorship_ids, author_ids, pairs)
+        ))
+
+        copy_rows(
+            cursor,
+            Authorship.affiliation.through,
+            ['authorship', 'affiliation'],
+            (
+                (authorship_id, affiliation_id)
+                for authorship_id in authorship_ids
+                for affiliation_id in rng.sample(affiliation_ids, min(
+                    len(affiliation_ids),
+                    rng.choices(
+                        range(1, len(AFFILIATION_COUNT_WEIGHTS) + 1),
+                        AFFILIATION_COUNT_WEIGHTS,
+                    )[0],
+                ))
+            )
+        )
+
+        # fresh statistics let the vector subquery use the index
+        cursor.execute(
+            f'ANALYZE {connection.ops.quote_name(Authorship._meta.db_table)}'
+        )
+        Contribution.objects.filter(
+            id__in=contribution_ids
+        ).update_search_vector()
+
+    return size
+
+
+class Command(BaseCommand):
+    """Django command to fill the database with a synthetic conference"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--contributions', type=int, default=10000)
+        parser.add_argument('--affiliations', type=int, default=200)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of processes inserting contributions.'
+        )
+        parser.add_argument(
+            '--seed', default=None,
+            help='Seed making the generated data reproducible.'
+        )
+        parser.add_argument(
+            '--password', default='conference2020',
+            help='Password shared by all generated users.'
+        )
+
+    def handle(self, *args, **options):
+        if options['contributions'] and not (
+                options['users'] and options['affiliations']):
+            raise CommandError(
+                'Contributions need at least one user and affiliation.'
+            )
+        seed = options['seed']
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.stdout.write(f'Seeding conference with seed {seed}...')
+        start = time.monotonic()
+
+        user_ids = self.seed_users(seed, options)
+        affiliation_ids = self.seed_affiliations(seed, options)
+
+        chunk_size = options['chunk_size']
+        total = options['contributions']
+        tasks = [
+            (seed, index, min(chunk_size, total - offset))
+            for index, offset in enumerate(range(0, total, chunk_size))
+        ]
+        created = 0
+        if options['workers'] > 1:
+            # workers must open connections of their own
+            connections.close_all()
+            with Pool(options['workers'], init_worker,
+                      (user_ids, affiliation_ids)) as pool:
+                for count in pool.imap_unordered(seed_contributions, tasks):
+                    created += count
+                    self.stdout.write(f'{created}/{total} contributions')
+        else:
+            init_worker(user_ids, affiliation_ids)
+            for task in tasks:
+                created += seed_contributions(task)
+                self.stdout.write(f'{created}/{total} contributions')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users, {len(affiliation_ids)} '
+            f'affiliations and {created} contributions '
+            f'in {time.monotonic() - start:.1f}s'
+        ))
+
+    def seed_users(self, seed, options):
+        """Create users with tokens, hashing the shared password once"""
+        rng = random.Random(f'{seed}:users')
+        password = make_password(options['password'])
+        offset = get_user_model().objects.count()
+        user_ids = []
+        for start in range(0, options['users'], options['chunk_size']):
+            stop = min(start + options['chunk_size'], options['users'])
+            with transaction.atomic():
+                users = get_user_model().objects.bulk_create(
+                    get_user_model()(
+                        email=f'user{offset + number}@example.org',
+                        name=person_name(rng),
+                        password=password,
+                    )
+                    for number in range(start, stop)
+                )
+                Token.objects.bulk_create(
+                    Token(user=user, key=secrets.token_hex(20))
+                    for user in users
+                )
+            user_ids.extend(user.id for user in users)
+        return user_ids
+
+    def seed_affiliations(self, seed, options):
+        rng = random.Random(f'{seed}:affiliations')
+        affiliations = []
+        for _ in range(options['affiliations']):
+            city, zip_code = rng.choice(CITIES)
+            affiliations.append(Affiliation(
+                institution=rng.choice(INSTITUTIONS),
+                department=rng.choice(DEPARTMENTS),
+                street_address=f'{rng.choice(LAST_NAMES)}ova '
+                               f'{rng.randint(1, 200)}',
+                city=city,
+                zip_code=zip_code,
+                country='Czech Republic',
+            ))
+        return [
+            affiliation.id
+            for affiliation in Affiliation.objects.bulk_create(affiliations)
+        ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.14 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_contribution_fee_payed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authorship',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authorships', to='core.Author'),
+        ),
+        migrations.AlterField(
+            model_name='authorship',
+            name='contribution',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authorships', to='core.Contribution'),
+        ),
+        migrations.AddIndex(
+            model_name='contribution',
+            index=models.Index(fields=['user', 'created', 'id'], name='contribution_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.14 on 2026-10-18 18:09
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_contribution_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contribution',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql="""
+            UPDATE core_contribution c SET search_vector =
+                setweight(to_tsvector('english', c.title), 'A') ||
+                setweight(to_tsvector('english', coalesce((
+                    SELECT string_agg(a.name, ' ')
+                    FROM core_authorship s
+                    JOIN core_author a ON a.id = s.author_id
+                    WHERE s.contribution_id = c.id
+                ), '')), 'B');
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='contribution',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='contribution_search_idx'),
+        ),
+    ]
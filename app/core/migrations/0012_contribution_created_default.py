@@ -0,0 +1,19 @@
+# Generated by Django 3.0.14 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_contribution_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contribution',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# expressions as compiled by the icontains lookup, so that the admin and
+# UserQuerySet.search() substring filters can use the indexes
+INDEXES = {
+    'user_name_trgm_idx': 'UPPER("name"::text)',
+    'user_email_trgm_idx': 'UPPER("email"::text)',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            # the search falls back to unindexed substring filters until
+            # the create_trigram_indexes command is run, see check core.W002
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON core_user '
+            f'USING gin ({expression} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_contribution_created_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
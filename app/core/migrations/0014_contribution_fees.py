@@ -0,0 +1,53 @@
+import datetime
+
+from django.db import migrations, models
+
+# the deadline and fees when the columns were added, later changes are
+# applied by the recompute_fees command
+DEADLINE = datetime.date(2020, 6, 15)
+FEES = {'Normal': 800, 'Late': 1200}
+
+
+def compute_fees(apps, schema_editor):
+    Contribution = apps.get_model('core', 'Contribution')
+
+    def by_period(normal, late, output_field):
+        return models.Case(
+            models.When(created__date__lt=DEADLINE, then=models.Value(normal)),
+            default=models.Value(late),
+            output_field=output_field,
+        )
+
+    Contribution.objects.using(schema_editor.connection.alias).update(
+        registration_period=by_period('Normal', 'Late', models.CharField()),
+        fee_due=by_period(
+            FEES['Normal'], FEES['Late'], models.IntegerField()
+        ) + models.F('discount'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_user_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contribution',
+            name='registration_period',
+            field=models.CharField(choices=[('Normal', 'Normal'), ('Late', 'Late')], default='Normal', editable=False, max_length=8),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='contribution',
+            name='fee_due',
+            field=models.IntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(compute_fees, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contribution',
+            index=models.Index(condition=models.Q(fee_payed=False), fields=['registration_period', 'created'], name='contribution_unpaid_idx'),
+        ),
+    ]
@@ -1,11 +1,22 @@
-from django.db import models
+from django.db import connections, models, transaction
 from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector, SearchVectorField, TrigramSimilarity
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import validate_email
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
 
 import datetime
+import logging
+import time
+import uuid
 
 # from django.utils import timezone
 
@@ -16,24 +27,99 @@ REGISTRATION_FEES = {
 }
 
 
-class UserManager(BaseUserManager):
+logger = logging.getLogger(__name__)
+
+# seconds an answer of extension_installed is reused
+EXTENSION_CHECK_INTERVAL = 60
+_extensions = {}
+
+# trigram indexes of user search, created by migration 0013 or by the
+# create_trigram_indexes command, on the expressions compiled by icontains
+TRIGRAM_INDEXES = {
+    'user_name_trgm_idx': 'UPPER("name"::text)',
+    'user_email_trgm_idx': 'UPPER("email"::text)',
+}
+
+
+def extension_installed(using, name):
+    """Whether the database extension is installed, checked at most every
+    EXTENSION_CHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    checked = _extensions.get((using, name))
+    if checked is None or now - checked[0] >= EXTENSION_CHECK_INTERVAL:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_extension WHERE extname = %s', [name]
+            )
+            installed = cursor.fetchone() is not None
+        if not installed:
+            logger.warning('Database extension %s is not installed in %s',
+                           name, using)
+        checked = _extensions[(using, name)] = (now, installed)
+    return checked[1]
+
+
+def missing_trigram_indexes(using):
+    """Return the names of the TRIGRAM_INDEXES missing in the database"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)',
+            [list(TRIGRAM_INDEXES)]
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGRAM_INDEXES if name not in existing]
+
+
+class UserQuerySet(models.QuerySet):
+
+    def search(self, text):
+        """Filter users whose name or email contain every word of text.
+
+        The substring filters are served by the trigram indexes of
+        migration 0013. Results are annotated with their trigram
+        similarity to the text, or with 1 for an exact email and 0
+        otherwise where pg_trgm is not installed.
+        """
+        queryset = self
+        for word in text.split():
+            queryset = queryset.filter(
+                models.Q(name__icontains=word) |
+                models.Q(email__icontains=word)
+            )
+        if extension_installed(self.db, 'pg_trgm'):
+            similarity = Greatest(
+                TrigramSimilarity('name', text),
+                TrigramSimilarity('email', text),
+            )
+        else:
+            similarity = models.Case(
+                models.When(email__iexact=text, then=models.Value(1.0)),
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            )
+        return queryset.annotate(similarity=similarity)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
 
     def create_user(self, email, password=None, **extra_fields):
         """Ceates and saves a new user"""
+        user = self.model(email=self.clean_email(email), **extra_fields)
+        user.set_password(password)
+
+        user.save(using=self._db)
+
+        return user
 
+    def clean_email(self, email):
+        """Validate an email address and return it normalized"""
         if not email:
             raise ValueError("Users must have an email address.")
         try:
             validate_email(email)
         except ValidationError:
             raise ValidationError("Invalid email address.")
-
-        user = self.model(email=self.normalize_email(email), **extra_fields)
-        user.set_password(password)
-
-        user.save(using=self._db)
-
-        return user
+        return self.normalize_email(email)
 
     def create_superuser(self, email, password=None, **extra_fields):
         """Create and save superuser"""
@@ -78,35 +164,214 @@ class Author(models.Model):
         return self.name
 
 
-class ContributionManager(models.Manager):
+def search_vector(title, author_names):
+    """Return the expression of a contribution's full-text search vector.
+
+    The title is weighted above author names, which are included when
+    settings.CONTRIBUTION_SEARCH_AUTHORS is set. Plain strings are taken
+    as literal values, so vectors can be computed while inserting rows.
+    """
+    def text(value):
+        if isinstance(value, str):
+            return models.Value(value, output_field=models.TextField())
+        return value
+
+    config = settings.CONTRIBUTION_SEARCH_CONFIG
+    vector = SearchVector(text(title), weight='A', config=config)
+    if settings.CONTRIBUTION_SEARCH_AUTHORS:
+        vector = vector + SearchVector(
+            Coalesce(text(author_names), models.Value('')),
+            weight='B',
+            config=config,
+        )
+    return vector
+
+
+def registration_period(created):
+    """Return the registration period of a contribution created then"""
+    if timezone.localtime(created).date() < REGISTRATION_DEADLINE:
+        return 'Normal'
+    return 'Late'
+
+
+def fee_expressions(created=None, discount=None):
+    """Return SQL expressions of the registration period and fee due.
+
+    Computed from the row's created and discount columns, or from the
+    given new values, where created must be a plain value and discount
+    may be any expression.
+    """
+    if created is None:
+        def by_period(normal, late, output_field):
+            return models.Case(
+                models.When(
+                    created__date__lt=REGISTRATION_DEADLINE,
+                    then=models.Value(normal),
+                ),
+                default=models.Value(late),
+                output_field=output_field,
+            )
 
-    def create(self, title, presentation_form, authorships):
-        # 1 create  contribution without authors
-        contribution = Contribution(
-            title=title,
-            presentation_form=presentation_form,
-            user=self.request.user
+        period = by_period('Normal', 'Late', models.CharField())
+        fee = by_period(
+            REGISTRATION_FEES['Normal'],
+            REGISTRATION_FEES['Late'],
+            models.IntegerField(),
         )
-        contribution.save()
-        # 2 for each authorship create author and authorship instance,
-        # and add the author to the authorship instance.
-        for authorship_data in authorships:
-            author = Author(name=authorship_data['author_name'])
-            author.save()
-            
-            authorship = Authorship(
-                author=author,
-                is_main_author=authorship_data['is_main_author'],
-                contribution=contribution,
+    else:
+        if hasattr(created, 'resolve_expression'):
+            raise TypeError(
+                'created may only be updated to values, recompute the '
+                'fees with update_fees() afterwards.'
             )
+        created = Contribution._meta.get_field('created').to_python(created)
+        period = models.Value(registration_period(created))
+        fee = models.Value(
+            REGISTRATION_FEES[period.value],
+            output_field=models.IntegerField(),
+        )
+    if discount is None:
+        discount = models.F('discount')
+    return {'registration_period': period, 'fee_due': fee + discount}
+
+
+class ContributionQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """Update rows, keeping their registration period and fee due"""
+        if 'created' in kwargs or 'discount' in kwargs:
+            kwargs.update(fee_expressions(
+                kwargs.get('created'), kwargs.get('discount')
+            ))
+        return super().update(**kwargs)
+
+    def update_fees(self):
+        """Recompute the stored period and fee, return rows changed"""
+        return self.stale_fees().update(**fee_expressions())
+
+    def stale_fees(self):
+        """Filter rows whose stored period or fee is out of date"""
+        return self.exclude(**fee_expressions())
+
+    def with_fees(self):
+        """Annotate the stored registration period and fee as period, fee"""
+        return self.annotate(
+            period=models.F('registration_period'),
+            fee=models.F('fee_due'),
+        )
 
-            # 4 for each affiliation add it to the authorsip instance.
-            authorship.affiliation.add(authorship_data['affiliations'])
+    def fee_report(self):
+        """Return fee totals grouped by period, form and payment state"""
+        return self.with_fees().values(
+            'period', 'presentation_form', 'fee_payed'
+        ).annotate(
+            count=models.Count('id'),
+            total=models.Sum('fee'),
+        ).order_by('period', 'presentation_form', 'fee_payed')
+
+    def update_search_vector(self, **fields):
+        """Recompute the stored full-text search vector.
+
+        Other fields to update in the same statement may be passed as
+        keyword arguments.
+        """
+        author_names = Authorship.objects.filter(
+            contribution=models.OuterRef('pk')
+        ).values('contribution').annotate(
+            names=StringAgg('author__name', ' ')
+        ).values('names')
+        return self.update(
+            search_vector=search_vector(
+                models.F('title'), models.Subquery(author_names)
+            ),
+            **fields
+        )
 
-            authorship.save()
+    def search(self, text):
+        """Filter by a full-text query and annotate relevance as rank"""
+        query = SearchQuery(text, config=settings.CONTRIBUTION_SEARCH_CONFIG)
+        # double precision round-trips through the pagination cursor
+        return self.filter(search_vector=query).annotate(
+            rank=Cast(
+                SearchRank(models.F('search_vector'), query),
+                models.FloatField(),
+            )
+        )
 
-        # 5 finally add the user to the contribution
-        return contribution
+
+class ContributionManager(models.Manager.from_queryset(ContributionQuerySet)):
+
+    def bulk_create_nested(self, contributions):
+        """Create contributions with nested authorships in batched inserts.
+
+        Every item is a dict of contribution fields plus an optional
+        ``authorships`` list as validated by ContributionSerializer:
+        ``{'author': {'name': ...}, 'is_main_author': ...,
+        'affiliation': [{...}, ...]}``. Identical affiliations within the
+        batch are stored once. The number of queries does not depend on
+        the number of items.
+        """
+        contributions = [dict(item) for item in contributions]
+        nested = [item.pop('authorships', []) for item in contributions]
+
+        with transaction.atomic(using=self.db):
+            instances = [
+                self.model(
+                    search_vector=search_vector(item['title'], ' '.join(
+                        authorship['author']['name']
+                        for authorship in authorships
+                    )),
+                    **item
+                )
+                for item, authorships in zip(contributions, nested)
+            ]
+            for instance in instances:
+                instance.compute_fees()
+            created = self.bulk_create(instances)
+
+            self._create_authorships([
+                (contribution, authorship)
+                for contribution, authorships in zip(created, nested)
+                for authorship in authorships
+            ])
+
+        return created
+
+    def _create_authorships(self, pairs):
+        """Insert (contribution, nested authorship data) pairs in bulk"""
+        pairs = list(pairs)
+        affiliations = {}
+        for _, authorship in pairs:
+            for data in authorship.get('affiliation', []):
+                key = tuple(sorted(data.items()))
+                affiliations.setdefault(key, Affiliation(**data))
+        Affiliation.objects.using(self.db).bulk_create(affiliations.values())
+
+        authors = Author.objects.using(self.db).bulk_create(
+            Author(**authorship['author']) for _, authorship in pairs
+        )
+        authorship_objs = Authorship.objects.using(self.db).bulk_create(
+            Authorship(
+                author=author,
+                contribution=contribution,
+                is_main_author=authorship.get('is_main_author', False),
+            )
+            for author, (contribution, authorship) in zip(authors, pairs)
+        )
+
+        links = {
+            (authorship_obj.id, affiliations[
+                tuple(sorted(data.items()))
+            ].id)
+            for authorship_obj, (_, authorship) in zip(authorship_objs, pairs)
+            for data in authorship.get('affiliation', [])
+        }
+        through = Authorship.affiliation.through
+        through.objects.using(self.db).bulk_create(
+            through(authorship_id=authorship_id,
+                    affiliation_id=affiliation_id)
+            for authorship_id, affiliation_id in sorted(links)
+        )
 
 
 class Contribution(models.Model):
@@ -126,29 +391,70 @@ class Contribution(models.Model):
     )
 
     fee_payed = models.BooleanField(default=False)
-    
-    created = models.DateTimeField(auto_now_add=True)
+
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    # not auto_now_add, so bulk loads can keep original submission times
     last_modified = models.DateTimeField(auto_now=True)
     discount = models.IntegerField(default=0)
     # discount to be set by admin in negative CZK
+    registration_period = models.CharField(
+        max_length=8,
+        choices=[
+            ('Normal', 'Normal'),
+            ('Late', 'Late'),
+        ],
+        editable=False,
+    )
+    fee_due = models.IntegerField(editable=False)
+    # both derived from created and discount by compute_fees() on save,
+    # recompute with the recompute_fees command when the fees change
+    search_vector = SearchVectorField(null=True, editable=False)
+    # see search_vector(), maintained on insert and by core.signals
 
-    objects = ContributionManager
+    objects = ContributionManager()
 
-    @property
-    def registration_period(self):
-        """Returns registration period based on date"""
-        if self.created.date() < REGISTRATION_DEADLINE:
-            return 'Normal'
-        else:
-            return 'Late'
+    class Meta:
+        indexes = [
+            # serves keyset pagination of a user's contributions
+            models.Index(
+                fields=['user', 'created', 'id'],
+                name='contribution_user_created_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='contribution_search_idx',
+            ),
+            # serves dunning of unpaid contributions
+            models.Index(
+                fields=['registration_period', 'created'],
+                name='contribution_unpaid_idx',
+                condition=models.Q(fee_payed=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title[0:20]}... registered by {self.user}"
 
+    def save(self, *args, **kwargs):
+        self.compute_fees()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and \
+                {'created', 'discount'} & set(update_fields):
+            kwargs['update_fields'] = {
+                'registration_period', 'fee_due', *update_fields
+            }
+        super().save(*args, **kwargs)
+
+    def compute_fees(self):
+        """Set registration period and fee due from creation and discount"""
+        self.registration_period = registration_period(self.created)
+        self.fee_due = REGISTRATION_FEES[self.registration_period] + \
+            self.discount
+
     @property
     def registration_fee(self):
         """Return registration fee based on registration_period and discount"""
-        return REGISTRATION_FEES[self.registration_period] + self.discount
+        return self.fee_due
 
 
 class Authorship(models.Model):
@@ -176,3 +482,179 @@ class Authorship(models.Model):
     def __str__(self):
         return f"{self.author} from {self.affiliation.all()}: \
             {self.contribution}"
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def due(self):
+        """Filter queued tasks whose time to run has come"""
+        return self.filter(status=Task.QUEUED, run_at__lte=timezone.now())
+
+    def claim(self):
+        """Lock and return the next due task, None if there is none.
+
+        Tasks locked by other workers are skipped, so workers never wait
+        for each other. Call in a transaction, the lock is held until it
+        ends.
+        """
+        return self.due().select_for_update(skip_locked=True).order_by(
+            'run_at', 'id'
+        ).first()
+
+    def lease(self, seconds):
+        """Claim the next due task for seconds, return it or None.
+
+        The attempt is counted and run_at moved past the lease in a
+        transaction of its own, so other workers skip the task while it
+        runs and take it again once the lease expires, should its worker
+        have stopped.
+        """
+        with transaction.atomic(using=self.db):
+            task = self.claim()
+            if task is not None:
+                task.attempts += 1
+                task.run_at = timezone.now() + datetime.timedelta(
+                    seconds=seconds
+                )
+                task.save(update_fields=['attempts', 'run_at'])
+        return task
+
+
+class Task(models.Model):
+    """Background task, run by the run_worker command, see core.tasks"""
+    QUEUED = 'queued'
+    FAILED = 'failed'
+
+    name = models.CharField(max_length=255)
+    args = JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=8,
+        choices=[
+            (QUEUED, 'Queued'),
+            (FAILED, 'Failed'),
+        ],
+        default=QUEUED,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    last_error = models.TextField(blank=True)
+    # tasks are deleted once done, failed ones are kept for inspection
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # serves claiming the next due task
+            models.Index(
+                fields=['run_at', 'id'],
+                name='task_due_idx',
+                condition=models.Q(status='queued'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status}, {self.attempts} attempts)"
+
+
+class SubmissionQuerySet(models.QuerySet):
+
+    def claim(self, batch_size):
+        """Lock and return the oldest pending submissions.
+
+        Submissions locked by another flush are skipped. Call in a
+        transaction, the locks are held until it ends.
+        """
+        return list(self.filter(status=Submission.PENDING).select_for_update(
+            skip_locked=True
+        ).order_by('created')[:batch_size])
+
+
+class Submission(models.Model):
+    """Contribution awaiting insertion by contribution.buffer"""
+    PENDING = 'pending'
+    CREATED = 'created'
+    FAILED = 'failed'
+
+    # the receipt polled by the client
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    data = JSONField(encoder=DjangoJSONEncoder)
+    # as validated by ContributionSerializer
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    # becomes Contribution.created, so the registration period is kept
+    status = models.CharField(
+        max_length=8,
+        choices=[
+            (PENDING, 'Pending'),
+            (CREATED, 'Created'),
+            (FAILED, 'Failed'),
+        ],
+        default=PENDING,
+    )
+    contribution_id = models.IntegerField(null=True, blank=True)
+    # not a foreign key, so deleting contributions does not touch receipts
+    error = models.TextField(blank=True)
+
+    objects = SubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # serves claiming the oldest pending submissions
+            models.Index(
+                fields=['created'],
+                name='submission_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Submission {self.id} ({self.status}) by {self.user}"
+
+
+class IdempotencyKey(models.Model):
+    """Response stored for an Idempotency-Key, see core.idempotency"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    # None for requests of anonymous users
+    client = models.CharField(max_length=64, blank=True)
+    # digest of the address of anonymous clients, who share no keys
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # of the method, path and data of the request
+    status_code = models.PositiveSmallIntegerField(null=True)
+    data = JSONField(null=True, encoder=DjangoJSONEncoder)
+    headers = JSONField(default=dict)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    expires = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_idempotency_key',
+            ),
+            models.UniqueConstraint(
+                fields=['client', 'key'],
+                condition=models.Q(user__isnull=True),
+                name='unique_anonymous_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # serves pruning expired keys
+            models.Index(fields=['expires'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} of {self.user or 'anonymous'}"
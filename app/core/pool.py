@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.urls import reverse
+
+from core.instrumentation import registry
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+# names of URLs served without waiting for the pool
+EXEMPT_URLS = ('metrics',)
+
+
+class PoolTimeout(Exception):
+    """No connection of the pool became free in time"""
+
+
+class ConnectionPool:
+    """Bounded set of persistent database connections of this process.
+
+    Django keeps a connection per thread and alias open for CONN_MAX_AGE
+    seconds. Requests check out one of max_size slots first, so at most
+    max_size threads use connections at once, however many threads the
+    WSGI or ASGI server runs. On checkin a thread closes its connection to
+    an alias with more than max_size open, so at most max_size stay open
+    between requests. Threads without one may open up to max_size more
+    while they hold slots. Connections idle for longer than
+    health_check_idle seconds are pinged on checkout and reopened if the
+    server dropped them.
+    """
+
+    def __init__(self, max_size, timeout, health_check_idle):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self.checked_out = 0
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # connections of all threads, they go away with their threads
+        self._returned = weakref.WeakKeyDictionary()
+
+    def checkout(self):
+        """Take a slot for the current thread, waiting up to timeout"""
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        wait_histogram.observe(time.perf_counter() - start)
+        if not acquired:
+            failures_counter.inc(reason='timeout')
+            raise PoolTimeout(
+                f'No database connection free within {self.timeout}s.'
+            )
+        with self._lock:
+            self.checked_out += 1
+        self.check_connections()
+
+    def checkin(self):
+        """Return the slot and the connections of the current thread.
+
+        Connections to aliases over max_size open connections are closed,
+        unless they are in a transaction.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for connection in connections.all():
+                if connection.connection is None:
+                    continue
+                self._returned[connection] = now
+                if self._open(connection.alias) > self.max_size and \
+                        not connection.in_atomic_block:
+                    connection.close()
+            self.checked_out -= 1
+        self._slots.release()
+
+    def _open(self, alias):
+        """Return the number of open connections to alias, hold _lock"""
+        return sum(
+            connection.alias == alias and connection.connection is not None
+            for connection in list(self._returned)
+        )
+
+    def check_connections(self):
+        """Close the idle connections of this thread the server dropped"""
+        now = time.monotonic()
+        for connection in connections.all():
+            with self._lock:
+                returned = self._returned.get(connection)
+            if connection.connection is None or returned is None or \
+                    now - returned < self.health_check_idle:
+                continue
+            if not connection.is_usable():
+                logger.warning('Reopening the dropped connection to %s',
+                               connection.alias)
+                failures_counter.inc(reason='unusable')
+                connection.close()
+
+    def sizes(self):
+        """Return the number of open connections per alias"""
+        with self._lock:
+            returned = list(self._returned)
+        sizes = {}
+        for connection in returned:
+            if connection.connection is not None:
+                key = (connection.alias,)
+                sizes[key] = sizes.get(key, 0) + 1
+        return sizes
+
+
+pool = ConnectionPool(
+    settings.DB_POOL['MAX_SIZE'],
+    settings.DB_POOL['TIMEOUT'],
+    settings.DB_POOL['HEALTH_CHECK_IDLE'],
+)
+
+wait_histogram = registry.histogram(
+    'db_pool_wait_seconds',
+    'Time requests waited for a database connection.',
+    buckets=WAIT_BUCKETS,
+)
+failures_counter = registry.counter(
+    'db_pool_checkout_failures_total',
+    'Checkouts timed out or finding their connection dropped.',
+    labels=('reason',),
+)
+registry.gauge(
+    'db_pool_connections',
+    'Open database connections of this process per alias.',
+    labels=('alias',),
+    function=lambda: pool.sizes(),
+)
+registry.gauge(
+    'db_pool_checked_out',
+    'Requests holding a connection of the pool.',
+    function=lambda: {(): pool.checked_out},
+)
+registry.gauge(
+    'db_pool_max_size',
+    'Requests allowed to hold a connection at once.',
+    function=lambda: {(): pool.max_size},
+)
+
+
+class ReturnOnClose:
+    """Streamed content returning the slot of its request when closed.
+
+    The server closes streaming responses once sent or abandoned, so the
+    slot is held while the content is produced, queries included.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.returned = False
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        if not self.returned:
+            self.returned = True
+            pool.checkin()
+
+
+class ConnectionPoolMiddleware:
+    """Hold a connection of the pool for every request.
+
+    Requests waiting longer than the pool timeout get 503, so a
+    saturated database sheds load instead of queueing without bound.
+    Requests of EXEMPT_URLS, such as metrics scrapes, skip the pool.
+    Streaming responses hold the connection until they are closed.
+
+    The WSGI and ASGI handlers of app.wsgi and app.asgi both build their
+    middleware chain from settings.MIDDLEWARE, so requests through
+    either entry point use the pool without further wiring.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.exempt_paths = {reverse(name) for name in EXEMPT_URLS}
+
+    def __call__(self, request):
+        if request.path in self.exempt_paths:
+            return self.get_response(request)
+        try:
+            pool.checkout()
+        except PoolTimeout as exc:
+            response = JsonResponse({'detail': str(exc)}, status=503)
+            response['Retry-After'] = '1'
+            return response
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            pool.checkin()
+            raise
+        if response.streaming:
+            response.streaming_content = ReturnOnClose(
+                response.streaming_content
+            )
+        else:
+            pool.checkin()
+        return response
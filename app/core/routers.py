@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_PREFIX = 'replica-pin:'
+# replication lag in seconds, NULL on a primary; a replica that replayed
+# everything it received is not lagging even if the primary is idle
+LAG_SQL = '''
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+# database alias serving the reads of the current request, None for default
+read_alias = ContextVar('read_alias', default=None)
+# whether the current request has written to the primary
+wrote_primary = ContextVar('wrote_primary', default=False)
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen by ReplicaRoutingMiddleware.
+
+    Writes go to the primary, which then also serves the remaining reads
+    of the request. Migrations run on the primary only, replicas get
+    the schema by replication.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        read_alias.set(None)
+        wrote_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaHealth:
+    """Replica availability and lag, checked at most every interval"""
+
+    def __init__(self):
+        self._checked = {}
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is None or now - checked[0] >= \
+                settings.REPLICA_ROUTING['HEALTH_CHECK_INTERVAL']:
+            checked = self._checked[alias] = (now, self.check(alias))
+        return checked[1]
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError as exc:
+            logger.warning('Replica %s unavailable: %s', alias, exc)
+            return False
+        if lag is not None and lag > settings.REPLICA_ROUTING['MAX_LAG']:
+            logger.warning('Replica %s lags %.1fs behind', alias, lag)
+            return False
+        return True
+
+    def reset(self):
+        self._checked = {}
+
+
+health = ReplicaHealth()
+
+
+def pin_keys(request):
+    """Return the cache keys of the client, the first is pinned by writes.
+
+    Clients are told apart by their credentials, anonymous clients by
+    their address. Reads check both, so the reads of a new user are
+    pinned by the anonymous registration from the same address.
+    """
+    address = f"{PIN_PREFIX}address:{request.META.get('REMOTE_ADDR')}"
+    credential = request.META.get('HTTP_AUTHORIZATION') or \
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return [address]
+    digest = hashlib.sha1(credential.encode()).hexdigest()
+    return [f'{PIN_PREFIX}credential:{digest}', address]
+
+
+def pins_shared():
+    """Return whether the pins are seen by all processes"""
+    return not isinstance(
+        caches[settings.REPLICA_ROUTING['PIN_CACHE']], LocMemCache
+    )
+
+
+class ReplicaRoutingMiddleware:
+    """Serve reads of safe requests from a healthy replica.
+
+    Clients that wrote are pinned to the primary for PIN_SECONDS, so
+    they read their own writes despite replication lag. Requests running
+    in a transaction, as in tests, read from the primary, as do all
+    requests unless the pins are kept in a cache shared by processes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @property
+    def pins(self):
+        return caches[settings.REPLICA_ROUTING['PIN_CACHE']]
+
+    def __call__(self, request):
+        tokens = (
+            read_alias.set(self.replica_for(request)),
+            wrote_primary.set(False),
+        )
+        try:
+            response = self.get_response(request)
+            wrote = wrote_primary.get()
+        finally:
+            read_alias.reset(tokens[0])
+            wrote_primary.reset(tokens[1])
+
+        if wrote and settings.DATABASE_REPLICAS and pins_shared():
+            self.pins.set(
+                pin_keys(request)[0], True,
+                settings.REPLICA_ROUTING['PIN_SECONDS'],
+            )
+        return response
+
+    def replica_for(self, request):
+        """Return the replica to read from, None for the primary"""
+        if not settings.DATABASE_REPLICAS or not pins_shared() or \
+                request.method not in SAFE_METHODS or \
+                connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if self.pins.get_many(pin_keys(request)):
+            return None
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if health.healthy(alias)
+        ]
+        return random.choice(replicas) if replicas else None
@@ -0,0 +1,73 @@
+from contextvars import ContextVar
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Affiliation, Author, Authorship, Contribution
+
+# contributions being deleted, their cascaded authorships need no touching
+deleting_contributions = ContextVar(
+    'deleting_contributions', default=frozenset()
+)
+
+
+def touch_contributions(**filters):
+    """Bump last_modified of the contributions matching filters.
+
+    Keeps Contribution.last_modified, which the API uses as a cache
+    validator, and the search vector in step with changes of the nested
+    rows.
+    """
+    Contribution.objects.filter(**filters).update_search_vector(
+        last_modified=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Contribution)
+def contribution_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'title' in update_fields:
+        Contribution.objects.filter(id=instance.id).update_search_vector()
+
+
+@receiver(pre_delete, sender=Contribution)
+def contribution_deleting(sender, instance, **kwargs):
+    deleting_contributions.set(deleting_contributions.get() | {instance.id})
+
+
+@receiver(post_delete, sender=Contribution)
+def contribution_deleted(sender, instance, **kwargs):
+    deleting_contributions.set(deleting_contributions.get() - {instance.id})
+
+
+@receiver(post_save, sender=Authorship)
+@receiver(post_delete, sender=Authorship)
+def authorship_changed(sender, instance, **kwargs):
+    if instance.contribution_id not in deleting_contributions.get():
+        touch_contributions(id=instance.contribution_id)
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def author_changed(sender, instance, **kwargs):
+    touch_contributions(authorships__author=instance)
+
+
+@receiver(post_save, sender=Affiliation)
+@receiver(pre_delete, sender=Affiliation)
+def affiliation_changed(sender, instance, **kwargs):
+    touch_contributions(authorships__affiliation=instance)
+
+
+@receiver(m2m_changed, sender=Authorship.affiliation.through)
+def authorship_affiliation_changed(sender, instance, action, reverse,
+                                   pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_contributions(id=instance.contribution_id)
+    elif action == 'pre_clear':
+        touch_contributions(authorships__affiliation=instance)
+    else:
+        touch_contributions(authorships__id__in=pk_set)
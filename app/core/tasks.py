@@ -0,0 +1,115 @@
+import datetime
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.instrumentation import registry
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+task_duration = registry.histogram(
+    'task_duration_seconds',
+    'Time spent running background tasks.',
+    labels=('task', 'outcome'),
+)
+
+
+def task(function=None, *, max_attempts=None):
+    """Register a function as a background task.
+
+    The function gets an enqueue() method taking its arguments, which
+    have to be JSON serializable, and may be used as @task or
+    @task(max_attempts=3).
+    """
+    def register(function):
+        name = f'{function.__module__}.{function.__qualname__}'
+        TASKS[name] = function
+        function.task_name = name
+        function.max_attempts = max_attempts
+        function.enqueue = lambda *args, **kwargs: enqueue(
+            function, args, kwargs
+        )
+        return function
+
+    return register if function is None else register(function)
+
+
+def enqueue(function, args=(), kwargs=None, run_at=None):
+    """Queue a task to be run by a worker, return its Task row.
+
+    The row is inserted in the current transaction, so workers see the
+    task only once the transaction commits, and never when it is rolled
+    back. Enqueue in the transaction writing the data the task needs.
+    """
+    return Task.objects.create(
+        name=function.task_name,
+        args=list(args),
+        kwargs=kwargs or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=function.max_attempts or
+        settings.TASK_QUEUE['MAX_ATTEMPTS'],
+    )
+
+
+def backoff(attempts):
+    """Return the delay before retrying a task failed attempts times"""
+    options = settings.TASK_QUEUE
+    return datetime.timedelta(seconds=min(
+        options['BACKOFF'] * 2 ** (attempts - 1), options['MAX_BACKOFF']
+    ))
+
+
+def run_next():
+    """Run the next due task, return it with its outcome or None.
+
+    The task is leased in a short transaction, see TaskQuerySet.lease,
+    and run outside of any, so a long task holds no locks and commits its
+    progress as it goes. Tasks are deleted once done. A failed attempt is
+    retried after a growing delay, until the task runs out of attempts
+    and is marked failed. Failed attempts are not rolled back and tasks
+    running longer than the lease are started again by another worker,
+    so tasks have to be safe to run again. The outcome of an attempt
+    whose lease was taken over meanwhile is not recorded, it is reported
+    as expired.
+    """
+    task = Task.objects.lease(settings.TASK_QUEUE['LEASE'])
+    if task is None:
+        return None
+
+    start = time.perf_counter()
+    function = TASKS.get(task.name)
+    try:
+        if function is None:
+            raise LookupError(f'Unknown task {task.name}')
+        if task.attempts > task.max_attempts:
+            raise RuntimeError('Out of attempts, the last one never ended')
+        function(*task.args, **task.kwargs)
+    except Exception:
+        task.last_error = traceback.format_exc()
+        if task.attempts >= task.max_attempts or function is None:
+            task.status = Task.FAILED
+            outcome = 'failed'
+        else:
+            task.run_at = timezone.now() + backoff(task.attempts)
+            outcome = 'retried'
+        # the lease is ours while no other worker counted an attempt
+        if not Task.objects.filter(
+                pk=task.pk, attempts=task.attempts).update(
+                status=task.status, run_at=task.run_at,
+                last_error=task.last_error):
+            outcome = 'expired'
+        logger.warning('Task %s %s: %s', task, outcome,
+                       task.last_error.splitlines()[-1])
+    else:
+        Task.objects.filter(pk=task.pk).delete()
+        outcome = 'done'
+    duration = time.perf_counter() - start
+
+    task_duration.observe(duration, task=task.name, outcome=outcome)
+    return task, outcome
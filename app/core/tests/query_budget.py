@@ -0,0 +1,159 @@
+import itertools
+import os
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+# set to a directory to also write the SQL of failed budgets to files
+DUMP_DIR = os.environ.get('QUERY_BUDGET_DUMP_DIR')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def shapes(**axes):
+    """Return every combination of the axes' sizes as keyword dicts.
+
+    shapes(contributions=(1, 10), authors=(1, 5)) gives four payload
+    shapes, from one contribution with one author to ten with five each.
+    """
+    names = list(axes)
+    return [
+        dict(zip(names, sizes))
+        for sizes in itertools.product(*(axes[name] for name in names))
+    ]
+
+
+class QueryRecorder:
+    """Execute wrapper recording SQL, time and the calling code"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'duration': time.perf_counter() - start,
+                'stack': project_frames(traceback.extract_stack()[:-1]),
+            })
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """Return SQL statements executed more than once, ignoring values"""
+        return [
+            (sql, count)
+            for sql, count in Counter(
+                LITERALS.sub('?', query['sql']) for query in self.queries
+            ).most_common()
+            if count > 1
+        ]
+
+    def dump(self):
+        """Return every query with the project code that executed it"""
+        lines = []
+        for number, query in enumerate(self.queries, 1):
+            lines.append(
+                f"{number}. ({query['duration'] * 1000:.1f}ms) "
+                f"{query['sql']}"
+            )
+            if query['params']:
+                lines.append(f"   params: {query['params']!r}")
+            lines.extend(
+                '   ' + line
+                for frame in traceback.format_list(query['stack'])
+                for line in frame.rstrip().splitlines()
+            )
+        for sql, count in self.repeated():
+            lines.append(f'Repeated {count} times: {sql}')
+        return '\n'.join(lines)
+
+
+def project_frames(stack):
+    """Return frames of the project's code, leaving out this harness"""
+    return [
+        frame for frame in stack
+        if frame.filename.startswith(settings.BASE_DIR) and
+        frame.filename != __file__ and
+        'site-packages' not in frame.filename
+    ]
+
+
+@contextmanager
+def record_queries():
+    """Record the queries executed on all connections within the block"""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting query budgets of API requests.
+
+    A scenario is a function taking the keyword arguments of a payload
+    shape, creating the data it needs and returning a function which
+    sends the request. Every shape runs in a savepoint rolled back
+    afterwards, so shapes do not see each other's data.
+    """
+
+    def assertQueryBudget(self, budget, scenario, shapes=({},),
+                          status=None):
+        """Assert the scenario stays in budget and does not scale.
+
+        Fails when any shape needs more than budget queries, or when
+        shapes need different numbers of queries, which means the count
+        grows with the size of the data. The failure message lists the
+        SQL of the offending request with the code that executed it.
+        """
+        counts = []
+        for shape in shapes:
+            with transaction.atomic():
+                request = scenario(**shape)
+                with record_queries() as recorder:
+                    response = request()
+                    # streamed bodies execute their queries when consumed
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                transaction.set_rollback(True)
+
+            if status is not None:
+                self.assertEqual(response.status_code, status, shape)
+            else:
+                self.assertLess(response.status_code, 400, shape)
+            counts.append((shape, recorder))
+
+            if len(recorder) > budget:
+                self.fail_budget(
+                    f'{len(recorder)} queries for {shape} exceed the '
+                    f'budget of {budget}', recorder
+                )
+
+        smallest_shape, smallest = counts[0]
+        for shape, recorder in counts[1:]:
+            if len(recorder) != len(smallest):
+                self.fail_budget(
+                    f'Query count scales with the data: {len(smallest)} '
+                    f'for {smallest_shape}, {len(recorder)} for {shape}',
+                    recorder
+                )
+
+    def fail_budget(self, message, recorder):
+        dump = recorder.dump()
+        if DUMP_DIR:
+            os.makedirs(DUMP_DIR, exist_ok=True)
+            path = os.path.join(DUMP_DIR, f'{self.id()}.sql.txt')
+            with open(path, 'w') as file:
+                file.write(f'{message}\n\n{dump}\n')
+            message = f'{message} (written to {path})'
+        self.fail(f'{message}\n{dump}')
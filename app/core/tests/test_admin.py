@@ -1,9 +1,17 @@
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework import status
 
+from core.admin import EstimatedCountPaginator
+from core.models import Affiliation, Author, Authorship, Contribution
+from core.tests.query_budget import QueryBudgetMixin, record_queries, \
+    shapes
+
 
 class AdminSiteTests(TestCase):
     def setUp(self):
@@ -28,6 +36,16 @@ class AdminSiteTests(TestCase):
         self.assertContains(response, self.user.name)
         self.assertContains(response, self.user.email)
 
+    def test_users_searched(self):
+        """Admin search finds users by parts of name or email"""
+        url = reverse('admin:core_user_changelist')
+
+        response = self.client.get(url, {'q': 'london testus'})
+
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.user]
+        )
+
     def test_user_change_page(self):
         """User edit page works - returns status 200"""
         url = reverse('admin:core_user_change', args=[self.user.id])
@@ -41,3 +59,105 @@ class AdminSiteTests(TestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LargeTableAdminTests(QueryBudgetMixin, TestCase):
+    """Test the changelists of contributions and their authors"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='pako@london.com',
+            password='123asda'
+        )
+        self.client.force_login(self.admin_user)
+
+    def create_contributions(self, contributions, authors=2):
+        affiliation = Affiliation.objects.create(
+            institution='Masaryk univ', street_address='Kotlarska 2',
+            city='Brno', zip_code=61137, country='Czech Republic',
+        )
+        for number in range(contributions):
+            user = get_user_model().objects.create_user(
+                email=f'user{number}@london.com', password='test45681'
+            )
+            contribution = Contribution.objects.create(
+                user=user, title=f'Chironomids of the Vltava {number}',
+                discount=-100,
+            )
+            for position in range(authors):
+                authorship = Authorship.objects.create(
+                    author=Author.objects.create(name=f'Author {position}'),
+                    contribution=contribution,
+                )
+                authorship.affiliation.add(affiliation)
+
+    def test_changelists_query_count(self):
+        """Changelist queries do not grow with the listed rows"""
+        for model in ('contribution', 'authorship', 'author', 'affiliation'):
+            url = reverse(f'admin:core_{model}_changelist')
+
+            def scenario(contributions):
+                self.create_contributions(contributions)
+                return lambda: self.client.get(url)
+
+            self.assertQueryBudget(
+                8, scenario, shapes(contributions=(1, 5))
+            )
+
+    def test_contribution_fee_listed(self):
+        """Fees are listed from the stored column"""
+        self.create_contributions(1)
+        url = reverse('admin:core_contribution_changelist')
+
+        res = self.client.get(url, {'fee_payed__exact': 0})
+
+        contribution = res.context['cl'].result_list[0]
+        self.assertContains(
+            res, f'<td class="field-fee_due">{contribution.fee_due}'
+        )
+
+    def test_contribution_full_text_search(self):
+        """Changelist search uses the full-text index"""
+        self.create_contributions(2)
+        Contribution.objects.filter(title__endswith='1').update(
+            title='Beetles of Moravia'
+        )
+        Contribution.objects.update_search_vector()
+        url = reverse('admin:core_contribution_changelist')
+
+        res = self.client.get(url, {'q': 'beetle'})
+
+        self.assertEqual(
+            [c.title for c in res.context['cl'].result_list],
+            ['Beetles of Moravia'],
+        )
+
+    def test_autocomplete(self):
+        """Authors are looked up by the autocomplete widget"""
+        self.create_contributions(1)
+        contribution = Contribution.objects.get()
+        url = reverse(
+            'admin:core_contribution_change', args=[contribution.id]
+        )
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertContains(res, 'admin-autocomplete')
+
+    def test_unfiltered_count_estimated(self):
+        """Large unfiltered tables are not counted"""
+        self.create_contributions(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_contribution')
+        url = reverse('admin:core_contribution_changelist')
+
+        with patch.object(EstimatedCountPaginator, 'threshold', 0), \
+                record_queries() as recorder:
+            res = self.client.get(url)
+
+        self.assertEqual(res.context['cl'].result_count, 3)
+        self.assertFalse(any(
+            'COUNT(*)' in query['sql'] for query in recorder.queries
+        ))
@@ -1,9 +1,26 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 # this allows to mock the behaviour of the django get_database function
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connections
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.testcases import LiveServerThread, QuietWSGIRequestHandler
+from rest_framework.authtoken.models import Token
+
+from core.checks import trigram_index_check
+from core.management.commands.benchmark_api import SCENARIOS, \
+    compare_results
+from core.models import Affiliation, Authorship, Contribution, \
+    missing_trigram_indexes
 
 
 class CommandTest(TestCase):
@@ -22,3 +39,277 @@ class CommandTest(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class SeedConferenceCommandTest(TestCase):
+
+    def seed(self, **options):
+        defaults = {
+            'users': 5,
+            'contributions': 30,
+            'affiliations': 4,
+            'chunk_size': 7,
+            'seed': 'test',
+            'stdout': StringIO(),
+        }
+        defaults.update(options)
+        call_command('seed_conference', **defaults)
+
+    def test_seed_conference_creates_graph(self):
+        """Users, tokens, contributions and authorships are created"""
+        self.seed()
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(Token.objects.count(), 5)
+        self.assertEqual(Affiliation.objects.count(), 4)
+        self.assertEqual(Contribution.objects.count(), 30)
+        self.assertEqual(
+            Authorship.objects.filter(is_main_author=True).count(), 30
+        )
+        self.assertFalse(
+            Authorship.objects.filter(affiliation__isnull=True).exists()
+        )
+        vectors = list(Contribution.objects.order_by('id').values_list(
+            'search_vector', flat=True
+        ))
+        Contribution.objects.update_search_vector()
+        self.assertEqual(
+            list(Contribution.objects.order_by('id').values_list(
+                'search_vector', flat=True
+            )),
+            vectors
+        )
+        user = get_user_model().objects.first()
+        self.assertTrue(user.check_password('conference2020'))
+
+    def test_seed_conference_reproducible(self):
+        """The same seed generates the same contributions"""
+        def snapshot():
+            return list(Contribution.objects.order_by('id').values_list(
+                'title', 'created', 'presentation_form'
+            ))
+
+        self.seed()
+        first = snapshot()
+        Contribution.objects.all().delete()
+        self.seed()
+
+        self.assertEqual(snapshot(), first)
+
+    def test_seed_conference_needs_users(self):
+        """Contributions cannot be generated without users"""
+        with self.assertRaises(CommandError):
+            self.seed(users=0)
+
+
+class ReconcilePaymentsCommandTest(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='koko@gmail.com', password='ajlkjfs5734'
+        )
+        self.contributions = [
+            Contribution.objects.create(user=user, title=f'Chironomids {i}')
+            for i in range(5)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_statement(self, lines):
+        path = os.path.join(self.directory.name, 'statement.csv')
+        with open(path, 'w') as file:
+            file.write('id,amount\n' + ''.join(
+                f'{reference},{amount}\n' for reference, amount in lines
+            ))
+        return path
+
+    def test_reconcile_payments_in_chunks(self):
+        """Matching lines are marked paid, others written to the report"""
+        *paid, unpaid = self.contributions
+        statement = self.write_statement(
+            [(contribution.id, contribution.fee_due)
+             for contribution in paid] + [(unpaid.id, 1)]
+        )
+        report = os.path.join(self.directory.name, 'report.csv')
+
+        call_command('reconcile_payments', statement, chunk_size=2,
+                     report=report, stdout=StringIO())
+
+        self.assertEqual(
+            Contribution.objects.filter(fee_payed=True).count(), len(paid)
+        )
+        with open(report) as file:
+            self.assertEqual(list(csv.DictReader(file)), [{
+                'line': '6', 'reference': str(unpaid.id), 'amount': '1',
+                'status': 'amount_mismatch', 'expected': str(unpaid.fee_due),
+            }])
+
+    def test_reconcile_payments_dry_run(self):
+        """A dry run marks nothing paid"""
+        contribution = self.contributions[0]
+        statement = self.write_statement(
+            [(contribution.id, contribution.fee_due)]
+        )
+        out = StringIO()
+
+        call_command('reconcile_payments', statement, dry_run=True,
+                     stdout=out)
+
+        self.assertIn('Would mark 1 of 1', out.getvalue())
+        self.assertFalse(Contribution.objects.filter(fee_payed=True).exists())
+
+    def test_reconcile_payments_needs_columns(self):
+        """Statements without an amount column fail"""
+        path = os.path.join(self.directory.name, 'statement.csv')
+        with open(path, 'w') as file:
+            file.write('id,date\n1,2020-06-01\n')
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_payments', path, stdout=StringIO())
+
+
+class ImportUsersCommandTest(TestCase):
+
+    def test_import_users_hashes_in_processes(self):
+        """Users are imported with passwords hashed by a process pool"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            report = os.path.join(directory, 'report.csv')
+            with open(path, 'w') as file:
+                file.write('email,name,password\n' + ''.join(
+                    f'user{number}@example.org,User {number},pass{number}\n'
+                    for number in range(5)
+                ) + 'user0@example.org,Again,\n')
+
+            call_command('import_users', path, workers=2, chunk_size=2,
+                         report=report, stdout=StringIO())
+
+            with open(report) as file:
+                rejected = list(csv.DictReader(file))
+
+        users = get_user_model().objects.order_by('email')
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users[3].check_password('pass3'))
+        self.assertEqual(Token.objects.count(), 5)
+        self.assertEqual([line['status'] for line in rejected], ['duplicate'])
+
+    def test_import_users_missing_file(self):
+        """Missing files fail"""
+        with self.assertRaises(CommandError):
+            call_command('import_users', '/nonexistent/users.csv',
+                         stdout=StringIO())
+
+
+class CreateTrigramIndexesCommandTest(TestCase):
+
+    def trigram_available(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+            return cursor.fetchone() is not None
+
+    def test_create_trigram_indexes(self):
+        """Indexes skipped by the migration are created by the command"""
+        if not self.trigram_available():
+            self.skipTest('pg_trgm is not available')
+        with connections['default'].cursor() as cursor:
+            cursor.execute('DROP INDEX user_name_trgm_idx')
+        self.assertEqual(
+            [warning.id for warning in trigram_index_check(None)],
+            ['core.W002']
+        )
+
+        call_command('create_trigram_indexes', stdout=StringIO())
+
+        self.assertEqual(missing_trigram_indexes('default'), [])
+        self.assertEqual(trigram_index_check(None), [])
+
+    def test_create_trigram_indexes_needs_extension(self):
+        """The command fails while pg_trgm is not available"""
+        if self.trigram_available():
+            self.skipTest('pg_trgm is available')
+        self.assertEqual(
+            [warning.id for warning in trigram_index_check(None)],
+            ['core.W002']
+        )
+
+        with self.assertRaisesRegex(CommandError, 'pg_trgm'):
+            call_command('create_trigram_indexes', stdout=StringIO())
+
+
+class ConnectionClosingServer(ThreadedWSGIServer):
+    """Close the persistent connections of finished request threads"""
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            connections.close_all()
+
+
+class ConnectionClosingServerThread(LiveServerThread):
+
+    def _create_server(self):
+        return ConnectionClosingServer(
+            (self.host, self.port), QuietWSGIRequestHandler,
+            allow_reuse_address=False,
+        )
+
+
+class BenchmarkApiCommandTest(LiveServerTestCase):
+    server_thread_class = ConnectionClosingServerThread
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='bench@example.org', password='conference2020'
+        )
+
+    def test_benchmark_writes_results(self):
+        """Every scenario is measured and written as JSON"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_api', url=self.live_server_url,
+                email='bench@example.org', requests=4, concurrency=2,
+                output=output, stdout=StringIO()
+            )
+            with open(output) as file:
+                results = json.load(file)
+
+        self.assertEqual(set(results['scenarios']), set(SCENARIOS))
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['requests'], 4, name)
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertIsNotNone(summary['queries_per_request'], name)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'], name)
+        self.assertEqual(
+            Contribution.objects.filter(user=self.user).count(), 6
+        )
+
+    @override_settings(SUBMISSION_BUFFER={
+        'ENABLED': True, 'BATCH_SIZE': 2, 'FLUSH_DELAY': 0,
+    })
+    def test_benchmark_needs_created_contributions(self):
+        """Contributions not created right away stop the benchmark"""
+        with self.assertRaisesRegex(CommandError, 'got 202'):
+            call_command(
+                'benchmark_api', url=self.live_server_url,
+                email='bench@example.org', requests=4, concurrency=2,
+                stdout=StringIO()
+            )
+
+    def test_benchmark_fails_on_regression(self):
+        """Runs slower than the baseline fail"""
+        summary = {
+            'requests': 4, 'errors': 0, 'requests_per_second': 100,
+            'p50_ms': 5, 'p95_ms': 10, 'p99_ms': 12,
+            'queries_per_request': 3, 'max_queries': 3,
+        }
+        baseline = {'scenarios': {'me': summary}}
+        slower = {'scenarios': {'me': dict(
+            summary, p95_ms=20, max_queries=4
+        )}}
+
+        self.assertEqual(compare_results(baseline, baseline, 0.2), [])
+        self.assertEqual(len(compare_results(slower, baseline, 0.2)), 2)
@@ -0,0 +1,182 @@
+import datetime
+import hashlib
+import json
+import threading
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import IdempotencyKey
+
+CREATE_USER_URL = reverse('user:create')
+
+PAYLOAD = {
+    'email': 'vit@amail.com',
+    'password': 'ajlkjfs5734',
+    'name': 'Vit Syrovatka',
+}
+
+
+class IdempotencyTests(TestCase):
+    """Test Idempotency-Key handling of creations"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create(self, key='4f1c8e52', **payload):
+        return self.client.post(
+            CREATE_USER_URL, dict(PAYLOAD, **payload),
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_repeated_key_replayed(self):
+        """Requests repeating a key get the first response"""
+        first = self.create()
+
+        with self.assertNumQueries(3):
+            repeated = self.create()
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeated.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeated.data, first.data)
+        self.assertEqual(repeated['Idempotent-Replayed'], 'true')
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_key_reused_for_other_request_refused(self):
+        """A key cannot be reused with a different payload"""
+        self.create()
+
+        res = self.create(name='Eva Novakova')
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_errors_not_stored(self):
+        """Rejected requests may be corrected and retried with the key"""
+        res = self.create(password='pw')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        res = self.create()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_expired_key_runs_again(self):
+        """Requests repeating an expired key are handled anew"""
+        self.create()
+        IdempotencyKey.objects.update(expires=timezone.now())
+        get_user_model().objects.all().delete()
+
+        res = self.create()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(res.has_header('Idempotent-Replayed'))
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_keys_scoped_per_user(self):
+        """Authenticated users do not see each other's keys"""
+        users = [
+            get_user_model().objects.create_user(
+                email=f'user{number}@amail.com', password='ajlkjfs5734'
+            )
+            for number in range(2)
+        ]
+        for number, user in enumerate(users):
+            self.client.force_authenticate(user=user)
+            res = self.create(email=f'new{number}@amail.com')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_anonymous_keys_scoped_per_client(self):
+        """Anonymous clients at other addresses do not see each other's keys"""
+        for number in range(2):
+            res = self.client.post(
+                CREATE_USER_URL,
+                dict(PAYLOAD, email=f'new{number}@amail.com'),
+                HTTP_IDEMPOTENCY_KEY='4f1c8e52',
+                REMOTE_ADDR=f'192.0.2.{number + 1}',
+            )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_fingerprint_leaves_out_password(self):
+        """Stored fingerprints are keyed and do not depend on passwords"""
+        self.create()
+        get_user_model().objects.all().delete()
+        IdempotencyKey.objects.update(expires=timezone.now())
+        fingerprint = IdempotencyKey.objects.get().fingerprint
+
+        self.create(password='other5734pass')
+
+        record = IdempotencyKey.objects.get()
+        self.assertEqual(record.fingerprint, fingerprint)
+        payload = json.dumps(
+            {'email': PAYLOAD['email'], 'name': PAYLOAD['name']},
+            sort_keys=True
+        )
+        self.assertNotEqual(
+            record.fingerprint,
+            hashlib.sha256(f'POST:{CREATE_USER_URL}:{payload}'.encode())
+            .hexdigest()
+        )
+
+    def test_long_key_rejected(self):
+        """Keys longer than the stored column are refused"""
+        res = self.create(key='k' * 256)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_expired_keys(self):
+        """The prune command deletes expired keys only"""
+        self.create(key='old')
+        self.create(key='new', email='eva@amail.com')
+        IdempotencyKey.objects.filter(key='old').update(
+            expires=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        call_command('prune_idempotency_keys', stdout=StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new']
+        )
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+
+    def test_concurrent_repeats_wait_for_first(self):
+        """Concurrent requests with a key create the user once"""
+        barrier = threading.Barrier(3)
+        responses = []
+
+        def create():
+            try:
+                barrier.wait(5)
+                responses.append(APIClient().post(
+                    CREATE_USER_URL, PAYLOAD, HTTP_IDEMPOTENCY_KEY='4f1c8e52'
+                ))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            [res.status_code for res in responses],
+            [status.HTTP_201_CREATED] * 3
+        )
+        self.assertEqual(get_user_model().objects.count(), 1)
+        self.assertEqual(
+            sum(res.has_header('Idempotent-Replayed') for res in responses), 2
+        )
@@ -0,0 +1,109 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.instrumentation import Histogram, registry
+
+
+CONTRIBUTION_URL = reverse('contribution:contribution-list')
+METRICS_URL = reverse('metrics')
+METRICS = {'TOKEN': 'scraper-token'}
+
+
+@override_settings(METRICS=METRICS)
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@london.com',
+            password='test45681',
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_header(self):
+        """Responses report query count and timings"""
+        res = self.client.get(CONTRIBUTION_URL)
+
+        timing = res['Server-Timing']
+        self.assertIn('desc="2 queries"', timing)
+        for name in ('db;dur=', 'view;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': False, 'CACHE': 'responses'})
+    def test_metrics_endpoint(self):
+        """Per-route histograms are exposed in Prometheus text format"""
+        self.client.get(CONTRIBUTION_URL)
+        self.client.get(CONTRIBUTION_URL)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scraper-token'
+        )
+
+        self.assertEqual(
+            res['Content-Type'], 'text/plain; version=0.0.4'
+        )
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        labels = 'route="contribution:contribution-list",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2',
+                      body)
+        self.assertIn(f'http_request_db_queries_sum{{{labels}}} 4', body)
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True, 'CACHE': 'responses'})
+    def test_metrics_endpoint_counters(self):
+        """Counters are exposed after the histograms"""
+        self.client.get(CONTRIBUTION_URL)
+
+        body = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scraper-token'
+        ).content.decode()
+
+        self.assertIn(
+            '# TYPE contribution_response_cache_requests_total counter', body
+        )
+        self.assertIn(
+            'contribution_response_cache_requests_total{result="miss"} 1',
+            body
+        )
+
+    def test_metrics_need_token_or_staff(self):
+        """Metrics are refused to clients without the token"""
+        client = APIClient()
+
+        res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 403)
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer guess')
+        self.assertEqual(res.status_code, 403)
+
+        client.force_login(self.user)
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(client.get(METRICS_URL).status_code, 200)
+
+    @override_settings(METRICS={'TOKEN': None})
+    def test_metrics_token_unset(self):
+        """No bearer token is accepted unless one is configured"""
+        res = APIClient().get(METRICS_URL, HTTP_AUTHORIZATION='Bearer ')
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Observations are counted in every bucket they fit in"""
+        histogram = Histogram((1, 5))
+        for value in (0, 3, 7):
+            histogram.observe(value)
+
+        lines = list(histogram.expose('x', 'a="b"'))
+
+        self.assertEqual(lines, [
+            'x_bucket{a="b",le="1"} 1',
+            'x_bucket{a="b",le="5"} 2',
+            'x_bucket{a="b",le="+Inf"} 3',
+            'x_sum{a="b"} 10.0',
+            'x_count{a="b"} 3',
+        ])
@@ -1,10 +1,17 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import models
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
 from django.db.utils import IntegrityError
 
-from core.models import Affiliation, Author, Authorship, Contribution
+from core.models import Affiliation, Author, Authorship, Contribution, \
+    REGISTRATION_DEADLINE, REGISTRATION_FEES, extension_installed
 
 
 class ModelTest(TestCase):
@@ -138,3 +145,89 @@ class ModelTest(TestCase):
 
         self.assertEqual(authorship1.affiliation.count(), 1)
         self.assertEqual(authorship2.affiliation.count(), 2)
+
+    def test_fees_stored_on_save(self):
+        """Period and fee due follow creation time and discount"""
+        user = get_user_model().objects.create_user(
+            'test@dev.com',
+            'asdaf6547'
+        )
+        deadline = datetime.datetime.combine(
+            REGISTRATION_DEADLINE, datetime.time(), datetime.timezone.utc
+        )
+        contribution = Contribution.objects.create(
+            title='ptaci', user=user,
+            created=deadline - datetime.timedelta(seconds=1),
+        )
+        self.assertEqual(contribution.registration_period, 'Normal')
+        self.assertEqual(contribution.fee_due, 800)
+
+        contribution.discount = -300
+        contribution.save(update_fields=['discount'])
+        contribution.refresh_from_db()
+        self.assertEqual(contribution.fee_due, 500)
+        self.assertEqual(contribution.registration_fee, 500)
+
+    def test_fees_follow_queryset_updates(self):
+        """Updating created or discount in bulk recomputes the fees"""
+        user = get_user_model().objects.create_user(
+            'test@dev.com',
+            'asdaf6547'
+        )
+        deadline = datetime.datetime.combine(
+            REGISTRATION_DEADLINE, datetime.time(), datetime.timezone.utc
+        )
+        normal = Contribution.objects.create(title='ptaci', user=user)
+        late = Contribution.objects.create(
+            title='brouci', user=user, discount=-300
+        )
+        Contribution.objects.filter(id=normal.id).update(
+            created=deadline - datetime.timedelta(seconds=1)
+        )
+        Contribution.objects.filter(id=late.id).update(created=deadline)
+        Contribution.objects.filter(id=late.id).update(
+            discount=models.F('discount') - 100
+        )
+
+        self.assertEqual(
+            sorted(Contribution.objects.with_fees().values_list(
+                'period', 'fee'
+            )),
+            [('Late', 800), ('Normal', 800)]
+        )
+        self.assertFalse(Contribution.objects.stale_fees().exists())
+
+    def test_recompute_fees(self):
+        """Changed fees are applied to the stored columns"""
+        user = get_user_model().objects.create_user(
+            'test@dev.com',
+            'asdaf6547'
+        )
+        for number in range(3):
+            Contribution.objects.create(
+                title=f'ptaci {number}', user=user, discount=-100
+            )
+        late_fees = dict(REGISTRATION_FEES, Late=1500)
+
+        with patch.dict('core.models.REGISTRATION_FEES', late_fees):
+            self.assertEqual(Contribution.objects.stale_fees().count(), 3)
+            call_command('recompute_fees', chunk_size=2, stdout=StringIO())
+
+            self.assertFalse(Contribution.objects.stale_fees().exists())
+        self.assertEqual(
+            set(Contribution.objects.values_list('fee_due', flat=True)),
+            {1400},
+        )
+
+    def test_extension_checked_again_after_interval(self):
+        """Extensions installed later are seen after the check interval"""
+        with patch.dict('core.models._extensions', clear=True), \
+                patch('time.monotonic', return_value=1000.0):
+            installed = extension_installed('default', 'plpgsql')
+            with self.assertNumQueries(0):
+                extension_installed('default', 'plpgsql')
+            with patch('time.monotonic', return_value=1061.0), \
+                    self.assertNumQueries(1):
+                self.assertEqual(
+                    extension_installed('default', 'plpgsql'), installed
+                )
@@ -0,0 +1,202 @@
+import threading
+import time
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.asgi import application
+from core.instrumentation import registry
+from core.pool import ConnectionPool, PoolTimeout, failures_counter
+
+CONTRIBUTION_URL = reverse('contribution:contribution-list')
+METRICS_URL = reverse('metrics')
+EXPORT_URL = reverse('contribution:contribution-export', args=['csv'])
+
+
+class ConnectionPoolTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+
+    def test_checkout_waits_for_free_connection(self):
+        """Checkouts over max_size wait until a connection is returned"""
+        pool = ConnectionPool(1, 5, 5)
+        pool.checkout()
+        threading.Timer(0.05, pool.checkin).start()
+        start = time.perf_counter()
+
+        pool.checkout()
+
+        self.assertGreater(time.perf_counter() - start, 0.04)
+        self.assertEqual(pool.checked_out, 1)
+
+    def test_checkout_timeout(self):
+        """Checkouts fail once no connection is returned in time"""
+        pool = ConnectionPool(1, 0.01, 5)
+        pool.checkout()
+
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+
+        self.assertEqual(failures_counter.value(reason='timeout'), 1)
+        pool.checkin()
+        pool.checkout()
+
+    def test_saturated_pool_returns_503(self):
+        """Requests finding the pool saturated are refused"""
+        pool = ConnectionPool(1, 0.01, 5)
+        pool.checkout()
+
+        with patch('core.pool.pool', pool):
+            res = self.client.get(CONTRIBUTION_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], '1')
+
+    @override_settings(METRICS={'TOKEN': 'scraper-token'})
+    def test_metrics_skip_pool(self):
+        """Metrics are served while the pool is saturated"""
+        pool = ConnectionPool(1, 0.01, 5)
+        pool.checkout()
+
+        with patch('core.pool.pool', pool):
+            res = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer scraper-token'
+            )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(pool.checked_out, 1)
+
+    def test_streaming_response_holds_connection(self):
+        """Streamed exports return the connection once closed"""
+        staff = get_user_model().objects.create_superuser(
+            'staff@gmail.com', 'ajlkjfs5734'
+        )
+        client = APIClient()
+        client.force_authenticate(user=staff)
+        pool = ConnectionPool(1, 0.01, 5)
+
+        with patch('core.pool.pool', pool):
+            res = client.get(EXPORT_URL)
+            self.assertEqual(pool.checked_out, 1)
+            b''.join(res.streaming_content)
+            self.assertEqual(pool.checked_out, 0)
+
+            res = client.get(EXPORT_URL)
+            res.close()
+            res.close()
+            self.assertEqual(pool.checked_out, 0)
+
+    def test_pool_metrics(self):
+        """Open connections and checkouts are exposed as gauges"""
+        pool = ConnectionPool(2, 5, 5)
+
+        with patch('core.pool.pool', pool):
+            self.client.get(CONTRIBUTION_URL)
+            metrics = registry.expose()
+
+        self.assertIn('db_pool_connections{alias="default"} 1', metrics)
+        self.assertIn('db_pool_checked_out 0', metrics)
+        self.assertIn('db_pool_max_size 2', metrics)
+        self.assertIn('db_pool_wait_seconds_count 1', metrics)
+
+
+class ConnectionHealthTests(TransactionTestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.pool = ConnectionPool(1, 5, 5)
+        connection.ensure_connection()
+        self.pool.checkout()
+        self.pool.checkin()
+
+    def test_recent_connections_reused_unchecked(self):
+        """Connections returned just now are not pinged"""
+        with patch.object(connection, 'is_usable') as is_usable:
+            self.pool.checkout()
+
+        is_usable.assert_not_called()
+        self.assertIsNotNone(connection.connection)
+
+    def test_dropped_connection_reopened(self):
+        """Idle connections the server dropped are closed on checkout"""
+        self.pool.health_check_idle = 0
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pid = cursor.fetchone()[0]
+        with patch.object(connection, 'is_usable', return_value=False), \
+                self.assertLogs('core.pool', 'WARNING'):
+            self.pool.checkout()
+
+        self.assertIsNone(connection.connection)
+        self.assertEqual(failures_counter.value(reason='unusable'), 1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            self.assertNotEqual(cursor.fetchone()[0], pid)
+
+
+class ConnectionLimitTests(TransactionTestCase):
+
+    def test_connections_over_max_size_closed(self):
+        """Threads close their connections on checkin over max_size"""
+        pool = ConnectionPool(2, 5, 5)
+        finished = threading.Event()
+        kept = []
+
+        def request(done):
+            try:
+                pool.checkout()
+                connection.ensure_connection()
+                pool.checkin()
+                kept.append(connection.connection is not None)
+                done.set()
+                finished.wait(5)
+            finally:
+                connection.close()
+
+        threads = []
+        for _ in range(4):
+            done = threading.Event()
+            threads.append(threading.Thread(target=request, args=(done,)))
+            threads[-1].start()
+            done.wait(5)
+        sizes = pool.sizes()
+        finished.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(kept, [True, True, False, False])
+        self.assertEqual(sizes, {('default',): 2})
+
+
+class AsgiPoolTests(TransactionTestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def test_asgi_requests_return_connection(self):
+        """Requests through the ASGI entry point use the pool as well"""
+        pool = ConnectionPool(1, 0.01, 5)
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': CONTRIBUTION_URL,
+            'query_string': b'', 'http_version': '1.1',
+            'headers': [(b'host', b'testserver')],
+        }
+
+        async def request():
+            communicator = ApplicationCommunicator(application, scope)
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output()
+            await communicator.receive_output()
+            return start['status']
+
+        with patch('core.pool.pool', pool):
+            statuses = [async_to_sync(request)() for _ in range(2)]
+
+        self.assertEqual(statuses, [401, 401])
+        self.assertEqual(pool.checked_out, 0)
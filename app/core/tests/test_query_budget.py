@@ -0,0 +1,64 @@
+from django.test import TestCase
+from django.http import HttpResponse
+
+from core.models import Author
+from core.tests.query_budget import QueryBudgetMixin, record_queries, shapes
+
+
+def list_authors():
+    """Response touching the database once per author"""
+    names = [
+        Author.objects.get(id=author_id).name
+        for author_id in Author.objects.values_list('id', flat=True)
+    ]
+    return HttpResponse(', '.join(names))
+
+
+class QueryBudgetHarnessTests(QueryBudgetMixin, TestCase):
+
+    def scenario(self, authors):
+        Author.objects.bulk_create(
+            Author(name=f'Author {number}') for number in range(authors)
+        )
+        return list_authors
+
+    def test_shapes(self):
+        """Every combination of sizes is a shape"""
+        self.assertEqual(shapes(a=(1, 2), b=(3,)), [
+            {'a': 1, 'b': 3}, {'a': 2, 'b': 3},
+        ])
+
+    def test_budget_exceeded(self):
+        """Requests over budget fail with their SQL"""
+        with self.assertRaises(AssertionError) as error:
+            self.assertQueryBudget(2, self.scenario, shapes(authors=(3,)))
+
+        message = str(error.exception)
+        self.assertIn('4 queries', message)
+        self.assertIn('FROM "core_author"', message)
+        self.assertIn('in list_authors', message)
+        self.assertIn('Repeated 3 times', message)
+
+    def test_scaling_detected(self):
+        """Query counts growing with the data fail even within budget"""
+        with self.assertRaises(AssertionError) as error:
+            self.assertQueryBudget(
+                100, self.scenario, shapes(authors=(1, 5))
+            )
+
+        self.assertIn('scales with the data', str(error.exception))
+
+    def test_shapes_rolled_back(self):
+        """Data of one shape is not visible to the next"""
+        self.assertQueryBudget(2, self.scenario, shapes(authors=(0, 0)))
+        self.assertFalse(Author.objects.exists())
+
+    def test_record_queries(self):
+        """Recorded queries carry the calling code"""
+        with record_queries() as recorder:
+            list(Author.objects.all())
+
+        self.assertEqual(len(recorder), 1)
+        self.assertEqual(
+            recorder.queries[0]['stack'][-1].name, 'test_record_queries'
+        )
@@ -0,0 +1,182 @@
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import OperationalError, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.checks import replica_pin_cache_check
+from core.instrumentation import db_queries_counter, registry
+from core.models import Contribution
+from core.routers import ReplicaRouter, health, read_alias
+
+ME_URL = reverse('user:me')
+CONTRIBUTION_URL = reverse('contribution:contribution-list')
+
+REPLICA_ROUTING = {
+    'PIN_SECONDS': 60,
+    'PIN_CACHE': 'pins',
+    'HEALTH_CHECK_INTERVAL': 60,
+    'MAX_LAG': 5,
+}
+# pins are shared between processes through the files of the directory
+PIN_DIR = tempfile.TemporaryDirectory()
+CACHES = dict(settings.CACHES, pins={
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': PIN_DIR.name,
+})
+
+
+class ReplicaRouterTests(TestCase):
+
+    def test_reads_follow_chosen_replica(self):
+        """Reads go to the alias chosen for the request, else default"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Contribution), 'default')
+
+        token = read_alias.set('replica1')
+        try:
+            self.assertEqual(router.db_for_read(Contribution), 'replica1')
+            self.assertEqual(router.db_for_write(Contribution), 'default')
+            # the request reads its writes from the primary
+            self.assertEqual(router.db_for_read(Contribution), 'default')
+        finally:
+            read_alias.reset(token)
+
+    def test_migrations_on_primary_only(self):
+        """Replicas get their schema by replication"""
+        router = ReplicaRouter()
+
+        self.assertTrue(router.allow_migrate('default', 'core'))
+        self.assertFalse(router.allow_migrate('replica1', 'core'))
+
+    def test_requests_in_transaction_read_primary(self):
+        """Requests in a transaction, as in tests, never use replicas"""
+        user = get_user_model().objects.create_user(
+            email='koko@gmail.com', password='ajlkjfs5734'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        registry.reset()
+
+        client.get(CONTRIBUTION_URL)
+
+        self.assertGreater(db_queries_counter.value(alias='default'), 0)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'DB_REPLICA_HOSTS is not set')
+@override_settings(REPLICA_ROUTING=REPLICA_ROUTING, CACHES=CACHES)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test routing against the replica of the test database"""
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        registry.reset()
+        health.reset()
+        caches['pins'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='koko@gmail.com', password='ajlkjfs5734', name='Koko'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def replica_queries(self):
+        return sum(
+            db_queries_counter.value(alias=alias)
+            for alias in settings.DATABASE_REPLICAS
+        )
+
+    def test_safe_requests_read_replica(self):
+        """GET requests are served from a replica"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Koko')
+        self.assertGreater(self.replica_queries(), 0)
+        self.assertEqual(db_queries_counter.value(alias='default'), 0)
+
+    def test_writes_pin_client_to_primary(self):
+        """Clients read from the primary for a while after writing"""
+        self.client.patch(ME_URL, {'name': 'Vit'})
+        registry.reset()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Vit')
+        self.assertEqual(self.replica_queries(), 0)
+
+    def test_other_clients_not_pinned(self):
+        """A write pins only the client that made it"""
+        self.client.post(CONTRIBUTION_URL, {'title': 'Chironomids'})
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com', password='ajlkjfs5734'
+        )
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=other)}'
+        )
+        registry.reset()
+
+        client.get(ME_URL)
+
+        self.assertGreater(self.replica_queries(), 0)
+
+    def test_registration_pins_new_user(self):
+        """Anonymous writes pin the reads from the client's address"""
+        APIClient().post(reverse('user:create'), {
+            'email': 'vit@amail.com', 'password': 'ajlkjfs5734', 'name': 'Vit'
+        })
+        registry.reset()
+
+        self.client.get(ME_URL)
+
+        self.assertEqual(self.replica_queries(), 0)
+
+    @override_settings(
+        REPLICA_ROUTING=dict(REPLICA_ROUTING, PIN_CACHE='default')
+    )
+    def test_local_pins_read_primary(self):
+        """Reads go to the primary unless all processes see the pins"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Koko')
+        self.assertEqual(self.replica_queries(), 0)
+        self.assertEqual(
+            [warning.id for warning in replica_pin_cache_check(None)],
+            ['core.W001']
+        )
+
+    def test_shared_pins_pass_checks(self):
+        """A shared pin cache is not reported by the checks"""
+        self.assertEqual(replica_pin_cache_check(None), [])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """Reads go to the primary when no replica is healthy"""
+        with patch.object(health, 'check', return_value=False):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Koko')
+        self.assertEqual(self.replica_queries(), 0)
+        self.assertGreater(db_queries_counter.value(alias='default'), 0)
+
+    def test_unavailable_replica_unhealthy(self):
+        """Replicas failing to connect are unhealthy"""
+        alias = settings.DATABASE_REPLICAS[0]
+        with patch.object(connections[alias], 'cursor',
+                          side_effect=OperationalError('refused')), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertFalse(health.check(alias))
+
+    def test_lagging_replica_unhealthy(self):
+        """Replicas lagging more than MAX_LAG are skipped"""
+        alias = settings.DATABASE_REPLICAS[0]
+        with patch('core.routers.LAG_SQL', 'SELECT 60.0'), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertFalse(health.check(alias))
+        self.assertTrue(health.check(alias))
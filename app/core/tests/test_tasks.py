@@ -0,0 +1,240 @@
+import datetime
+import threading
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.instrumentation import registry
+from core.models import Author, Task
+
+TASK_QUEUE = {
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF': 10,
+    'MAX_BACKOFF': 15,
+    'POLL_INTERVAL': 0,
+    'LEASE': 60,
+}
+
+
+@tasks.task
+def create_author(name):
+    Author.objects.create(name=name)
+
+
+@tasks.task(max_attempts=2)
+def create_author_and_fail(name):
+    Author.objects.create(name=name)
+    raise RuntimeError('Mail server unavailable')
+
+
+@tasks.task
+def outlive_lease(name):
+    """Fail after another worker took the expired lease and succeeded"""
+    if Author.objects.filter(name=name).exists():
+        Author.objects.create(name=f'{name} again')
+        return
+    Author.objects.create(name=name)
+    Task.objects.update(run_at=timezone.now())
+    tasks.run_next()
+    raise RuntimeError('Mail server unavailable')
+
+
+@override_settings(TASK_QUEUE=TASK_QUEUE)
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+
+    def test_task_run_and_deleted(self):
+        """A due task runs once and leaves the queue"""
+        create_author.enqueue('Vit Syrovatka')
+
+        task, outcome = tasks.run_next()
+
+        self.assertEqual(outcome, 'done')
+        self.assertEqual(task.args, ['Vit Syrovatka'])
+
+        self.assertTrue(Author.objects.filter(name='Vit Syrovatka').exists())
+        self.assertFalse(Task.objects.exists())
+        self.assertIsNone(tasks.run_next())
+
+    def test_enqueue_rolled_back_with_transaction(self):
+        """Tasks of rolled back transactions never run"""
+        with transaction.atomic():
+            create_author.enqueue('Vit Syrovatka')
+            transaction.set_rollback(True)
+
+        self.assertIsNone(tasks.run_next())
+
+    def test_tasks_run_in_order_when_due(self):
+        """Tasks scheduled for later wait, due ones run oldest first"""
+        now = timezone.now()
+        tasks.enqueue(create_author, ['Later'],
+                      run_at=now + datetime.timedelta(minutes=5))
+        tasks.enqueue(create_author, ['Second'], run_at=now)
+        tasks.enqueue(create_author, ['First'],
+                      run_at=now - datetime.timedelta(seconds=1))
+
+        self.assertEqual(tasks.run_next()[0].args, ['First'])
+        self.assertEqual(tasks.run_next()[0].args, ['Second'])
+        self.assertIsNone(tasks.run_next())
+
+    def test_failed_attempt_retried(self):
+        """Failed attempts keep their progress and retry after a backoff"""
+        task = create_author_and_fail.enqueue('Vit Syrovatka')
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_next()[1], 'retried')
+
+        task.refresh_from_db()
+        self.assertTrue(Author.objects.exists())
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertIn('Mail server unavailable', task.last_error)
+        self.assertGreater(
+            task.run_at, timezone.now() + datetime.timedelta(seconds=9)
+        )
+        self.assertIsNone(tasks.run_next())
+
+    def test_task_failed_after_max_attempts(self):
+        """Tasks out of attempts are kept as failed"""
+        task = create_author_and_fail.enqueue('Vit Syrovatka')
+        Task.objects.filter(id=task.id).update(attempts=1)
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_next()[1], 'failed')
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_leased_task_skipped_until_lease_expires(self):
+        """Tasks of stopped workers are run again once their lease expires"""
+        task = create_author.enqueue('Vit Syrovatka')
+        leased = Task.objects.lease(60)
+
+        self.assertEqual(leased, task)
+        self.assertIsNone(tasks.run_next())
+
+        Task.objects.filter(id=task.id).update(run_at=timezone.now())
+        task, outcome = tasks.run_next()
+        self.assertEqual(outcome, 'done')
+        self.assertEqual(task.attempts, 2)
+
+    def test_task_out_of_attempts_after_lease_failed(self):
+        """Tasks whose every attempt outlived its lease are not run again"""
+        task = create_author.enqueue('Vit Syrovatka')
+        Task.objects.filter(id=task.id).update(attempts=task.max_attempts)
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_next()[1], 'failed')
+
+        self.assertFalse(Author.objects.exists())
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+
+    def test_attempt_outliving_lease_not_recorded(self):
+        """Attempts failing after another worker took over are dropped"""
+        outlive_lease.enqueue('Vit Syrovatka')
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            task, outcome = tasks.run_next()
+
+        self.assertEqual(outcome, 'expired')
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertFalse(Task.objects.exists())
+
+    def test_unknown_task_failed(self):
+        """Tasks no worker knows fail without retrying"""
+        Task.objects.create(name='core.tasks.missing', max_attempts=5)
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_next()[1], 'failed')
+
+    def test_backoff_doubles_up_to_maximum(self):
+        """Retry delays double with every attempt up to MAX_BACKOFF"""
+        self.assertEqual(
+            [tasks.backoff(attempts).seconds for attempts in (1, 2, 3)],
+            [10, 15, 15]
+        )
+
+    def test_task_duration_metrics(self):
+        """Task durations are exposed per task and outcome"""
+        create_author.enqueue('Vit Syrovatka')
+        tasks.run_next()
+
+        histogram = tasks.task_duration.histogram(
+            task=create_author.task_name, outcome='done'
+        )
+        self.assertEqual(histogram.count, 1)
+        self.assertIn(
+            'task_duration_seconds_count{task="core.tests.test_tasks.'
+            'create_author",outcome="done"} 1',
+            registry.expose()
+        )
+
+
+@override_settings(TASK_QUEUE=TASK_QUEUE)
+class TaskWorkerTests(TransactionTestCase):
+
+    def test_task_commits_progress(self):
+        """Tasks run outside the claiming transaction, seen by others"""
+        seen = []
+
+        def other_worker():
+            try:
+                seen.extend(Task.objects.values_list('attempts', flat=True))
+            finally:
+                connection.close()
+
+        @tasks.task
+        def check_lease():
+            thread = threading.Thread(target=other_worker)
+            thread.start()
+            thread.join()
+
+        check_lease.enqueue()
+        self.assertEqual(tasks.run_next()[1], 'done')
+
+        self.assertEqual(seen, [1])
+
+    def test_run_worker_burst(self):
+        """The worker runs all due tasks and exits in burst mode"""
+        for name in ('Vit', 'Eva'):
+            create_author.enqueue(name)
+        out = StringIO()
+
+        call_command('run_worker', burst=True, stdout=out)
+
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertIn('Ran 2 tasks', out.getvalue())
+
+    def test_locked_tasks_skipped(self):
+        """Workers skip tasks locked by other workers instead of waiting"""
+        first = create_author.enqueue('First')
+        second = create_author.enqueue('Second')
+        claimed = threading.Event()
+        release = threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    self.assertEqual(Task.objects.claim(), first)
+                    claimed.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(claimed.wait(5))
+            with transaction.atomic():
+                self.assertEqual(Task.objects.claim(), second)
+        finally:
+            release.set()
+            thread.join()
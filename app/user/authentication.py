@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, \
+    TokenAuthentication, get_authorization_header
+
+from user import tokens
+
+
+class TokenCache:
+    """Bounded in-process LRU of token key to cached entry with a TTL.
+
+    When a cache alias is configured, entries are also shared through that
+    cache so other processes avoid the database lookup as well.
+    """
+    key_prefix = 'auth-token:'
+
+    def __init__(self, max_size, timeout, cache_alias=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.shared is None:
+            return None
+        value = self.shared.get(self.key_prefix + key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, value, self.timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE['MAX_SIZE'],
+    timeout=settings.TOKEN_CACHE['TIMEOUT'],
+    cache_alias=settings.TOKEN_CACHE['CACHE'],
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches token to user lookups.
+
+    Users are rebuilt from cached field values on every request, the
+    password hash is never cached and is loaded on first access. Entries
+    are dropped when the token is deleted or the user is saved, other
+    processes see such changes after at most TOKEN_CACHE['TIMEOUT'] seconds.
+    """
+    cache = token_cache
+
+    def authenticate_credentials(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            self.cache.set(key, self.make_entry(token))
+            return user, token
+
+        token = self.rebuild_token(key, entry)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
+
+    def make_entry(self, token):
+        """Return the cacheable state of the token and its user"""
+        fields = cached_user_fields()
+        return (
+            token.created,
+            tuple(getattr(token.user, field) for field in fields),
+        )
+
+    def rebuild_token(self, key, entry):
+        """Return a fresh token and user instance built from an entry"""
+        created, values = entry
+        user = get_user_model().from_db(None, cached_user_fields(), values)
+        token = self.get_model()(key=key, user_id=user.pk, created=created)
+        token.user = user
+        return token
+
+
+def cached_user_fields():
+    """Return attnames of user fields kept in the token cache"""
+    return [
+        field.attname
+        for field in get_user_model()._meta.concrete_fields
+        if field.attname != 'password'
+    ]
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authentication with signed access tokens, verified without a query.
+
+    Clients pass the access token issued by CreateTokenView in the
+    "Authorization" header as "Bearer <token>". Only the user id and
+    is_staff are known up front, other user fields are loaded on first
+    access. Tokens issued before the user was deactivated, deleted or had
+    is_staff or the password changed are refused, provided the revocation
+    cache is shared between processes. Ignored unless
+    settings.SIGNED_TOKENS['ENABLED'] is set.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not tokens.enabled() or not auth or \
+                auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header.')
+            )
+
+        try:
+            claims = tokens.read_access_token(auth[1].decode())
+        except (UnicodeError, tokens.TokenError) as error:
+            raise exceptions.AuthenticationFailed(str(error))
+
+        known = {'id': claims['uid'], 'is_staff': claims['staff']}
+        fields = [
+            field.attname
+            for field in get_user_model()._meta.concrete_fields
+            if field.attname in known
+        ]
+        user = get_user_model().from_db(
+            None, fields, [known[field] for field in fields]
+        )
+        return user, claims
+
+    def authenticate_header(self, request):
+        # the first class of a view names the scheme of its 401 responses
+        if not tokens.enabled():
+            return CachedTokenAuthentication.keyword
+        return self.keyword
+
+
+AUTHENTICATION_CLASSES = (SignedTokenAuthentication, CachedTokenAuthentication)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+
+@register()
+def revocation_cache_check(app_configs, **kwargs):
+    """Refuse signed tokens revoked in the local memory of one process"""
+    if settings.SIGNED_TOKENS['ENABLED'] and isinstance(
+            caches[settings.SIGNED_TOKENS['REVOCATION_CACHE']],
+            LocMemCache):
+        return [Error(
+            'Signed tokens are revoked in the local memory of every '
+            'process, other processes accept revoked and rotated tokens.',
+            hint="Set SIGNED_TOKENS['REVOCATION_CACHE'] to an entry of "
+                 'CACHES shared by all processes.',
+            id='user.E001',
+        )]
+    return []
@@ -0,0 +1,197 @@
+import csv
+import secrets
+from contextlib import contextmanager
+from itertools import islice
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+
+EMAIL_COLUMN = 'email'
+COLUMNS = (EMAIL_COLUMN, 'name', 'password')
+# user fields whose validators, such as max_length, every line has to pass
+VALIDATED_FIELDS = (EMAIL_COLUMN, 'name')
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+EXISTS = 'exists'
+INVALID = 'invalid'
+STATUSES = (CREATED, DUPLICATE, EXISTS, INVALID)
+
+
+class UserFileError(ValueError):
+    """Raised when a user file lacks the columns to import it"""
+
+
+def parse_users(lines):
+    """Yield a dict per line of a user CSV with email, name and password.
+
+    lines is any iterable of text lines, such as an open file, which is
+    read as it is consumed. Missing name and password columns are empty.
+    """
+    reader = csv.DictReader(lines)
+    reader.fieldnames = [(column or '').strip().lower()
+                         for column in reader.fieldnames or ()]
+    if EMAIL_COLUMN not in reader.fieldnames:
+        raise UserFileError(f'The file needs an {EMAIL_COLUMN} column.')
+
+    for row in reader:
+        entry = {
+            column: (row.get(column) or '').strip()
+            for column in COLUMNS
+        }
+        entry['line'] = reader.line_num
+        yield entry
+
+
+def hash_password(password):
+    """Hash a password, an empty one makes the password unusable"""
+    return make_password(password or None)
+
+
+@contextmanager
+def hashing_pool(workers):
+    """Yield a map function hashing passwords in worker processes.
+
+    Hashing is CPU bound, so it is spread over processes. A single worker
+    hashes in this process, as web requests must, since the forked
+    workers would inherit the database connections and server threads.
+    """
+    if workers <= 1:
+        yield lambda passwords: [hash_password(p) for p in passwords]
+        return
+    with Pool(workers) as pool:
+        yield lambda passwords: pool.map(
+            hash_password, passwords,
+            chunksize=max(1, len(passwords) // workers),
+        )
+
+
+def validate_fields(entry):
+    """Run the validators of the user fields on the values of an entry"""
+    for name in VALIDATED_FIELDS:
+        field = get_user_model()._meta.get_field(name)
+        try:
+            field.run_validators(entry[name])
+        except ValidationError as exc:
+            raise ValidationError(
+                f'{field.verbose_name.capitalize()}: {exc.messages[0]}'
+            )
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_users(lines, workers=None, chunk_size=None):
+    """Create users with auth tokens from a CSV, return a report.
+
+    Emails are validated and normalized as by create_user, emails and
+    names checked against the limits of their fields. Lines are read in
+    chunks, whose passwords are hashed by workers, empty
+    ones made unusable, and whose users and tokens are inserted by two
+    bulk queries in a transaction. Emails repeated in the file or already
+    registered are reported, as are invalid ones, without stopping the
+    import.
+    """
+    options = settings.USER_IMPORT
+    workers = options['WORKERS'] if workers is None else workers
+    chunk_size = chunk_size or options['CHUNK_SIZE']
+    report = {
+        'lines': 0,
+        'counts': dict.fromkeys(STATUSES, 0),
+        'rejected': [],
+    }
+
+    def reject(entry, status, error):
+        report['counts'][status] += 1
+        report['rejected'].append({
+            'line': entry['line'],
+            'email': entry['email'],
+            'status': status,
+            'error': error,
+        })
+
+    User = get_user_model()
+    seen = set()
+    with hashing_pool(workers) as hash_passwords:
+        for chunk in chunks(parse_users(lines), chunk_size):
+            report['lines'] += len(chunk)
+            valid = []
+            for entry in chunk:
+                try:
+                    entry['email'] = User.objects.clean_email(entry['email'])
+                    validate_fields(entry)
+                except (ValueError, ValidationError) as exc:
+                    message = exc.messages[0] \
+                        if isinstance(exc, ValidationError) else str(exc)
+                    reject(entry, INVALID, message)
+                    continue
+                if entry['email'] in seen:
+                    reject(entry, DUPLICATE, 'Repeated in the file.')
+                    continue
+                seen.add(entry['email'])
+                valid.append(entry)
+
+            new = without_registered(valid, reject)
+            if not new:
+                continue
+            for entry, password in zip(new, hash_passwords(
+                    [entry['password'] for entry in new])):
+                entry['password'] = password
+            try:
+                created = create_users(new)
+            except IntegrityError:
+                # registered by someone else while the passwords were hashed
+                created = create_each(without_registered(new, reject), reject)
+            report['counts'][CREATED] += created
+    return report
+
+
+def create_each(entries, reject):
+    """Create users one by one, reject those registered meanwhile"""
+    created = 0
+    for entry in entries:
+        try:
+            created += create_users([entry])
+        except IntegrityError:
+            reject(entry, EXISTS, 'Already registered.')
+    return created
+
+
+def without_registered(entries, reject):
+    """Return the entries whose email is not registered, reject others"""
+    registered = set(get_user_model().objects.filter(
+        email__in=[entry['email'] for entry in entries]
+    ).values_list('email', flat=True))
+    new = []
+    for entry in entries:
+        if entry['email'] in registered:
+            reject(entry, EXISTS, 'Already registered.')
+        else:
+            new.append(entry)
+    return new
+
+
+def create_users(entries):
+    """Insert users and their tokens in a transaction, return the count"""
+    User = get_user_model()
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            User(email=entry['email'], name=entry['name'],
+                 password=entry['password'])
+            for entry in entries
+        )
+        Token.objects.bulk_create(
+            Token(user=user, key=secrets.token_hex(20)) for user in users
+        )
+    return len(users)
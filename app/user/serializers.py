@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model, password_validation, \
     authenticate
 from django.utils.translation import ugettext_lazy as _
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+
+from user import tokens
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -33,13 +35,29 @@ class UserSerializer(serializers.ModelSerializer):
         return get_user_model().objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
-        """Update and return user setting password correctly"""
+        """Update and return user setting password correctly.
+
+        Only the submitted fields are saved, never is_staff or is_active.
+        """
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        fields = list(validated_data)
         if password:
-            user.set_password(password)
-            user.save()
-        return user
+            instance.set_password(password)
+            fields.append('password')
+        instance.save(update_fields=fields)
+        return instance
+
+
+class UserLookupSerializer(serializers.ModelSerializer):
+    """Serializer for users found by staff"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = get_user_model()
+        fields = ('id', 'email', 'name', 'is_active', 'similarity')
+        read_only_fields = fields
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -71,3 +89,32 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for exchanging a signed refresh token"""
+    refresh = serializers.CharField(trim_whitespace=False)
+
+    def validate_refresh(self, value):
+        try:
+            return tokens.read_refresh_token(value)
+        except tokens.TokenError as error:
+            raise exceptions.AuthenticationFailed(str(error))
+
+    def validate(self, attrs):
+        """Check the token owner still exists, is active and has not
+        changed the password, is_active or is_staff since"""
+        user = get_user_model().objects.filter(
+            pk=attrs['refresh']['uid'], is_active=True
+        ).first()
+        if not user:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        try:
+            tokens.check_generation(attrs['refresh'], user)
+        except tokens.TokenError as error:
+            raise exceptions.AuthenticationFailed(str(error))
+
+        attrs['user'] = user
+        return attrs
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user import tokens
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """Drop cached tokens on password, is_active or any other change"""
+    update_fields = kwargs.get('update_fields')
+    if not kwargs.get('created') and (
+            update_fields is None or
+            set(tokens.CLAIMED_FIELDS) & set(update_fields)):
+        tokens.user_changed(instance.pk)
+    for key in Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True):
+        token_cache.delete(key)
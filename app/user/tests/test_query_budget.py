@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.tests.query_budget import QueryBudgetMixin, shapes
+from user.authentication import token_cache
+
+
+CREATE_USER_URL = reverse('user:create')
+CREATE_TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+
+# number of other users with tokens in the database
+SIZES = shapes(users=(1, 10))
+SIGNED_TOKENS = {
+    'ENABLED': True,
+    'ACCESS_LIFETIME': 60,
+    'REFRESH_LIFETIME': 600,
+    'REVOCATION_CACHE': 'default',
+}
+
+
+def create_users(users):
+    for number in range(users):
+        user = get_user_model().objects.create_user(
+            email=f'user{number}@example.org', password='conference2020'
+        )
+        Token.objects.create(user=user)
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the query budgets of the user endpoints"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.payload = {'email': 'pako@amail.com', 'password': 'asd453xcvf'}
+        self.user = get_user_model().objects.create_user(
+            name='meee', **self.payload
+        )
+        self.client = APIClient()
+
+    def authenticate(self):
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_create_user(self):
+        def scenario(users):
+            create_users(users)
+            return lambda: self.client.post(CREATE_USER_URL, {
+                'email': 'new@example.org',
+                'password': 'conference2020',
+                'name': 'New',
+            })
+
+        self.assertQueryBudget(
+            3, scenario, SIZES, status=status.HTTP_201_CREATED
+        )
+
+    def test_create_token(self):
+        def scenario(users):
+            create_users(users)
+            return lambda: self.client.post(CREATE_TOKEN_URL, self.payload)
+
+        self.assertQueryBudget(5, scenario, SIZES)
+
+    @override_settings(SIGNED_TOKENS=SIGNED_TOKENS)
+    def test_create_signed_token(self):
+        def scenario(users):
+            create_users(users)
+            return lambda: self.client.post(CREATE_TOKEN_URL, self.payload)
+
+        self.assertQueryBudget(1, scenario, SIZES)
+
+    def test_retrieve_me(self):
+        def scenario(users):
+            create_users(users)
+            self.authenticate()
+            token_cache.clear()
+            return lambda: self.client.get(ME_URL)
+
+        self.assertQueryBudget(1, scenario, SIZES)
+
+    def test_retrieve_me_cached_token(self):
+        def scenario(users):
+            create_users(users)
+            self.authenticate()
+            self.client.get(ME_URL)
+            return lambda: self.client.get(ME_URL)
+
+        self.assertQueryBudget(0, scenario, SIZES)
+
+    def test_update_me(self):
+        def scenario(users):
+            create_users(users)
+            self.authenticate()
+            return lambda: self.client.patch(ME_URL, {'name': 'new name'})
+
+        self.assertQueryBudget(4, scenario, SIZES)
@@ -0,0 +1,339 @@
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, token_cache
+from user.checks import revocation_cache_check
+
+
+ME_URL = reverse('user:me')
+CREATE_TOKEN_URL = reverse('user:token')
+REFRESH_TOKEN_URL = reverse('user:token-refresh')
+REVOKE_TOKEN_URL = reverse('user:token-revoke')
+CONTRIBUTION_URL = reverse('contribution:contribution-list')
+
+SIGNED_TOKENS = {
+    'ENABLED': True,
+    'ACCESS_LIFETIME': 60,
+    'REFRESH_LIFETIME': 600,
+    'REVOCATION_CACHE': 'default',
+}
+
+
+def create_user(**params):
+    return get_user_model().objects.create_user(**params)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token authentication backed by the token cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user(
+            email='pako@amail.com',
+            password='asd453xcvf',
+            name='meee'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_query(self):
+        """Only the first request looks the token up in the database"""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Unknown tokens are not cached as valid"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        """Deleting a token revokes it immediately"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """Deactivating a user revokes the cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_refreshes_cache(self):
+        """Changing the password through the API drops the cached user"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {'password': 'newpassword777'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpassword777'))
+
+    def test_update_keeps_flags_changed_elsewhere(self):
+        """Updates never write back the flags of a cached user"""
+        self.client.get(ME_URL)
+        # as changed by another process, which cannot reach this cache
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_staff=True
+        )
+
+        res = self.client.patch(ME_URL, {'name': 'Pako'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Pako')
+        self.assertTrue(self.user.is_staff)
+
+    def test_cached_user_is_not_shared_between_requests(self):
+        """Every request gets its own user instance"""
+        self.client.get(ME_URL)
+        first = self.client.get(ME_URL).wsgi_request.user
+        second = self.client.get(ME_URL).wsgi_request.user
+
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+
+class TokenCacheTests(TestCase):
+    """Test the bounded token cache"""
+
+    def test_least_recently_used_evicted(self):
+        """The cache never holds more than max_size entries"""
+        cache = TokenCache(max_size=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Entries older than the timeout are not returned"""
+        cache = TokenCache(max_size=2, timeout=0)
+        cache.set('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_cache(self):
+        """Entries are shared between processes through a cache alias"""
+        TokenCache(max_size=2, timeout=60, cache_alias='default').set('a', 1)
+        other = TokenCache(max_size=2, timeout=60, cache_alias='default')
+
+        self.assertEqual(other.get('a'), 1)
+        other.delete('a')
+        self.assertIsNone(other.get('a'))
+
+
+@override_settings(SIGNED_TOKENS=SIGNED_TOKENS)
+class SignedTokenApiTests(TestCase):
+    """Test stateless signed access tokens"""
+
+    def setUp(self):
+        self.payload = {'email': 'pako@amail.com', 'password': 'asd453xcvf'}
+        self.user = create_user(name='meee', **self.payload)
+        self.client = APIClient()
+
+    def obtain_tokens(self):
+        res = self.client.post(CREATE_TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_token_view_issues_signed_pair(self):
+        """Signed access and refresh tokens replace the database token"""
+        data = self.obtain_tokens()
+
+        self.assertIn('access', data)
+        self.assertIn('refresh', data)
+        self.assertNotIn('token', data)
+        self.assertFalse(Token.objects.exists())
+
+    def test_access_token_needs_no_query(self):
+        """Authenticating with an access token does not hit the database"""
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with self.assertNumQueries(2):
+            res = self.client.get(CONTRIBUTION_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_tampered_token_rejected(self):
+        """A token with a modified signature is refused"""
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}x')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """Access tokens stop working after their lifetime"""
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with patch('time.time', return_value=time.time() + 61):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_rotates_pair(self):
+        """A refresh token is exchanged once for a new pair"""
+        refresh = self.obtain_tokens()['refresh']
+
+        res = self.client.post(REFRESH_TOKEN_URL, {'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {res.data['access']}"
+        )
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_200_OK
+        )
+
+        res = self.client.post(REFRESH_TOKEN_URL, {'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Bearer')
+
+    def test_refresh_refused_for_inactive_user(self):
+        """Deactivated users cannot refresh their tokens"""
+        refresh = self.obtain_tokens()['refresh']
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(REFRESH_TOKEN_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_refused_after_password_change(self):
+        """Refresh tokens issued before a password change are refused"""
+        refresh = self.obtain_tokens()['refresh']
+        self.user.set_password('new453xcvf')
+        self.user.save()
+
+        # long after the change, once no marker of it is cached anymore
+        with patch('time.time', return_value=time.time() + 300):
+            res = self.client.post(REFRESH_TOKEN_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_refused_after_demotion(self):
+        """Refresh tokens claiming staff are refused once the user changes"""
+        self.user.is_staff = True
+        self.user.save()
+        refresh = self.obtain_tokens()['refresh']
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+
+        res = self.client.post(REFRESH_TOKEN_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_refused(self):
+        """Access tokens issued before deactivation are refused"""
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_demoted_user_needs_new_token(self):
+        """Access tokens claiming staff are refused once the user changes"""
+        self.user.is_staff = True
+        self.user.save()
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+
+        res = self.client.patch(ME_URL, {'name': 'Pako'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_staff)
+
+    def test_profile_update_keeps_token(self):
+        """Users keep their access tokens when changing their name"""
+        access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.client.patch(ME_URL, {'name': 'Pako'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Pako')
+
+    def test_revoke_on_logout(self):
+        """Revoked access and refresh tokens are refused"""
+        data = self.obtain_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {data['access']}")
+
+        res = self.client.post(REVOKE_TOKEN_URL, {'refresh': data['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(
+            REFRESH_TOKEN_URL, {'refresh': data['refresh']}
+        )
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(SIGNED_TOKENS=dict(SIGNED_TOKENS, ENABLED=False))
+    def test_disabled_mode_ignores_bearer_tokens(self):
+        """Signed tokens are not accepted unless enabled"""
+        with self.settings(SIGNED_TOKENS=SIGNED_TOKENS):
+            access = self.obtain_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    def test_bearer_challenge(self):
+        """Unauthenticated requests are asked for signed tokens if enabled"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Bearer')
+
+    def test_local_revocation_cache_check(self):
+        """Revoking signed tokens in local memory is refused by the checks"""
+        self.assertEqual(
+            [error.id for error in revocation_cache_check(None)],
+            ['user.E001']
+        )
+        with self.settings(SIGNED_TOKENS=dict(SIGNED_TOKENS, ENABLED=False)):
+            self.assertEqual(revocation_cache_check(None), [])
+        shared = 'django.core.cache.backends.db.DatabaseCache'
+        with self.settings(CACHES={'default': {
+                'BACKEND': shared, 'LOCATION': 'revocations'}}):
+            self.assertEqual(revocation_cache_check(None), [])
@@ -1,14 +1,24 @@
-from django.test import TestCase
+import io
+from unittest.mock import patch
+
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.models import extension_installed
+from user import imports
 
 
 CREATE_USER_URL = reverse('user:create')
 CREATE_TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+SEARCH_URL = reverse('user:search')
+IMPORT_URL = reverse('user:import')
 
 
 def create_user(**params):
@@ -195,3 +205,193 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.email, payload['email'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+
+class UserSearchApiTests(TestCase):
+    """Test the staff user lookup"""
+
+    def setUp(self):
+        self.staff = create_user(
+            email='staff@conference.org', password='testpass', name='Staff',
+            is_staff=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+        create_user(email='jan.sychra@amail.com', password='testpass',
+                    name='Jan Sychra')
+        create_user(email='vit@amail.com', password='testpass',
+                    name='Vit Syrovatka')
+        create_user(email='eva@amail.com', password='testpass',
+                    name='Eva Novakova')
+
+    def search(self, text, **params):
+        res = self.client.get(SEARCH_URL, dict(params, q=text))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [user['email'] for user in res.data]
+
+    def test_search_requires_staff(self):
+        """Registrants cannot look other users up"""
+        self.client.force_authenticate(user=create_user(
+            email='user@amail.com', password='testpass'
+        ))
+
+        res = self.client.get(SEARCH_URL, {'q': 'jan'})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_search_by_name_and_email_parts(self):
+        self.assertEqual(self.search('sychra'), ['jan.sychra@amail.com'])
+        self.assertEqual(self.search('vit@'), ['vit@amail.com'])
+        self.assertEqual(self.search('novak eva'), ['eva@amail.com'])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.search('amail', limit=2)), 2)
+        self.assertEqual(len(self.search('amail', limit='x')), 3)
+
+    def test_search_ranked_by_similarity(self):
+        """Closer matches are listed first"""
+        if not extension_installed(connection.alias, 'pg_trgm'):
+            self.skipTest('pg_trgm is not installed')
+        create_user(email='sychrova@amail.com', password='testpass',
+                    name='Hana Sychrova')
+
+        emails = self.search('Jan Sychra')
+
+        self.assertEqual(emails[0], 'jan.sychra@amail.com')
+
+    def test_search_uses_trigram_index(self):
+        """Substring filters are served by the trigram indexes"""
+        if not extension_installed(connection.alias, 'pg_trgm'):
+            self.skipTest('pg_trgm is not installed')
+        queryset = get_user_model().objects.search('sychra')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+
+        self.assertIn('user_name_trgm_idx', plan)
+        self.assertIn('user_email_trgm_idx', plan)
+
+
+@override_settings(USER_IMPORT={'WORKERS': 1, 'CHUNK_SIZE': 2})
+class UserImportApiTests(TestCase):
+    """Test the staff import of attendees"""
+
+    def setUp(self):
+        self.staff = create_user(
+            email='staff@conference.org', password='testpass', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+
+    def upload(self, text):
+        users = io.BytesIO(text.encode())
+        users.name = 'users.csv'
+        return self.client.post(IMPORT_URL, {'users': users},
+                                format='multipart')
+
+    @override_settings(USER_IMPORT={'WORKERS': 4, 'CHUNK_SIZE': 2})
+    def test_import_hashes_in_process(self):
+        """The API never forks hashing processes from the web worker"""
+        with patch('user.imports.Pool') as pool:
+            res = self.upload('email,password\nvit@amail.com,ajlkjfs5734\n')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        pool.assert_not_called()
+        user = get_user_model().objects.get(email='vit@amail.com')
+        self.assertTrue(user.check_password('ajlkjfs5734'))
+
+    def test_import_requires_staff(self):
+        """Registrants cannot import users"""
+        self.client.force_authenticate(user=create_user(
+            email='user@amail.com', password='testpass'
+        ))
+
+        res = self.upload('email\nvit@amail.com\n')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_creates_users_with_tokens(self):
+        """Users are created with hashed or unusable passwords and tokens"""
+        res = self.upload(
+            'Email,Name,Password\n'
+            'vit@AMAIL.com,Vit Syrovatka,ajlkjfs5734\n'
+            'eva@amail.com,Eva Novakova,\n'
+            'jan@amail.com,Jan Sychra,testpass\n'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['counts']['created'], 3)
+        vit = get_user_model().objects.get(email='vit@amail.com')
+        self.assertEqual(vit.name, 'Vit Syrovatka')
+        self.assertTrue(vit.check_password('ajlkjfs5734'))
+        eva = get_user_model().objects.get(email='eva@amail.com')
+        self.assertFalse(eva.has_usable_password())
+        self.assertEqual(
+            Token.objects.filter(user__in=[vit, eva]).count(), 2
+        )
+
+    def test_import_reports_rejected_lines(self):
+        """Invalid, repeated and registered emails do not stop the import"""
+        res = self.upload(
+            'email\n'
+            'not an email\n'
+            'vit@amail.com\n'
+            'vit@AMAIL.COM\n'
+            'staff@conference.org\n'
+            '\n'
+            'eva@amail.com\n'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['lines'], 5)
+        self.assertEqual(res.data['counts'], {
+            'created': 2, 'duplicate': 1, 'exists': 1, 'invalid': 1,
+        })
+        self.assertEqual(
+            [(line['line'], line['status']) for line in res.data['rejected']],
+            [(2, 'invalid'), (4, 'duplicate'), (5, 'exists')]
+        )
+
+    def test_import_reports_overlong_lines(self):
+        """Lines exceeding the user fields are rejected, not the import"""
+        res = self.upload(
+            'email,name\n'
+            f'vit@amail.com,{"V" * 256}\n'
+            'eva@amail.com,Eva Novakova\n'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['counts']['created'], 1)
+        self.assertEqual(res.data['counts']['invalid'], 1)
+        self.assertTrue(
+            res.data['rejected'][0]['error'].startswith('Name: ')
+        )
+        self.assertFalse(
+            get_user_model().objects.filter(email='vit@amail.com').exists()
+        )
+
+    def test_import_rejects_users_registered_meanwhile(self):
+        """Users registered while a chunk is inserted are reported"""
+        create_users = imports.create_users
+
+        def register_meanwhile(entries):
+            if len(entries) > 1 or entries[0]['email'] == 'eva@amail.com':
+                raise IntegrityError('duplicate key value')
+            return create_users(entries)
+
+        with patch('user.imports.create_users',
+                   side_effect=register_meanwhile):
+            res = self.upload('email\nvit@amail.com\neva@amail.com\n')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['counts']['created'], 1)
+        self.assertEqual(res.data['counts']['exists'], 1)
+        self.assertEqual(res.data['rejected'][0]['email'], 'eva@amail.com')
+
+    def test_import_requires_email_column(self):
+        """Files without an email column are rejected"""
+        res = self.upload('name\nVit\n')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
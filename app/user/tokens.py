@@ -0,0 +1,107 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+
+ACCESS_SALT = 'user.tokens.access'
+REFRESH_SALT = 'user.tokens.refresh'
+REVOKED_PREFIX = 'revoked-token:'
+USER_CHANGED_PREFIX = 'user-changed:'
+# user fields whose change refuses the access tokens issued before
+CLAIMED_FIELDS = ('is_active', 'is_staff', 'password')
+
+
+class TokenError(Exception):
+    """Raised for tampered, expired or revoked signed tokens"""
+
+
+def enabled():
+    return settings.SIGNED_TOKENS['ENABLED']
+
+
+def revocations():
+    return caches[settings.SIGNED_TOKENS['REVOCATION_CACHE']]
+
+
+def generation(user):
+    """Return a digest of the claimed fields of the user, it changes with
+    any of them"""
+    return salted_hmac('user.tokens.generation', ':'.join(
+        str(getattr(user, field)) for field in CLAIMED_FIELDS
+    )).hexdigest()[:16]
+
+
+def sign(user, salt, lifetime):
+    expires = int(time.time()) + lifetime
+    return signing.dumps({
+        'uid': user.pk,
+        'staff': user.is_staff,
+        'gen': generation(user),
+        'exp': expires,
+        'iat': time.time(),
+        'jti': uuid.uuid4().hex,
+    }, salt=salt), expires
+
+
+def issue_tokens(user):
+    """Return a signed access and refresh token pair for the user"""
+    access, expires = sign(
+        user, ACCESS_SALT, settings.SIGNED_TOKENS['ACCESS_LIFETIME']
+    )
+    refresh, _ = sign(
+        user, REFRESH_SALT, settings.SIGNED_TOKENS['REFRESH_LIFETIME']
+    )
+    return {'access': access, 'refresh': refresh, 'expires': expires}
+
+
+def read(token, salt):
+    """Return the claims of a valid token, raise TokenError otherwise"""
+    try:
+        claims = signing.loads(token, salt=salt)
+    except signing.BadSignature:
+        raise TokenError('Invalid token.')
+    if claims['exp'] <= time.time():
+        raise TokenError('Token has expired.')
+    if revocations().get(REVOKED_PREFIX + claims['jti']):
+        raise TokenError('Token has been revoked.')
+    return claims
+
+
+def read_access_token(token):
+    """Return the claims of an access token issued after any change of
+    its user's claimed fields, raise TokenError otherwise"""
+    claims = read(token, ACCESS_SALT)
+    changed = revocations().get(USER_CHANGED_PREFIX + str(claims['uid']))
+    if changed is not None and claims.get('iat', 0) < changed:
+        raise TokenError('Token was issued before the user changed.')
+    return claims
+
+
+def read_refresh_token(token):
+    """Return the claims of a refresh token, its generation has to be
+    checked against the user with check_generation"""
+    return read(token, REFRESH_SALT)
+
+
+def check_generation(claims, user):
+    """Raise TokenError unless the token was issued for the user as is"""
+    if claims.get('gen') != generation(user):
+        raise TokenError('Token was issued before the user changed.')
+
+
+def user_changed(user_id):
+    """Refuse the access tokens of the user issued until now"""
+    revocations().set(
+        USER_CHANGED_PREFIX + str(user_id), time.time(),
+        settings.SIGNED_TOKENS['ACCESS_LIFETIME']
+    )
+
+
+def revoke(claims):
+    """Reject the token with these claims until it expires anyway"""
+    remaining = int(claims['exp'] - time.time())
+    if remaining > 0:
+        revocations().set(REVOKED_PREFIX + claims['jti'], True, remaining)
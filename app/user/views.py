@@ -1,26 +1,157 @@
-from rest_framework import generics, authentication, permissions
+import codecs
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from core.idempotency import idempotent_response
+from user import imports, tokens
+from user.authentication import AUTHENTICATION_CLASSES, \
+    SignedTokenAuthentication
+from user.serializers import UserSerializer, AuthTokenSerializer, \
+    RefreshTokenSerializer, UserLookupSerializer
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+IMPORT_ENCODING = 'utf-8-sig'
 
 
 class CreateUserView(generics.CreateAPIView):
     """Create a new user"""
     serializer_class = UserSerializer
 
+    def create(self, request, *args, **kwargs):
+        return idempotent_response(
+            request,
+            lambda: super(CreateUserView, self).create(
+                request, *args, **kwargs
+            ),
+        )
+
+
+class ImportUsersView(APIView):
+    """Create users with tokens from an uploaded CSV of attendees.
+
+    Passwords are hashed in the serving process, forking a process pool
+    in a web worker is unsafe. Large files are better imported by the
+    import_users command, which hashes in USER_IMPORT['WORKERS'] processes.
+    """
+    authentication_classes = AUTHENTICATION_CLASSES
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        users = request.FILES.get('users')
+        if users is None:
+            return Response(
+                {'detail': 'Upload the CSV of attendees as users.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            report = imports.import_users(
+                codecs.iterdecode(users, IMPORT_ENCODING), workers=1
+            )
+        except (imports.UserFileError, UnicodeDecodeError) as exc:
+            return Response(
+                {'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report)
+
 
 class CreateTokenView(ObtainAuthToken):
-    """Create token"""
+    """Create token, a signed access and refresh pair if enabled"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        if not tokens.enabled():
+            return super().post(request, *args, **kwargs)
+
+        serializer = self.serializer_class(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            tokens.issue_tokens(serializer.validated_data['user'])
+        )
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a signed refresh token for a new token pair"""
+    serializer_class = RefreshTokenSerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def get_authenticate_header(self, request):
+        # refused refresh tokens are answered with 401, not 403
+        return SignedTokenAuthentication.keyword
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens.revoke(serializer.validated_data['refresh'])
+        return Response(
+            tokens.issue_tokens(serializer.validated_data['user'])
+        )
+
+
+class RevokeTokenView(APIView):
+    """Log out by revoking the signed access and refresh tokens"""
+    authentication_classes = AUTHENTICATION_CLASSES
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if isinstance(request.auth, dict):
+            tokens.revoke(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                tokens.revoke(tokens.read_refresh_token(refresh))
+            except tokens.TokenError:
+                pass
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """View for managing users"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = AUTHENTICATION_CLASSES
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        if self.request.method not in permissions.SAFE_METHODS:
+            # users of cached tokens and token claims may be stale, saving
+            # them would write back outdated is_staff or is_active
+            return get_user_model().objects.using(DEFAULT_DB_ALIAS).get(
+                pk=user.pk
+            )
+        # users from token claims carry only a few fields
+        deferred = user.get_deferred_fields() - {'password'}
+        if deferred:
+            user.refresh_from_db(fields=deferred)
+        return user
+
+
+class UserSearchView(generics.ListAPIView):
+    """Find users by parts of their name or email, most similar first"""
+    serializer_class = UserLookupSerializer
+    authentication_classes = AUTHENTICATION_CLASSES
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            return get_user_model().objects.none()
+        try:
+            limit = min(
+                int(self.request.query_params.get('limit', SEARCH_LIMIT)),
+                SEARCH_MAX_LIMIT
+            )
+        except ValueError:
+            limit = SEARCH_LIMIT
+        return get_user_model().objects.search(text).order_by(
+            '-similarity', 'email'
+        )[:max(limit, 1)]